@@ -5,7 +5,8 @@ package.domain = org.psychotalent
 source.dir = .
 source.include_exts = py,kv,json,png,jpg,ico
 version = 1.0
-requirements = python3,kivy==2.3.0,jdatetime,python-dateutil
+# sqlite3: psycho_core imports it (entry repository, merge spill table, class database)
+requirements = python3,sqlite3,kivy==2.3.0,jdatetime,python-dateutil
 orientation = portrait
 fullscreen = 0
 
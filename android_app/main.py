@@ -3,21 +3,44 @@ Psychological Talent Identification - Android App (Kivy)
 Professional UI with data snapshot integrity
 """
 import os
+import sys
 import json
-import copy
+import logging
+import queue
+import threading
+
+# The shared core lives at the repository root; the build copies it next to this
+# file before packaging, so only fall back to the parent directory from source.
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if not os.path.isdir(os.path.join(_HERE, 'psycho_core')):
+    sys.path.insert(0, os.path.dirname(_HERE))
+
+from psycho_core import open_entry_store, save_keys as write_keys_file
+from psycho_core import FORMAT_VERSION, compute_score_from_keys, migrate_store, rescore_store
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.popup import Popup
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.metrics import dp
 from kivy.uix.widget import Widget
 
 KEYS_FILE = 'keys.json'
 ENTRIES_FILE = 'entries.json'
+# search-as-you-type waits this long (seconds) after the last keystroke
+SEARCH_DEBOUNCE = 0.15
+# Paged list: rows are handed to the RecycleView PAGE_SIZE at a time, the next
+# page once the list is scrolled near its end. None shows every row at once.
+PAGE_SIZE = 200
+# writes submitted within this many seconds of each other are saved together
+WRITE_COALESCE = 0.25
+
+log = logging.getLogger(__name__)
 
 
 def get_data_path(filename):
@@ -43,78 +66,151 @@ def load_keys():
 
 
 def save_keys(keys, descriptions):
-    """Save keys and descriptions to keys.json."""
-    path = get_data_path(KEYS_FILE)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump({'keys': keys, 'descriptions': descriptions}, f, ensure_ascii=False, indent=2)
+    """Save keys and descriptions to keys.json (atomic replace, previous versions kept as backups)."""
+    write_keys_file(get_data_path(KEYS_FILE), keys, descriptions)
 
 
-def load_entries():
-    """Load all entries from entries.json."""
-    path = get_data_path(ENTRIES_FILE)
-    if not os.path.exists(path):
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False, indent=2)
-    with open(path, encoding='utf-8') as f:
-        return json.load(f)
+_entry_store = None
+_entry_store_source = None
 
 
-def save_entries(entries):
-    """Save entries to entries.json."""
+def get_entry_store():
+    """
+    Entry backend in persistent storage (SQLite repository if imported, else journaled
+    JSON), kept for the whole process and re-read only when its files changed.
+    """
+    global _entry_store, _entry_store_source
     path = get_data_path(ENTRIES_FILE)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
-
-
-def compute_score_from_keys(keys, answers):
-    """Compute total score for answers string using provided keys list (snapshot or current)."""
-    total = 0
-    for idx, ch in enumerate(answers):
-        if idx < len(keys) and ch in keys[idx]:
-            try:
-                total += int(keys[idx][ch])
-            except Exception:
-                pass
-    return total
-
-
-def migrate_entries_add_snapshots(keys):
-    """Add keys_snapshot to entries that lack it. Returns number of entries updated."""
-    entries = load_entries()
-    updated = 0
-    for e in entries:
-        if 'keys_snapshot' not in e:
-            e['keys_snapshot'] = copy.deepcopy(keys)
-            e['score'] = compute_score_from_keys(e['keys_snapshot'], e.get('answers', ''))
-            updated += 1
-    if updated:
-        save_entries(entries)
-    return updated
-
-
-class EntryRow(BoxLayout):
-    """Widget representing one entry in the list with edit/delete buttons."""
-    def __init__(self, entry, **kwargs):
+    if _entry_store is None or _entry_store_source != path:
+        _entry_store = open_entry_store(path)
+        _entry_store_source = path
+    else:
+        _entry_store.refresh()
+    return _entry_store
+
+
+def current_entry_store():
+    """
+    The store get_entry_store() last returned, without checking its files: for
+    the Kivy thread, which leaves every read and write to the I/O thread.
+    """
+    return _entry_store
+
+
+class DuplicateEntryError(ValueError):
+    """The entry being saved has the same normalized identity as a stored one."""
+
+
+def migrate_entry_format(keys, snapshots=False, progress=None):
+    """
+    Upgrade entries to the current format (ids, timestamps; with snapshots also
+    keys snapshots for entries without one). Returns {step name: entries updated};
+    {} without reading the entries if they are current and snapshots is False.
+    """
+    return migrate_store(get_entry_store(), keys, snapshots=snapshots, progress=progress)
+
+
+class IOWorker:
+    """
+    Runs file work on one background thread so the UI never waits for the disk.
+    Jobs run in the order they were submitted; results (or the exception) are
+    passed to on_done/on_error on the Kivy thread via Clock.schedule_once.
+    Write jobs that follow each other within WRITE_COALESCE seconds run inside
+    one store batch(), so a burst of edits is saved with a single journal write.
+    Every failure is logged; a job without on_error reports it to the worker's
+    on_error.
+    """
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='entry-io', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, on_done=None, on_error=None, write=False):
+        """
+        Run fn() in the background. write=True marks short jobs that change
+        entries, which are grouped in one batch(); long jobs such as a rescore
+        are submitted without it so they do not hold the store.
+        """
+        self._jobs.put((fn, on_done, on_error, write))
+
+    def _run(self):
+        job = None
+        while True:
+            if job is None:
+                job = self._jobs.get()
+            if not job[3]:
+                self._deliver(job, self._attempt(job[0]))
+                job = None
+                continue
+            # gather the writes that follow quickly; a read ends the group
+            writes = [job]
+            job = None
+            while True:
+                try:
+                    job = self._jobs.get(timeout=WRITE_COALESCE)
+                except queue.Empty:
+                    job = None
+                    break
+                if not job[3]:
+                    break
+                writes.append(job)
+                job = None
+            self._run_writes(writes)
+
+    def _run_writes(self, jobs):
+        try:
+            with get_entry_store().batch():
+                results = [self._attempt(fn) for fn, _, _, _ in jobs]
+        except Exception as ex:
+            # the batched journal write failed, so none of the changes were saved
+            results = [(False, ex)] * len(jobs)
+        for job, result in zip(jobs, results):
+            self._deliver(job, result)
+
+    @staticmethod
+    def _attempt(fn):
+        try:
+            return True, fn()
+        except Exception as ex:
+            return False, ex
+
+    def _deliver(self, job, result):
+        _, on_done, on_error, _ = job
+        ok, value = result
+        if not ok:
+            log.error('Background job failed', exc_info=value)
+        callback = on_done if ok else on_error or self.on_error
+        if callback is not None:
+            Clock.schedule_once(lambda dt: callback(value))
+
+
+class EntryRow(RecycleDataViewBehavior, BoxLayout):
+    """
+    RecycleView row for one entry with edit/delete buttons. Only the rows on
+    screen exist; the RecycleView reuses them for whichever entries scroll into view.
+    """
+    def __init__(self, **kwargs):
         super().__init__(orientation='horizontal', size_hint_y=None, height=dp(60), spacing=dp(5), padding=dp(5), **kwargs)
-        self.entry = entry
-        
+        self.entry = None
+
         # Info column with name and details
         info = BoxLayout(orientation='vertical', size_hint_x=0.6)
-        info.add_widget(Label(
-            text=entry.get('name','Unknown'),
+        self.name_label = Label(
             font_size=dp(16),
             bold=True,
             halign='left',
             valign='middle',
             text_size=(None, None)
-        ))
-        info.add_widget(Label(
-            text=f"Phone: {entry.get('phone','N/A')} | Score: {entry.get('score',0)}",
+        )
+        self.details_label = Label(
             font_size=dp(12),
             halign='left',
             valign='middle',
             text_size=(None, None)
-        ))
+        )
+        info.add_widget(self.name_label)
+        info.add_widget(self.details_label)
         self.add_widget(info)
         
         # Buttons column
@@ -127,6 +223,13 @@ class EntryRow(BoxLayout):
         btns.add_widget(delete)
         self.add_widget(btns)
 
+    def refresh_view_attrs(self, rv, index, data):
+        # called whenever this row is (re)used; scores may have changed in place
+        entry = data['entry']
+        self.name_label.text = entry.get('name','Unknown')
+        self.details_label.text = f"Phone: {entry.get('phone','N/A')} | Score: {entry.get('score',0)}"
+        return super().refresh_view_attrs(rv, index, data)
+
     def on_edit(self, *a):
         App.get_running_app().open_add_edit_dialog(self.entry)
 
@@ -134,13 +237,41 @@ class EntryRow(BoxLayout):
         App.get_running_app().delete_entry(self.entry)
 
 
+class EntryList(RecycleView):
+    """Entry list that instantiates only the visible rows; data is [{'entry': e}, ...]."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.viewclass = EntryRow
+        layout = RecycleBoxLayout(orientation='vertical', spacing=dp(5), padding=dp(5),
+                                  size_hint_y=None, default_size=(None, dp(60)),
+                                  default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        self._entries = []
+        self.bind(scroll_y=self._on_scroll)
+
+    def set_entries(self, entries):
+        """Show entries (already filtered and sorted); with paging, as many pages as were shown."""
+        self._entries = entries
+        end = len(entries) if PAGE_SIZE is None else max(PAGE_SIZE, len(self.data))
+        self.data = [{'entry': e} for e in entries[:end]]
+
+    def _on_scroll(self, instance, scroll_y):
+        # scroll_y is 0 at the bottom; append the next page before it is reached
+        shown = len(self.data)
+        if scroll_y < 0.1 and shown < len(self._entries):
+            self.data.extend({'entry': e} for e in self._entries[shown:shown + PAGE_SIZE])
+
+
 class MainLayout(BoxLayout):
     """Main screen with entry list and action buttons."""
     def __init__(self, **kwargs):
         super().__init__(orientation='vertical', padding=dp(10), spacing=dp(10), **kwargs)
         
+        self.loaded = False
+
         # Top action bar
-        top = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(5))
+        self.top_bar = top = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(5))
         top.add_widget(Button(
             text='+ Add Entry',
             on_release=lambda *_: App.get_running_app().open_add_edit_dialog(),
@@ -157,12 +288,13 @@ class MainLayout(BoxLayout):
         self.add_widget(top)
 
         # Search bar
-        search_bar = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(5))
+        self.search_bar = search_bar = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(5))
         self.search_input = TextInput(
             hint_text='Search by name or phone...',
             multiline=False,
             size_hint_x=0.8
         )
+        self._search_event = None
         self.search_input.bind(text=self.on_search_text)
         search_bar.add_widget(self.search_input)
         search_bar.add_widget(Button(
@@ -172,43 +304,68 @@ class MainLayout(BoxLayout):
         ))
         self.add_widget(search_bar)
 
-        # Scrollable list
-        self.scroll = ScrollView()
-        self.list_layout = GridLayout(cols=1, spacing=dp(5), size_hint_y=None, padding=dp(5))
-        self.list_layout.bind(minimum_height=self.list_layout.setter('height'))
-        self.scroll.add_widget(self.list_layout)
-        self.add_widget(self.scroll)
-
-        self.refresh()
+        # Entry list (only visible rows are built) and the message shown when it is empty
+        self.empty_label = Label(
+            text='Loading entries...',
+            size_hint_y=None,
+            height=dp(100),
+            opacity=1
+        )
+        self.add_widget(self.empty_label)
+        self.entry_list = EntryList()
+        self.add_widget(self.entry_list)
+
+        # the entries are read in the background (PsychoApp.build); until then
+        # only the loading message is shown
+        top.disabled = True
+        search_bar.disabled = True
+
+    def on_loaded(self):
+        """Called on the Kivy thread once the entry store has been opened."""
+        self.loaded = True
+        self.top_bar.disabled = False
+        self.search_bar.disabled = False
+        self.empty_label.text = 'No entries found. Tap "+ Add Entry" to create one.'
+        # bulk changes and changes made outside the app redraw the list
+        current_entry_store().subscribe(self.on_store_changed)
+        self.refresh(search_term=self.search_input.text)
+
+    def on_store_changed(self):
+        # may be called from a worker thread; redraw on the Kivy thread
+        Clock.schedule_once(lambda dt: self.refresh(search_term=self.search_input.text))
 
     def on_search_text(self, instance, value):
-        """Filter entries by search text."""
-        self.refresh(search_term=value)
+        """Filter entries by search text once typing pauses."""
+        if self._search_event is not None:
+            self._search_event.cancel()
+        self._search_event = Clock.schedule_once(
+            lambda dt: self.refresh(search_term=self.search_input.text), SEARCH_DEBOUNCE)
 
     def refresh(self, search_term=''):
-        """Reload and display entries, optionally filtered by search term."""
-        self.list_layout.clear_widgets()
-        entries = load_entries()
-        
-        # Filter by search term
-        if search_term:
-            term = search_term.lower()
-            entries = [e for e in entries 
-                      if term in e.get('name', '').lower() or term in e.get('phone', '')]
-        
-        # Sort by score descending
-        entries.sort(key=lambda e: e.get('score', 0), reverse=True)
-        
-        if not entries:
-            self.list_layout.add_widget(Label(
-                text='No entries found. Tap "+ Add Entry" to create one.',
-                size_hint_y=None,
-                height=dp(100)
-            ))
-        else:
-            for e in entries:
-                row = EntryRow(e)
-                self.list_layout.add_widget(row)
+        """
+        Display entries, optionally filtered by search term; only the list's data
+        changes. They are read on the I/O thread, so the UI never waits for the
+        store (or for a rescore holding it).
+        """
+        if not self.loaded:
+            return
+        term = search_term.strip()
+
+        def read():
+            # re-reads the files only if another program changed them
+            store = get_entry_store()
+            # Filter by search term (the store's in-memory index)
+            entries = store.search(term) if term else store.entries()
+            # Sort by score descending
+            entries.sort(key=lambda e: e.get('score', 0), reverse=True)
+            return entries
+
+        App.get_running_app().io.submit(read, on_done=self.show_entries)
+
+    def show_entries(self, entries):
+        self.empty_label.height = 0 if entries else dp(100)
+        self.empty_label.opacity = 0 if entries else 1
+        self.entry_list.set_entries(entries)
 
 
 class PsychoApp(App):
@@ -216,15 +373,46 @@ class PsychoApp(App):
     
     def build(self):
         self.title = 'Psychological Talent Identification'
-        self.keys, self.descriptions = load_keys()
-        
-        # Run migration on first launch
-        migrated = migrate_entries_add_snapshots(self.keys)
-        if migrated:
-            print(f"Migrated {migrated} entries with keys snapshot")
-        
+        self.keys, self.descriptions = [], []
+        self.io = IOWorker(on_error=lambda ex: self.show_error(f'Background task failed: {ex}'))
+        # the first frame does not wait for the entries, however many there are
+        self.io.submit(self._load_data, on_done=self._data_loaded, on_error=self._load_failed)
         return MainLayout()
 
+    def _load_data(self):
+        # runs on the I/O thread
+        keys, descriptions = load_keys()
+        # keys the stored scores were last fully recalculated against; only
+        # touched on the I/O thread, which runs the rescores one at a time
+        self._scored_keys = keys
+        # Upgrade older data once; current data only has its format version read
+        migrated = migrate_entry_format(keys, progress=self._migration_progress)
+        store = get_entry_store()
+        store.build_search_index()
+        store.build_identity_index()
+        return keys, descriptions, migrated
+
+    def _migration_progress(self, done, total):
+        text = f'Updating entries to the current format... {done * 100 // max(total, 1)}%'
+        Clock.schedule_once(lambda dt: setattr(self.root.empty_label, 'text', text))
+
+    def _data_loaded(self, result):
+        self.keys, self.descriptions, migrated = result
+        if migrated:
+            log.info('Migrated entries to format %s: %s', FORMAT_VERSION, migrated)
+        self.root.on_loaded()
+
+    def _load_failed(self, ex):
+        # the list stays disabled; say so instead of 'Loading entries...'
+        self.root.empty_label.text = 'Entries could not be loaded.'
+        self.show_error(f'Failed to load entries: {ex}')
+
+    def on_resume(self):
+        # re-read entries only if they were changed while the app was paused;
+        # a reload notifies MainLayout.on_store_changed
+        if self.root.loaded:
+            self.io.submit(get_entry_store)
+
     def refresh_ui(self):
         """Refresh the main list."""
         self.root.refresh()
@@ -281,34 +469,53 @@ class PsychoApp(App):
             if not n:
                 self.show_error('Name is required')
                 return
-            
-            # Snapshot current keys with this entry
-            keys_snapshot = copy.deepcopy(self.keys)
-            score = compute_score_from_keys(keys_snapshot, a_text)
-            
-            new_entry = {
-                'name': n,
-                'phone': p,
-                'answers': a_text,
-                'score': score,
-                'keys_snapshot': keys_snapshot
-            }
-            
-            entries = load_entries()
-            if entry:
-                # Replace matching entry
-                for i, e in enumerate(entries):
-                    if (e.get('name') == entry.get('name') and 
-                        e.get('phone') == entry.get('phone') and 
-                        e.get('answers') == entry.get('answers')):
-                        entries[i] = new_entry
-                        break
-            else:
-                entries.append(new_entry)
-            
-            save_entries(entries)
-            self.refresh_ui()
-            popup.dismiss()
+
+            keys = self.keys
+
+            def save_entry():
+                # runs on the I/O thread, like every use of the store
+                store = get_entry_store()
+                # same person with the same answers, however name and phone are written
+                own = store.find_entry(entry) if entry else None
+                duplicates = [s for s in store.find_duplicates(n, p, a_text) if s != own]
+                if duplicates:
+                    other = store.get(duplicates[0])
+                    raise DuplicateEntryError(
+                        f"This entry already exists: {other.get('name', '')} ({other.get('phone', '')})")
+                # Snapshot current keys with this entry (interned, shared by hash)
+                keys_snapshot = store.snapshots.intern(keys)
+                score = compute_score_from_keys(keys_snapshot, a_text)
+
+                new_entry = {
+                    'name': n,
+                    'phone': p,
+                    'answers': a_text,
+                    'score': score,
+                    'keys_snapshot': keys_snapshot
+                }
+
+                if entry:
+                    # Replace the entry this dialog was opened for
+                    slot = store.find_entry(entry)
+                    if slot is None:
+                        raise LookupError('the entry is no longer in the entries file')
+                    store.update(slot, new_entry)
+                else:
+                    store.add(new_entry)
+
+            def saved(_):
+                popup.dismiss()
+                self.refresh_ui()
+
+            def failed(ex):
+                # a duplicate keeps the dialog open for correction
+                if isinstance(ex, DuplicateEntryError):
+                    self.show_error(str(ex))
+                    return
+                popup.dismiss()
+                self.show_error(f'Failed to save entry: {ex}')
+
+            self.io.submit(save_entry, write=True, on_done=saved, on_error=failed)
 
         ok.bind(on_release=on_ok)
         cancel.bind(on_release=lambda *_: popup.dismiss())
@@ -325,15 +532,18 @@ class PsychoApp(App):
         
         popup = Popup(title='Confirm Delete', content=content, size_hint=(0.8, 0.4))
         
+        def delete():
+            # runs on the I/O thread
+            store = get_entry_store()
+            slot = store.find_entry(entry)
+            if slot is None:
+                raise LookupError('the entry is no longer in the entries file')
+            store.delete(slot)
+
         def do_delete(*a):
-            entries = load_entries()
-            entries = [e for e in entries if not (
-                e.get('name') == entry.get('name') and 
-                e.get('phone') == entry.get('phone') and 
-                e.get('answers') == entry.get('answers')
-            )]
-            save_entries(entries)
-            self.refresh_ui()
+            self.io.submit(delete, write=True,
+                           on_done=lambda _: self.refresh_ui(),
+                           on_error=lambda ex: self.show_error(f'Failed to delete entry: {ex}'))
             popup.dismiss()
         
         yes_btn = Button(text='Yes, Delete', background_color=(0.8, 0.2, 0.2, 1))
@@ -346,10 +556,19 @@ class PsychoApp(App):
         popup.open()
 
     def migrate_entries(self):
-        """Manually run migration to add snapshots to entries that lack them."""
-        updated = migrate_entries_add_snapshots(self.keys)
-        self.show_info(f'Migrated {updated} entries with keys snapshot')
-        self.refresh_ui()
+        """Manually run the migrations, adding snapshots of the current keys to entries that lack them."""
+        keys = self.keys
+
+        def migrated(changed):
+            if not any(changed.values()):
+                self.show_info(f'Entries are already in the current format (version {FORMAT_VERSION})')
+                return
+            self.show_info('\n'.join(f'{name}: updated {count} entries' for name, count in changed.items()))
+
+        # not a batched write job: migrate_store() writes once per run and only
+        # locks the store for that write, so the list stays usable meanwhile
+        self.io.submit(lambda: migrate_entry_format(keys, snapshots=True), on_done=migrated,
+                       on_error=lambda ex: self.show_error(f'Migration failed: {ex}'))
 
     def open_keys_editor(self):
         """Open keys editor with recalculation support (respects snapshots)."""
@@ -382,27 +601,35 @@ class PsychoApp(App):
         def on_save(*a):
             try:
                 data = json.loads(txt.text)
-                k = data.get('keys', [])
-                d = data.get('descriptions', [])
+            except ValueError as ex:
+                self.show_error(f'Invalid JSON: {ex}')
+                return
+            if not isinstance(data, dict):
+                self.show_error('Invalid JSON: expected an object with "keys" and "descriptions"')
+                return
+            k = data.get('keys', [])
+            d = data.get('descriptions', [])
+
+            def save_and_rescore():
+                # runs on the I/O thread
                 save_keys(k, d)
-                self.keys, self.descriptions = k, d
-                
                 # Recalculate scores using each entry's snapshot (or new keys if no snapshot)
-                entries = load_entries()
-                for e in entries:
-                    ksnap = e.get('keys_snapshot')
-                    if ksnap:
-                        e['score'] = compute_score_from_keys(ksnap, e.get('answers', ''))
-                    else:
-                        # Backward compatibility
-                        e['score'] = compute_score_from_keys(self.keys, e.get('answers', ''))
-                save_entries(entries)
-                
-                self.refresh_ui()
+                # Entries without a snapshot (backward compatibility) use the new keys;
+                # only the entries the edit affects are rescored and changed scores
+                # are written in one durable step. The diff starts from the keys of
+                # the last rescore that completed, so a failed one is caught up on.
+                rescore_store(get_entry_store(), k, old_keys=self._scored_keys)
+                self._scored_keys = k
+
+            def saved(_):
+                self.keys, self.descriptions = k, d
                 popup.dismiss()
                 self.show_info('Keys saved and scores recalculated')
-            except Exception as ex:
-                self.show_error(f'Invalid JSON: {ex}')
+
+            # not a batched write job: a batch() would hold the store for the whole
+            # rescore, while rescore_store() only takes it for its final write
+            self.io.submit(save_and_rescore, on_done=saved,
+                           on_error=lambda ex: self.show_error(f'Failed to save keys: {ex}'))
 
         save.bind(on_release=on_save)
         cancel.bind(on_release=lambda *_: popup.dismiss())
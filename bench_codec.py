@@ -0,0 +1,93 @@
+"""
+Benchmark: load and save time of entries files with each available JSON codec.
+
+    python bench_codec.py [sizes...]          (default: 10000 100000 1000000)
+
+Entries look like the ones the apps write (Persian names, keys snapshot
+references). Every codec is timed with pretty (indent=2) and compact output;
+the file size of each style is shown too.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from psycho_core import codec
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+NAMES = ['علی', 'محمد', 'رضا', 'زهرا', 'فاطمه', 'مریم', 'حسین', 'Sara', 'John']
+FAMILIES = ['احمدی', 'رضایی', 'کریمی', 'محمدی', 'حسینی', 'Smith']
+
+
+def make_entries(n, questions=10):
+    rnd = random.Random(n)
+    return [{'name': f'{rnd.choice(NAMES)} {rnd.choice(FAMILIES)}',
+             'phone': '09%09d' % rnd.randrange(10 ** 9),
+             'answers': ''.join(rnd.choice('abcd') for _ in range(questions)),
+             'score': rnd.randrange(40),
+             'keys_snapshot_id': 'a1b2c3d4e5f60718'} for _ in range(n)]
+
+
+def codecs():
+    """(name, dumps(obj, pretty) -> bytes, loads(bytes)) for every installed codec."""
+    found = [('json', codec._stdlib_dumps, lambda data: json.loads(data.decode('utf-8')))]
+    if orjson is not None:
+        found.append(('orjson', lambda obj, pretty: orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0),
+                      orjson.loads))
+    if msgspec is not None:
+        encoder = msgspec.json.Encoder()
+        decoder = msgspec.json.Decoder(list[dict])
+        found.append(('msgspec', lambda obj, pretty: (msgspec.json.format(encoder.encode(obj), indent=2) if pretty
+                                                      else encoder.encode(obj)),
+                      decoder.decode))
+    return found
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def bench(n, folder):
+    entries = make_entries(n)
+    path = os.path.join(folder, 'entries.json')
+    print(f'\n{n} entries')
+    print(f"  {'codec':8} {'style':8} {'save s':>8} {'load s':>8} {'size MB':>8}")
+    for name, dumps, loads in codecs():
+        for pretty in (True, False):
+            def save():
+                with open(path, 'wb') as f:
+                    f.write(dumps(entries, pretty))
+
+            def load():
+                with open(path, 'rb') as f:
+                    return loads(f.read())
+
+            save_s, _ = timed(save)
+            load_s, loaded = timed(load)
+            assert loaded == entries
+            size = os.path.getsize(path) / 1e6
+            print(f"  {name:8} {'pretty' if pretty else 'compact':8} {save_s:8.3f} {load_s:8.3f} {size:8.1f}")
+
+
+def main(argv):
+    sizes = [int(a) for a in argv] or [10000, 100000, 1000000]
+    print(f'active codec: {codec.BACKEND} ({"pretty" if codec.PRETTY else "compact"} output)')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in sizes:
+            bench(n, folder)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
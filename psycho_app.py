@@ -2,22 +2,30 @@
 import sys
 import json
 import os
+import threading
+import time
 from datetime import datetime
 import jdatetime
-import copy
 # PyQt5 imports for GUI components
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QHeaderView, QMenuBar, QAction, QFileDialog, QSpinBox, QTextEdit, QAbstractItemView, QProgressDialog, QInputDialog
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QHeaderView, QMenuBar, QAction, QFileDialog, QSpinBox, QTextEdit, QAbstractItemView, QProgressDialog, QInputDialog, QTableView, QStyledItemDelegate
 )
-from PyQt5.QtWidgets import QScrollArea
-from PyQt5.QtWidgets import QCheckBox
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QCheckBox, QListView
+from PyQt5.QtCore import Qt, QTimer, QEvent, QLocale, QAbstractListModel, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtGui import QIcon, QDoubleValidator
+from psycho_core import EntryRepository, open_entry_store, repository_path_for
+from psycho_core import compute_score_from_keys, export_entries, remove_duplicates
+from psycho_core import FORMAT_VERSION, MANUAL_STEPS, migrate_store, pending_migrations
+from psycho_core import load_keys as read_keys_file, save_keys as write_keys_file
+from psycho_core import import_answer_sheets, merge_entry_files, rescore_store
+from psycho_core import CLASS_DB_FILE, class_db_for
 
 
 # File paths for keys and entries
 KEYS_FILE = 'keys.json'
 ENTRIES_FILE = 'entries.json'
+# search-as-you-type waits this long after the last keystroke
+SEARCH_DEBOUNCE_MS = 150
 
 
 def load_keys():
@@ -27,70 +35,50 @@ def load_keys():
         keys (list): List of dicts mapping answer letters to scores.
         descriptions (list): List of dicts mapping answer letters to descriptions.
     """
-    with open(KEYS_FILE, encoding='utf-8') as f:
-        data = json.load(f)
-    return data['keys'], data['descriptions']
+    return read_keys_file(KEYS_FILE)
 
 
-def load_entries():
-    """
-    Load all entries from entries.json. Returns an empty list if file does not exist.
-    """
-    if not os.path.exists(ENTRIES_FILE):
-        return []
-    with open(ENTRIES_FILE, encoding='utf-8') as f:
-        return json.load(f)
+_entry_store = None
+_entry_store_source = None
 
 
-def save_entries(entries):
+def get_entry_store():
     """
-    Save the list of entries to entries.json.
+    Return the entry backend for ENTRIES_FILE: the SQLite repository once entries
+    were imported into it, otherwise the journaled JSON store. The store is kept
+    for the whole process; each call checks the files on disk and re-reads them
+    only if they changed (e.g. edited by another program).
     """
-    with open(ENTRIES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(entries, f, ensure_ascii=False, indent=2)
+    global _entry_store
+    if _entry_store is None or _entry_store_source != ENTRIES_FILE:
+        _set_entry_store(open_entry_store(ENTRIES_FILE))
+    else:
+        _entry_store.refresh()
+    return _entry_store
 
 
-def compute_score_from_keys(keys, answers):
-    """Compute total score for a given answers string using provided keys list."""
-    total = 0
-    for idx, ch in enumerate(answers):
-        if idx < len(keys) and ch in keys[idx]:
-            try:
-                total += int(keys[idx][ch])
-            except Exception:
-                pass
-    return total
+def _set_entry_store(store):
+    global _entry_store, _entry_store_source
+    if _entry_store is not None and _entry_store is not store:
+        # views stay subscribed when the backend changes
+        for callback in _entry_store.listeners():
+            store.subscribe(callback)
+    _entry_store = store
+    _entry_store_source = ENTRIES_FILE
+
 
+def build_search_index(store, progress=None, is_cancelled=None):
+    """BackgroundTask body: build store's search and duplicate indexes ahead of first use."""
+    store.build_search_index()
+    store.build_identity_index()
+    return True
 
-def migrate_entries_add_snapshots(keys):
-    """For existing entries that lack a 'keys_snapshot', add a snapshot of the provided keys
-    and set a score based on that snapshot. This preserves historical scoring when keys change.
-    Returns number of updated entries.
+
+def load_entries():
     """
-    updated = 0
-    if not os.path.exists(ENTRIES_FILE):
-        return updated
-    try:
-        with open(ENTRIES_FILE, encoding='utf-8') as f:
-            entries = json.load(f)
-    except Exception:
-        return updated
-
-    for e in entries:
-        if 'keys_snapshot' not in e:
-            # store a deep copy of the keys (scores only) and recompute score
-            e['keys_snapshot'] = copy.deepcopy(keys)
-            answers = e.get('answers', '')
-            e['score'] = compute_score_from_keys(e['keys_snapshot'], answers)
-            updated += 1
-
-    if updated:
-        try:
-            with open(ENTRIES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(entries, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
-    return updated
+    Return all entries from entries.json. Returns an empty list if file does not exist.
+    """
+    return get_entry_store().entries()
 
 
 class MergeEntitiesDialog(QDialog):
@@ -111,39 +99,68 @@ class MergeEntitiesDialog(QDialog):
         self.setMinimumWidth(400)
 
     def select_files(self):
-        files, _ = QFileDialog.getOpenFileNames(self, 'Select entity JSON files', '', 'JSON Files (*.json)')
+        files, _ = QFileDialog.getOpenFileNames(self, 'Select entity files', '', 'Entity files (*.json *.jsonl)')
         if files:
             self.file_list = files
             self.merge_btn.setEnabled(len(self.file_list) >= 2)
 
     def merge_and_save(self):
-        all_entries = []
-        seen = set()
-        for file in self.file_list:
-            try:
-                with open(file, encoding='utf-8') as f:
-                    entries = json.load(f)
-                    for e in entries:
-                        key = (e['name'], e['phone'], e['answers'])
-                        if key not in seen:
-                            seen.add(key)
-                            all_entries.append(e)
-            except Exception as ex:
-                QMessageBox.warning(self, 'Error', f'Failed to read {file}: {ex}')
-                return
+        """
+        Stream the selected files into the output on a worker thread; the first
+        occurrence of each (name, phone, answers) wins, in the order selected.
+        """
         save_path, _ = QFileDialog.getSaveFileName(self, 'Save merged entities', 'merged_entities.json', 'JSON Files (*.json)')
-        if save_path:
-            try:
-                with open(save_path, 'w', encoding='utf-8') as f:
-                    json.dump(all_entries, f, ensure_ascii=False, indent=2)
-                QMessageBox.information(self, 'Success', f'Merged {len(self.file_list)} files, total {len(all_entries)} unique entries saved.')
-                self.accept()
-                # --- FINAL FIX: always update ENTRIES_FILE and reload entries in main window ---
-                if self.parent() and hasattr(self.parent(), 'set_and_reload_entries_file'):
-                    self.parent().set_and_reload_entries_file(save_path)
-            except Exception as ex:
-                QMessageBox.warning(self, 'Error', f'Failed to save: {ex}')
- 
+        if not save_path:
+            return
+        try:
+            sizes = [os.path.getsize(f) for f in self.file_list]
+        except OSError as ex:
+            QMessageBox.warning(self, 'Error', f'Failed to read: {ex}')
+            return
+        task = BackgroundTask(merge_entry_files, self.file_list, save_path)
+        progress = QProgressDialog('Merging...', 'Cancel', 0, 1000, self)
+        progress.setWindowTitle('Merge Entity Files')
+        progress.setMinimumDuration(300)
+        progress.canceled.connect(task.cancel)
+        # per-file throughput: byte offset and start time of the file being read
+        current = {'index': 0, 'start': 0, 'time': time.monotonic()}
+
+        def on_progress(done, total):
+            i = current['index']
+            while i + 1 < len(sizes) and done > sum(sizes[:i + 1]):
+                i += 1
+                current.update(index=i, start=sum(sizes[:i]), time=time.monotonic())
+            elapsed = time.monotonic() - current['time']
+            rate = (done - current['start']) / elapsed / 1e6 if elapsed > 0 else 0
+            name = os.path.basename(self.file_list[i])
+            progress.setLabelText(f'File {i + 1}/{len(sizes)}: {name}\n{rate:.1f} MB/s')
+            progress.setValue(int(done * 1000 / total) if total else 1000)
+
+        def finished(result):
+            progress.close()
+            QMessageBox.information(self, 'Success', f"Merged {result['files']} files, total {result['written']} unique entries saved "
+                                                     f"({result['duplicates']} duplicates skipped).")
+            self.accept()
+            # --- FINAL FIX: always update ENTRIES_FILE and reload entries in main window ---
+            if self.parent() and hasattr(self.parent(), 'set_and_reload_entries_file'):
+                self.parent().set_and_reload_entries_file(save_path)
+
+        def failed(message):
+            progress.close()
+            self.merge_btn.setEnabled(True)
+            QMessageBox.warning(self, 'Error', f'Failed to merge: {message}')
+
+        def cancelled():
+            progress.close()
+            self.merge_btn.setEnabled(True)
+
+        task.signals.progress.connect(on_progress)
+        task.signals.finished.connect(finished)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(cancelled)
+        self.merge_btn.setEnabled(False)
+        self._merge_task = task
+        QThreadPool.globalInstance().start(task)
 
 
 class KeysEditorDialog(QDialog):
@@ -231,45 +248,13 @@ class KeysEditorDialog(QDialog):
             self.descriptions[row] = d
 
         try:
-            with open(KEYS_FILE, 'w', encoding='utf-8') as f:
-                json.dump({'keys': self.keys, 'descriptions': self.descriptions}, f, ensure_ascii=False, indent=2)
+            # atomic replace; the previous versions are kept as keys.json.bak1..N
+            write_keys_file(KEYS_FILE, self.keys, self.descriptions)
             QMessageBox.information(self, 'Saved', 'Keys saved successfully.')
 
-            # Recalculate scores in entries.json
-            def recalc_scores():
-                if os.path.exists(ENTRIES_FILE):
-                    try:
-                        with open(ENTRIES_FILE, encoding='utf-8') as f:
-                            entries = json.load(f)
-                        for i, e in enumerate(entries):
-                            answers = e.get('answers', '')
-                            # use snapshot if present, else current keys
-                            ksnap = e.get('keys_snapshot', None)
-                            if ksnap:
-                                total = compute_score_from_keys(ksnap, answers)
-                            else:
-                                total = compute_score_from_keys(self.keys, answers)
-                            e['score'] = total
-                        with open(ENTRIES_FILE, 'w', encoding='utf-8') as f2:
-                            json.dump(entries, f2, ensure_ascii=False, indent=2)
-                    except Exception:
-                        pass
-
-            # Refresh main window after a short delay
-            def do_refresh():
-                mainwin = self.parent()
-                while mainwin and not isinstance(mainwin, QMainWindow):
-                    mainwin = mainwin.parent()
-                if not mainwin:
-                    for widget in QApplication.topLevelWidgets():
-                        if isinstance(widget, QMainWindow):
-                            mainwin = widget
-                recalc_scores()
-                QTimer.singleShot(200, lambda: None)
-
+            # Scores are recalculated in the background by MainWindow.start_rescore
+            # once this dialog has been accepted.
             self.accept()
-            # schedule UI refresh; main window will reload entries when keys editor closes
-            QTimer.singleShot(250, do_refresh)
         except Exception as ex:
             QMessageBox.warning(self, 'Error', f'Failed to save: {ex}')
 
@@ -354,36 +339,26 @@ class ClassesDialog(QDialog):
         btns.addWidget(sort_btn)
         layout.addLayout(btns)
         self.setLayout(layout)
-        self.db_path = 'class.sqlite3'
+        self.db = class_db_for(CLASS_DB_FILE)
         self.load_classes()
 
     def load_classes(self, order_by='id'):
-        import sqlite3
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
         q = 'SELECT id,name,detail,days,start_time,end_time FROM classes'
         if order_by=='name':
             q += ' ORDER BY name COLLATE NOCASE'
-        c.execute(q)
-        rows = c.fetchall()
+        rows = self.db.query(q)
         self.table.setRowCount(0)
         for r in rows:
             i = self.table.rowCount()
             self.table.insertRow(i)
             for col, val in enumerate(r[1:]):
                 self.table.setItem(i, col, QTableWidgetItem(str(val)))
-        conn.close()
 
     def add_class(self):
         dlg = ClassEditDialog(self)
         if dlg.exec_() == QDialog.Accepted:
-            import sqlite3
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('INSERT INTO classes (name,detail,days,start_time,end_time) VALUES (?,?,?,?,?)',
-                      (dlg.name, dlg.detail, dlg.days, dlg.start_time, dlg.end_time))
-            conn.commit()
-            conn.close()
+            self.db.execute('INSERT INTO classes (name,detail,days,start_time,end_time) VALUES (?,?,?,?,?)',
+                            (dlg.name, dlg.detail, dlg.days, dlg.start_time, dlg.end_time))
             self.load_classes()
 
     def edit_class(self):
@@ -398,13 +373,8 @@ class ClassesDialog(QDialog):
         end = self.table.item(row,4).text()
         dlg = ClassEditDialog(self, name, detail, days, start, end)
         if dlg.exec_() == QDialog.Accepted:
-            import sqlite3
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('UPDATE classes SET name=?,detail=?,days=?,start_time=?,end_time=? WHERE name=?',
-                      (dlg.name, dlg.detail, dlg.days, dlg.start_time, dlg.end_time, name))
-            conn.commit()
-            conn.close()
+            self.db.execute('UPDATE classes SET name=?,detail=?,days=?,start_time=?,end_time=? WHERE name=?',
+                            (dlg.name, dlg.detail, dlg.days, dlg.start_time, dlg.end_time, name))
             self.load_classes()
 
     def delete_class(self):
@@ -415,12 +385,7 @@ class ClassesDialog(QDialog):
         name = self.table.item(row,0).text()
         reply = QMessageBox.question(self, 'Delete', f'Delete class {name}?', QMessageBox.Yes|QMessageBox.No)
         if reply==QMessageBox.Yes:
-            import sqlite3
-            conn = sqlite3.connect(self.db_path)
-            c = conn.cursor()
-            c.execute('DELETE FROM classes WHERE name=?', (name,))
-            conn.commit()
-            conn.close()
+            self.db.execute('DELETE FROM classes WHERE name=?', (name,))
             self.load_classes()
 
     def open_class_view(self, row, col):
@@ -428,12 +393,7 @@ class ClassesDialog(QDialog):
         cid_item = None
         # try to fetch id by name
         name = self.table.item(row,0).text()
-        import sqlite3
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('SELECT id FROM classes WHERE name=?', (name,))
-        r = c.fetchone()
-        conn.close()
+        r = self.db.query_one('SELECT id FROM classes WHERE name=?', (name,))
         if r:
             cid = r[0]
             dlg = ClassViewDialog(self, class_id=cid)
@@ -442,15 +402,152 @@ class ClassesDialog(QDialog):
             QMessageBox.information(self, 'Class View', 'Class not found')
 
 
+def format_score(score):
+    """Attendance score as shown in the grid: 5.0 -> '5', None -> ''."""
+    if score is None:
+        return ''
+    if isinstance(score, float) and score.is_integer():
+        return str(int(score))
+    return str(score)
+
+
+class AttendanceModel(QAbstractTableModel):
+    """
+    Attendance grid for ClassViewDialog: row 0 holds each student's total, the
+    other rows one class date each, and every column one student. A cell's
+    present flag is its check state and its score its text. The view asks only
+    for visible cells, so nothing is built per cell up front. Edits are
+    remembered as dirty (row, column) pairs until save.
+    """
+    EMPTY_TEXT = 'No students. Use Import Students.'
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.students = []
+        self.dates = []
+        self.cells = {}
+        self.totals = {}
+        self.dirty = set()
+
+    def set_data(self, students, dates, cells, totals):
+        """cells: {(date_id, student_id): {'present', 'score'}}; totals: {student_id: total}."""
+        self.beginResetModel()
+        self.students = students
+        self.dates = dates
+        self.cells = cells
+        self.totals = totals
+        self.dirty = set()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.dates) + 1
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else max(1, len(self.students))
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.students[section]['name'] if self.students else 'No students'
+        return 'Total' if section == 0 else self.dates[section - 1]['date']
+
+    def cell(self, row, col):
+        return self.cells.get((self.dates[row - 1]['id'], self.students[col]['id']))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, col = index.row(), index.column()
+        if not self.students:
+            return self.EMPTY_TEXT if role == Qt.DisplayRole and row == 0 else None
+        if row == 0:
+            if role == Qt.DisplayRole:
+                return str(self.totals.get(self.students[col]['id'], 0))
+            return None
+        att = self.cell(row, col)
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if att and att.get('present') else Qt.Unchecked
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return format_score(att.get('score')) if att else ''
+        return None
+
+    def flags(self, index):
+        if not index.isValid() or index.row() == 0 or not self.students:
+            return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsUserCheckable | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.row() == 0 or not self.students:
+            return False
+        row, col = index.row(), index.column()
+        key = (self.dates[row - 1]['id'], self.students[col]['id'])
+        att = self.cells.get(key)
+        if att is None:
+            att = self.cells[key] = {'present': 0, 'score': None}
+        if role == Qt.CheckStateRole:
+            att['present'] = 1 if value == Qt.Checked else 0
+        elif role == Qt.EditRole:
+            text = str(value).strip()
+            try:
+                att['score'] = float(text) if text != '' else None
+            except ValueError:
+                return False
+        else:
+            return False
+        self.dirty.add((row, col))
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def dirty_rows(self, class_id):
+        """(class_id, date_id, student_id, present, score) for every edited cell."""
+        rows = []
+        for row, col in sorted(self.dirty):
+            att = self.cell(row, col)
+            rows.append((class_id, self.dates[row - 1]['id'], self.students[col]['id'], att['present'], att['score']))
+        return rows
+
+    def set_totals(self, totals):
+        """Update some students' totals and repaint only those Total cells."""
+        self.totals.update(totals)
+        for col, student in enumerate(self.students):
+            if student['id'] in totals:
+                idx = self.index(0, col)
+                self.dataChanged.emit(idx, idx, [Qt.DisplayRole])
+
+
+class AttendanceDelegate(QStyledItemDelegate):
+    """
+    Paints an attendance cell as its present check box plus score text (the
+    standard item painting), and creates a narrow score editor only for the cell
+    being edited. Clicking the check box toggles present without opening an editor.
+    """
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setPlaceholderText('score')
+        # scores are stored as REAL; always use '.' as the decimal point
+        validator = QDoubleValidator(editor)
+        validator.setNotation(QDoubleValidator.StandardNotation)
+        validator.setLocale(QLocale.c())
+        editor.setValidator(validator)
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setText(index.data(Qt.EditRole) or '')
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.text(), Qt.EditRole)
+
+
 class ClassViewDialog(QDialog):
     """Manage students (from entries.json), class dates, attendance (present + score).
     Layout: dates as rows, students as columns. Total row is shown at top for easy access.
-    Persists to class.sqlite3 tables created by setup_class_db()."""
+    Persists to the class.sqlite3 tables through the shared ClassDatabase."""
 
     def __init__(self, parent=None, class_id=None):
         super().__init__(parent)
         self.class_id = class_id
-        self.db_path = 'class.sqlite3'
+        self.db = class_db_for(CLASS_DB_FILE)
         self.setWindowTitle('Class View')
         self.setMinimumWidth(900)
 
@@ -470,10 +567,14 @@ class ClassViewDialog(QDialog):
         top.addStretch()
         main.addLayout(top)
 
-        # Table
-        self.table = QTableWidget()
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectItems)
+        # Table: model/view grid, editors are created only for the cell being edited
+        self.table = QTableView()
+        self.model = AttendanceModel(self)
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(AttendanceDelegate(self.table))
+        self.table.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+                                   | QAbstractItemView.AnyKeyPressed)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectItems)
         main.addWidget(self.table)
 
         # Footer
@@ -504,89 +605,26 @@ class ClassViewDialog(QDialog):
         self.load_dates()
         self.build_table()
 
-    def connect_db(self):
-        import sqlite3
-        return sqlite3.connect(self.db_path)
-
     def load_students(self):
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('SELECT id,name,phone,answers FROM class_students WHERE class_id=?', (self.class_id,))
-        rows = c.fetchall()
-        conn.close()
-        self.students = [{'id': r[0], 'name': r[1], 'phone': r[2], 'answers': r[3]} for r in rows]
+        # joined with the main entry list by entry id, so edits made there show up here
+        self.students = self.db.students_of(self.class_id, get_entry_store())
 
     def load_dates(self):
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('SELECT id,date FROM class_dates WHERE class_id=? ORDER BY id', (self.class_id,))
-        rows = c.fetchall()
-        conn.close()
+        rows = self.db.query('SELECT id,date FROM class_dates WHERE class_id=? ORDER BY id', (self.class_id,))
         self.dates = [{'id': r[0], 'date': r[1]} for r in rows]
 
     def build_table(self):
-        cols = len(self.students)
-        rows = len(self.dates) + 1
-        if cols == 0:
-            self.table.setColumnCount(1)
-            self.table.setRowCount(1)
-            self.table.setHorizontalHeaderLabels(['No students'])
-            self.table.setItem(0, 0, QTableWidgetItem('No students. Use Import Students.'))
-            return
-
-        self.table.clear()
-        self.table.setColumnCount(cols)
-        self.table.setRowCount(rows)
-        headers = [s['name'] for s in self.students]
-        self.table.setHorizontalHeaderLabels(headers)
-
-        # Total row
-        for c_idx, student in enumerate(self.students):
-            total = self.calculate_student_total(student['id'])
-            item = QTableWidgetItem(str(total))
-            item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-            self.table.setItem(0, c_idx, item)
-
-        # Dates rows
-        for r_idx, date in enumerate(self.dates, start=1):
-            for c_idx, student in enumerate(self.students):
-                widget = QWidget()
-                layout = QHBoxLayout()
-                cb = QCheckBox()
-                score_edit = QLineEdit()
-                score_edit.setFixedWidth(60)
-                att = self.load_attendance(date['id'], student['id'])
-                cb.setChecked(bool(att and att.get('present')))
-                score_edit.setText(str(att.get('score')) if att and att.get('score') is not None else '')
-                layout.addWidget(cb)
-                layout.addWidget(score_edit)
-                layout.setContentsMargins(0, 0, 0, 0)
-                widget.setLayout(layout)
-                self.table.setCellWidget(r_idx, c_idx, widget)
-
-        vlabels = ['Total'] + [d['date'] for d in self.dates]
-        self.table.setVerticalHeaderLabels(vlabels)
+        attendance, totals = self.load_class_matrix() if self.students else ({}, {})
+        self.model.set_data(self.students, self.dates, attendance, totals)
+        # sizes columns from the rows in view only
         self.table.resizeColumnsToContents()
 
     def import_students(self):
         dlg = StudentPickerDialog(self)
         if dlg.exec_() != QDialog.Accepted or not hasattr(dlg, 'selected'):
             return
-        to_add = dlg.selected
-        conn = self.connect_db()
-        c = conn.cursor()
-        inserted = 0
-        for e in to_add:
-            name = e.get('name')
-            phone = e.get('phone')
-            answers = e.get('answers', '')
-            c.execute('SELECT id FROM class_students WHERE class_id=? AND name=? AND phone=?', (self.class_id, name, phone))
-            if c.fetchone():
-                continue
-            c.execute('INSERT INTO class_students (class_id,name,phone,answers) VALUES (?,?,?,?)', (self.class_id, name, phone, answers))
-            inserted += 1
-        conn.commit()
-        conn.close()
+        # students already in the class (same entry, or same name and phone) are skipped
+        inserted = self.db.add_students(self.class_id, dlg.selected)
         self.load_students()
         self.build_table()
         QMessageBox.information(self, 'Import Students', f'Added {inserted} students.')
@@ -674,7 +712,7 @@ class ClassViewDialog(QDialog):
             self.timer_label.setText('Timer: 00:00')
 
     def delete_student(self):
-        col = self.table.currentColumn()
+        col = self.table.currentIndex().column()
         if col < 0 or col >= len(self.students):
             QMessageBox.warning(self, 'Delete Student', 'Select a student column to delete')
             return
@@ -682,12 +720,8 @@ class ClassViewDialog(QDialog):
         reply = QMessageBox.question(self, 'Delete Student', f'Remove {student["name"]} from class? This will delete attendance records.', QMessageBox.Yes | QMessageBox.No)
         if reply != QMessageBox.Yes:
             return
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('DELETE FROM class_students WHERE id=?', (student['id'],))
-        c.execute('DELETE FROM attendance WHERE student_id=? AND class_id=?', (student['id'], self.class_id))
-        conn.commit()
-        conn.close()
+        # attendance records go with the student (ON DELETE CASCADE)
+        self.db.execute('DELETE FROM class_students WHERE id=?', (student['id'],))
         self.load_students()
         self.build_table()
 
@@ -695,16 +729,12 @@ class ClassViewDialog(QDialog):
         text, ok = QInputDialog.getText(self, 'Add Date', 'Enter date (YYYY-MM-DD):')
         if not ok or not text:
             return
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('INSERT INTO class_dates (class_id,date) VALUES (?,?)', (self.class_id, text))
-        conn.commit()
-        conn.close()
+        self.db.execute('INSERT INTO class_dates (class_id,date) VALUES (?,?)', (self.class_id, text))
         self.load_dates()
         self.build_table()
 
     def delete_date(self):
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row <= 0 or row > len(self.dates):
             QMessageBox.warning(self, 'Delete Date', 'Select a date row to delete')
             return
@@ -712,65 +742,188 @@ class ClassViewDialog(QDialog):
         reply = QMessageBox.question(self, 'Delete Date', f'Delete date {date["date"]}?', QMessageBox.Yes | QMessageBox.No)
         if reply != QMessageBox.Yes:
             return
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('DELETE FROM class_dates WHERE id=?', (date['id'],))
-        c.execute('DELETE FROM attendance WHERE date_id=?', (date['id'],))
-        conn.commit()
-        conn.close()
+        self.db.execute('DELETE FROM class_dates WHERE id=?', (date['id'],))
         self.load_dates()
         self.build_table()
 
-    def load_attendance(self, date_id, student_id):
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('SELECT present,score FROM attendance WHERE date_id=? AND student_id=?', (date_id, student_id))
-        r = c.fetchone()
-        conn.close()
-        if r:
-            return {'present': r[0], 'score': r[1]}
-        return None
+    def load_class_matrix(self):
+        """
+        Load the whole attendance matrix of this class and every student's total
+        in two queries, instead of one query per cell.
+        Returns ({(date_id, student_id): {'present', 'score'}}, {student_id: total}).
+        """
+        rows = self.db.query('SELECT date_id,student_id,present,score FROM attendance WHERE class_id=?',
+                             (self.class_id,))
+        attendance = {(date_id, student_id): {'present': present, 'score': score}
+                      for date_id, student_id, present, score in rows}
+        return attendance, self.load_totals('class_id=?', [self.class_id])
+
+    def load_totals(self, where, params):
+        """{student_id: total score} from the student_stats aggregate (kept up to date by triggers)."""
+        rows = self.db.query(f'SELECT student_id, score_total, scored_count FROM student_stats WHERE {where}', params)
+        return {student_id: total if scored else 0 for student_id, total, scored in rows}
 
     def save_all(self):
         if len(self.students) == 0:
             QMessageBox.information(self, 'Save', 'No students to save')
             return
-        conn = self.connect_db()
-        c = conn.cursor()
-        for r_idx, date in enumerate(self.dates, start=1):
-            for c_idx, student in enumerate(self.students):
-                widget = self.table.cellWidget(r_idx, c_idx)
-                if not widget:
-                    continue
-                cb = widget.layout().itemAt(0).widget()
-                score_edit = widget.layout().itemAt(1).widget()
-                present = 1 if cb.isChecked() else 0
-                score_text = score_edit.text().strip()
-                score_val = score_text if score_text != '' else None
-                c.execute('SELECT id FROM attendance WHERE date_id=? AND student_id=?', (date['id'], student['id']))
-                if c.fetchone():
-                    c.execute('UPDATE attendance SET present=?, score=? WHERE date_id=? AND student_id=?', (present, score_val, date['id'], student['id']))
-                else:
-                    c.execute('INSERT INTO attendance (class_id,date_id,student_id,present,score) VALUES (?,?,?,?,?)', (self.class_id, date['id'], student['id'], present, score_val))
-        conn.commit()
-        conn.close()
-        self.build_table()
+        # only cells edited since the last save are written
+        rows = self.model.dirty_rows(self.class_id)
+        if rows:
+            with self.db.transaction():
+                self.db.executemany(
+                    'INSERT INTO attendance (class_id,date_id,student_id,present,score) VALUES (?,?,?,?,?) '
+                    'ON CONFLICT (date_id, student_id) DO UPDATE SET present=excluded.present, score=excluded.score',
+                    rows)
+            self.update_totals({c_idx for _, c_idx in self.model.dirty})
+        self.model.dirty = set()
         QMessageBox.information(self, 'Saved', 'Attendance saved.')
 
-    def calculate_student_total(self, student_id):
-        conn = self.connect_db()
-        c = conn.cursor()
-        c.execute('SELECT score FROM attendance WHERE student_id=? AND class_id=?', (student_id, self.class_id))
-        rows = c.fetchall()
-        conn.close()
-        total = 0
-        for r in rows:
-            try:
-                val = float(r[0]) if r[0] is not None and r[0] != '' else 0
-            except Exception:
-                val = 0
-            total += val
-        return total
+    def update_totals(self, columns):
+        """Refresh the Total row for the given student columns only."""
+        ids = [self.students[c]['id'] for c in columns]
+        totals = self.load_totals(f"student_id IN ({','.join('?' * len(ids))})", ids)
+        self.model.set_totals({i: totals.get(i, 0) for i in ids})
+
+
+def _percent(part, whole):
+    return f'{100.0 * part / whole:.1f}%' if whole else ''
+
+
+def _average(total, count):
+    return f'{total / count:.2f}' if count else ''
+
+
+class ClassReportDialog(QDialog):
+    """Attendance and score statistics per class and per student.
+    Reads only the class_stats/student_stats aggregates, which triggers keep
+    current, so the attendance table is never scanned."""
+    CLASS_HEADERS = ['Class', 'Students', 'Dates', 'Attendance', 'Average score', 'Total score']
+    STUDENT_HEADERS = ['Name', 'Phone', 'Present', 'Attendance', 'Average score', 'Total score']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Class Report')
+        self.setMinimumWidth(800)
+        self.db = class_db_for(CLASS_DB_FILE)
+        layout = QVBoxLayout()
+        self.class_table = self._make_table(self.CLASS_HEADERS)
+        self.class_table.itemSelectionChanged.connect(self.load_students)
+        self.student_table = self._make_table(self.STUDENT_HEADERS)
+        layout.addWidget(QLabel('Classes'))
+        layout.addWidget(self.class_table)
+        layout.addWidget(QLabel('Students of the selected class'))
+        layout.addWidget(self.student_table)
+        close_btn = QPushButton('Close')
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        self.setLayout(layout)
+        self.load_classes()
+
+    def _make_table(self, headers):
+        table = QTableWidget(0, len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectRows)
+        table.setSelectionMode(QTableWidget.SingleSelection)
+        return table
+
+    def _fill(self, table, rows):
+        table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for col, val in enumerate(row):
+                table.setItem(i, col, QTableWidgetItem(str(val)))
+
+    def load_classes(self):
+        rows = self.db.query(
+            'SELECT c.id, c.name, s.student_count, s.date_count, s.present_count, s.scored_count, s.score_total '
+            'FROM classes c JOIN class_stats s ON s.class_id = c.id ORDER BY c.name COLLATE NOCASE')
+        self.classes = [(r[0], r[3]) for r in rows]
+        self._fill(self.class_table, [
+            (name, students, dates, _percent(present, students * dates), _average(total, scored), format_score(total))
+            for _, name, students, dates, present, scored, total in rows])
+        self.student_table.setRowCount(0)
+
+    def load_students(self):
+        row = self.class_table.currentRow()
+        if row < 0 or row >= len(self.classes):
+            return
+        class_id, dates = self.classes[row]
+        rows = self.db.query(
+            'SELECT cs.entry_id, cs.name, cs.phone, st.present_count, st.scored_count, st.score_total '
+            'FROM class_students cs JOIN student_stats st ON st.student_id = cs.id '
+            'WHERE cs.class_id = ?', (class_id,))
+        # names and phones come from the linked entries when they still exist
+        store = get_entry_store()
+        students = []
+        for entry_id, name, phone, present, scored, total in rows:
+            entry = store.get_by_id(entry_id)
+            if entry is not None:
+                name, phone = entry.get('name', ''), entry.get('phone', '')
+            students.append((name, phone or '', present, _percent(present, dates), _average(total, scored),
+                             format_score(total)))
+        students.sort(key=lambda s: s[0].casefold())
+        self._fill(self.student_table, students)
+
+
+def debounced_search(dialog, line_edit, search):
+    """Run search after typing pauses for SEARCH_DEBOUNCE_MS (and at once on Enter)."""
+    timer = QTimer(dialog)
+    timer.setSingleShot(True)
+    timer.setInterval(SEARCH_DEBOUNCE_MS)
+    timer.timeout.connect(search)
+    line_edit.textChanged.connect(timer.start)
+    line_edit.returnPressed.connect(timer.stop)
+    line_edit.returnPressed.connect(search)
+    return timer
+
+
+class CheckableEntriesModel(QAbstractListModel):
+    """
+    Checkable 'name | phone' list over search results. Check marks belong to the
+    entries, not the rows, so they survive new searches.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._entries = []
+        # id(entry) -> entry, in the order they were checked
+        self._checked = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        e = self._entries[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{e.get('name', '')} | {e.get('phone', '')}"
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if id(e) in self._checked else Qt.Unchecked
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        e = self._entries[index.row()]
+        if value == Qt.Checked:
+            self._checked[id(e)] = e
+        else:
+            self._checked.pop(id(e), None)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def set_entries(self, entries):
+        self.beginResetModel()
+        self._entries = entries
+        self.endResetModel()
+
+    def checked_entries(self):
+        return list(self._checked.values())
 
 
 class StudentPickerDialog(QDialog):
@@ -779,7 +932,6 @@ class StudentPickerDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle('Select Students')
         self.resize(480, 400)
-        self._entries = load_entries()
         self.selected = []
 
         v = QVBoxLayout()
@@ -791,13 +943,11 @@ class StudentPickerDialog(QDialog):
         h.addWidget(self.find_btn)
         v.addLayout(h)
 
-        self.list_widget = QWidget()
-        self.list_layout = QVBoxLayout()
-        self.list_widget.setLayout(self.list_layout)
-        self.scroll = QScrollArea()
-        self.scroll.setWidgetResizable(True)
-        self.scroll.setWidget(self.list_widget)
-        v.addWidget(self.scroll)
+        self.model = CheckableEntriesModel(self)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.model)
+        v.addWidget(self.list_view)
 
         btns = QHBoxLayout()
         self.add_btn = QPushButton('Add Selected')
@@ -809,9 +959,8 @@ class StudentPickerDialog(QDialog):
 
         self.setLayout(v)
 
-        self._checkboxes = []
+        self._search_timer = debounced_search(self, self.search, self._do_search)
         self.find_btn.clicked.connect(self._do_search)
-        self.search.returnPressed.connect(self._do_search)
         self.add_btn.clicked.connect(self._add_selected)
         self.cancel_btn.clicked.connect(self.reject)
 
@@ -819,47 +968,25 @@ class StudentPickerDialog(QDialog):
         self._do_search()
 
     def _do_search(self):
-        term = self.search.text().strip().lower()
-        # clear
-        for i in reversed(range(self.list_layout.count())):
-            item = self.list_layout.takeAt(i)
-            if item.widget():
-                item.widget().deleteLater()
-        self._checkboxes = []
-        for e in self._entries:
-            name = e.get('name','')
-            phone = e.get('phone','')
-            text = f"{name} | {phone}"
-            if term and term not in text.lower():
-                continue
-            row = QHBoxLayout()
-            cb = QCheckBox(text)
-            row.addWidget(cb)
-            widget = QWidget()
-            widget.setLayout(row)
-            self.list_layout.addWidget(widget)
-            self._checkboxes.append((cb, e))
+        self._search_timer.stop()
+        self.model.set_entries(get_entry_store().search(self.search.text()))
 
     def _add_selected(self):
-        selected = []
-        for cb, e in self._checkboxes:
-            if cb.isChecked():
-                selected.append(e)
+        selected = self.model.checked_entries()
         if not selected:
             QMessageBox.information(self, 'No Selection', 'Please select at least one student to add')
             return
         self.selected = selected
         self.accept()
 
-    
-
 
 class AddEntryDialog(QDialog):
-    """Minimal Add/Edit entry dialog used by MainWindow."""
-    def __init__(self, keys, descriptions, parent=None):
+    """Minimal Add/Edit entry dialog used by MainWindow; editing is the entry being edited, if any."""
+    def __init__(self, keys, descriptions, parent=None, editing=None):
         super().__init__(parent)
         self.keys = keys
         self.descriptions = descriptions
+        self.editing = editing
         self.result_entry = None
         self.setWindowTitle('Add / Edit Entry')
         layout = QVBoxLayout()
@@ -889,8 +1016,18 @@ class AddEntryDialog(QDialog):
         if not name:
             QMessageBox.warning(self, 'Error', 'Name required')
             return
+        store = get_entry_store()
+        # same person with the same answers, however name and phone are written (O(1) index lookup)
+        own = store.find_entry(self.editing) if self.editing is not None else None
+        duplicates = [s for s in store.find_duplicates(name, phone, answers) if s != own]
+        if duplicates:
+            other = store.get(duplicates[0])
+            QMessageBox.warning(self, 'Duplicate Entry',
+                                f"This entry already exists: {other.get('name', '')} ({other.get('phone', '')}).")
+            return
         # snapshot current keys so future key edits won't change historic scores
-        keys_snapshot = copy.deepcopy(self.keys)
+        # (interned: entries with identical keys share one stored snapshot)
+        keys_snapshot = store.snapshots.intern(self.keys)
         score = compute_score_from_keys(keys_snapshot, answers)
         self.result_entry = {'name': name, 'phone': phone, 'answers': answers, 'score': score, 'keys_snapshot': keys_snapshot}
         self.accept()
@@ -913,8 +1050,14 @@ class SearchDialog(QDialog):
         h.addWidget(self.search)
         h.addWidget(self.find_btn)
         v.addLayout(h)
-        self.table = QTableWidget(0,3)
-        self.table.setHorizontalHeaderLabels(['Name','Phone','Score'])
+        self.model = EntriesTableModel(parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         v.addWidget(self.table)
         btns = QHBoxLayout()
         close = QPushButton('Close')
@@ -923,21 +1066,122 @@ class SearchDialog(QDialog):
         btns.addWidget(close)
         v.addLayout(btns)
         self.setLayout(v)
+        self._search_timer = debounced_search(self, self.search, self.do_search)
         self.find_btn.clicked.connect(self.do_search)
-        self.search.returnPressed.connect(self.do_search)
         self.do_search()
 
     def do_search(self):
-        term = self.search.text().strip().lower()
-        self.table.setRowCount(0)
-        for e in self.entries:
-            if term and term not in (e.get('name','').lower() + ' ' + e.get('phone','')):
-                continue
-            r = self.table.rowCount()
-            self.table.insertRow(r)
-            self.table.setItem(r,0, QTableWidgetItem(e.get('name','')))
-            self.table.setItem(r,1, QTableWidgetItem(e.get('phone','')))
-            self.table.setItem(r,2, QTableWidgetItem(str(e.get('score',''))))
+        self._search_timer.stop()
+        term = self.search.text().strip()
+        self.model.set_entries(get_entry_store().search(term) if term else list(self.entries))
+
+
+class StoreSignals(QObject):
+    # store notifications can come from worker threads; Qt delivers them on the GUI thread
+    changed = pyqtSignal()
+
+
+class TaskSignals(QObject):
+    # qint64: merge progress is reported in bytes
+    progress = pyqtSignal('qint64', 'qint64')
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class BackgroundTask(QRunnable):
+    """
+    Runs a psycho_core function on a QThreadPool thread. The function receives
+    progress/is_cancelled keyword arguments and returns None when cancelled;
+    results come back to the GUI thread through signals.
+    """
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress=self.signals.progress.emit,
+                             is_cancelled=self._cancel.is_set, **self.kwargs)
+        except Exception as ex:
+            self.signals.failed.emit(str(ex))
+            return
+        if result is None:
+            self.signals.cancelled.emit()
+        else:
+            self.signals.finished.emit(result)
+
+
+class EntriesTableModel(QAbstractTableModel):
+    """
+    Read-only Name/Phone/Score model over the main window's entry list.
+    Cells are produced lazily in data(), so the view only touches visible rows;
+    single-row changes are reported incrementally instead of resetting the model.
+    """
+    HEADERS = ['Name', 'Phone', 'Score']
+
+    def __init__(self, entries=None, parent=None):
+        super().__init__(parent)
+        self._entries = entries if entries is not None else []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        e = self._entries[index.row()]
+        col = index.column()
+        if col == 0:
+            return e.get('name', '')
+        if col == 1:
+            return e.get('phone', '')
+        return str(e.get('score', ''))
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def set_entries(self, entries):
+        """Point the model at a new list (the list is shared, not copied)."""
+        self.beginResetModel()
+        self._entries = entries
+        self.endResetModel()
+
+    def entry_at(self, row):
+        return self._entries[row]
+
+    def append_entry(self, entry):
+        row = len(self._entries)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._entries.append(entry)
+        self.endInsertRows()
+
+    def replace_entry(self, row, entry):
+        self._entries[row] = entry
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+    def remove_entry(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._entries[row]
+        self.endRemoveRows()
+
+    def sort_by(self, key, reverse=False):
+        self.layoutAboutToBeChanged.emit()
+        self._entries.sort(key=key, reverse=reverse)
+        self.layoutChanged.emit()
 
 
 class MainWindow(QMainWindow):
@@ -954,9 +1198,14 @@ class MainWindow(QMainWindow):
             dlg = KeysEditorDialog(self)
             dlg.exec_()
         self.keys, self.descriptions = load_keys()
+        # keys the stored scores were last fully recalculated against
+        self._scored_keys = self.keys
 
-        # Load entries
+        # Load entries; bulk changes and edits made outside the app refresh the table
         self.entries = load_entries()
+        self.store_signals = StoreSignals()
+        self.store_signals.changed.connect(self.on_entries_changed)
+        get_entry_store().subscribe(self.store_signals.changed.emit)
 
         # Central widget and layout
         self.central = QWidget()
@@ -982,15 +1231,19 @@ class MainWindow(QMainWindow):
         btn_layout.addWidget(dedup_btn)
 
         # Table
-        self.table = QTableWidget(0, 3)
-        self.table.setHorizontalHeaderLabels(['Name', 'Phone', 'Score'])
+        # Table (model/view: rows are rendered lazily, only for the visible viewport)
+        self.model = EntriesTableModel(self.entries, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.verticalHeader().setVisible(False)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        # fixed row height keeps scrolling O(visible rows) instead of measuring every row
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.table.horizontalHeader().sectionClicked.connect(self.sort_table)
-        self.table.cellDoubleClicked.connect(self.show_details)
+        self.table.doubleClicked.connect(lambda index: self.show_details(index.row(), index.column()))
 
         layout.addLayout(btn_layout)
         layout.addWidget(self.table)
@@ -1020,18 +1273,55 @@ class MainWindow(QMainWindow):
         edit_keys_action = QAction('Edit Keys', self)
         edit_keys_action.triggered.connect(self.open_keys_editor)
         tools_menu.addAction(edit_keys_action)
+        rescore_action = QAction('Recalculate All Scores', self)
+        rescore_action.triggered.connect(lambda: self.start_rescore(full=True))
+        tools_menu.addAction(rescore_action)
         migrate_action = QAction('Migrate entries (snapshot keys)', self)
-        migrate_action.triggered.connect(self.migrate_entries_command)
+        migrate_action.triggered.connect(lambda: self.migrate_entries_command())
         tools_menu.addAction(migrate_action)
+        import_action = QAction('Bulk Import Answer Sheets', self)
+        import_action.triggered.connect(self.open_bulk_import)
+        tools_menu.addAction(import_action)
+        to_sqlite_action = QAction('Move entries to SQLite', self)
+        to_sqlite_action.triggered.connect(self.import_entries_to_sqlite)
+        tools_menu.addAction(to_sqlite_action)
+        export_json_action = QAction('Export entries to JSON', self)
+        export_json_action.triggered.connect(self.export_entries_to_json)
+        tools_menu.addAction(export_json_action)
+        cache_action = QAction('Entry Cache Statistics', self)
+        cache_action.triggered.connect(self.show_entry_cache_stats)
+        tools_menu.addAction(cache_action)
 
         # Class Management menu (non-invasive addition)
         class_menu = menubar.addMenu('Class Management')
         classes_action = QAction('Classes', self)
         classes_action.triggered.connect(self.open_class_management)
         class_menu.addAction(classes_action)
+        report_action = QAction('Class Report', self)
+        report_action.triggered.connect(self.open_class_report)
+        class_menu.addAction(report_action)
+        timings_action = QAction('Database Timings', self)
+        timings_action.triggered.connect(self.show_class_db_timings)
+        class_menu.addAction(timings_action)
 
         self.sort_column = 0
         self.sort_order = Qt.AscendingOrder
+        self._rescore_task = None
+        # a rescore requested while one runs (see start_rescore)
+        self._rescore_queued = False
+        self._rescore_full = False
+        self._migrate_task = None
+        # one-time class database schema migration
+        try:
+            self.setup_class_db()
+        except Exception:
+            pass
+        # build the search index off the GUI thread so the first search is instant
+        # the store is opened here, on the GUI thread; the worker only builds its indexes
+        self._index_task = BackgroundTask(build_search_index, get_entry_store())
+        QThreadPool.globalInstance().start(self._index_task)
+        # upgrade older entry files; on current data this only reads the format version
+        self.migrate_entries_command(startup=True)
 
     # Class Management menu is added in __init__ to avoid module-scope references
 
@@ -1068,53 +1358,49 @@ class MainWindow(QMainWindow):
             self.sort_column = column
             self.sort_order = Qt.AscendingOrder
         if column == 0:
-            self.entries.sort(key=lambda e: e['name'], reverse=self.sort_order == Qt.DescendingOrder)
+            self.model.sort_by(lambda e: e['name'], reverse=self.sort_order == Qt.DescendingOrder)
         elif column == 2:
-            self.entries.sort(key=lambda e: e['score'], reverse=self.sort_order == Qt.DescendingOrder)
-        self.refresh_table()
+            self.model.sort_by(lambda e: e['score'], reverse=self.sort_order == Qt.DescendingOrder)
 
 
     def update_footer(self):
-        try:
-            mtime = os.path.getmtime(ENTRIES_FILE)
-            dt = datetime.fromtimestamp(mtime)
-            shamsi = jdatetime.datetime.fromgregorian(datetime=dt)
-            total = len(self.entries)
-            self.footer_label.setText(
-                f"Last modified: {dt.strftime('%Y-%m-%d %H:%M:%S')} (Gregorian) / {shamsi.strftime('%Y-%m-%d %H:%M:%S')} (Shamsi) | Total entries: {total}"
-            )
-        except Exception:
+        # entries may so far live only in the journal (or the SQLite database),
+        # so the store's files are checked rather than entries.json alone
+        store = get_entry_store()
+        mtime = store.last_modified()
+        total = len(store)
+        if mtime is None:
             self.footer_label.setText('No entries file found.')
+            return
+        dt = datetime.fromtimestamp(mtime)
+        shamsi = jdatetime.datetime.fromgregorian(datetime=dt)
+        self.footer_label.setText(
+            f"Last modified: {dt.strftime('%Y-%m-%d %H:%M:%S')} (Gregorian) / {shamsi.strftime('%Y-%m-%d %H:%M:%S')} (Shamsi) | Total entries: {total}"
+        )
 
 
     def refresh_table(self):
         """
         Refresh the main table with all entries.
         """
-        self.table.setRowCount(0)
-        for e in self.entries:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(e['name']))
-            self.table.setItem(row, 1, QTableWidgetItem(e['phone']))
-            self.table.setItem(row, 2, QTableWidgetItem(str(e['score'])))
+        self.model.set_entries(self.entries)
         self.update_footer()
 
+    def on_entries_changed(self):
+        self.entries = load_entries()
+        self.refresh_table()
+
+    def changeEvent(self, event):
+        # pick up changes made by other programs when the window is brought back
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            get_entry_store()
+        super().changeEvent(event)
+
 
     def remove_duplicates(self):
-        entries = load_entries()
-        seen = set()
-        unique = []
-        for e in entries:
-            key = (e['name'], e['phone'], e['answers'])
-            if key not in seen:
-                seen.add(key)
-                unique.append(e)
-        if len(unique) < len(entries):
-            save_entries(unique)
-            self.entries = load_entries()
-            self.refresh_table()
-            QMessageBox.information(self, 'Remove Duplicates', f"Removed {len(entries) - len(unique)} duplicate entries.")
+        removed = remove_duplicates(get_entry_store())
+        if removed:
+            QMessageBox.information(self, 'Remove Duplicates', f"Removed {removed} duplicate entries.")
         else:
             QMessageBox.information(self, 'Remove Duplicates', "No duplicates found.")
 
@@ -1126,127 +1412,285 @@ class MainWindow(QMainWindow):
         dlg = AddEntryDialog(self.keys, self.descriptions, self)
         dlg.setWindowIcon(QIcon('YASA.ico'))
         if dlg.exec_() == QDialog.Accepted and dlg.result_entry:
-            entries = load_entries()  # Reload from file to get latest
-            entries.append(dlg.result_entry)
-            save_entries(entries)
-            self.entries = load_entries()  # Ensure self.entries is up to date
-            self.refresh_table()
+            get_entry_store().add(dlg.result_entry)  # appends one journal line
+            self.model.append_entry(dlg.result_entry)
+            self.update_footer()
 
     def open_edit_entry(self):
         """
         Edit the selected entry in the table.
         """
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row < 0 or row >= len(self.entries):
             QMessageBox.warning(self, 'Edit Entry', 'Please select an entry to edit.')
             return
         entry = self.entries[row]
-        dlg = AddEntryDialog(self.keys, self.descriptions, self)
+        dlg = AddEntryDialog(self.keys, self.descriptions, self, editing=entry)
         dlg.setWindowIcon(QIcon('YASA.ico'))
         dlg.name_input.setText(entry['name'])
         dlg.phone_input.setText(entry['phone'])
         dlg.answers_input.setText(entry['answers'])
         if dlg.exec_() == QDialog.Accepted and dlg.result_entry:
-            entries = load_entries()
-            # Find and update the entry by unique fields (name+phone+answers)
-            for i, e in enumerate(entries):
-                if e['name'] == entry['name'] and e['phone'] == entry['phone'] and e['answers'] == entry['answers']:
-                    entries[i] = dlg.result_entry
-                    break
-            save_entries(entries)
-            self.entries = load_entries()
-            self.refresh_table()
+            store = get_entry_store()
+            slot = store.find_entry(entry)
+            if slot is None:
+                QMessageBox.warning(self, 'Edit Entry', 'This entry is no longer in the entries file.')
+                return
+            store.update(slot, dlg.result_entry)
+            self.model.replace_entry(row, dlg.result_entry)
+            self.update_footer()
+            # class lists keep a copy of the name, phone and answers
+            kept = class_db_for(CLASS_DB_FILE).update_entry(entry, dlg.result_entry)
+            if kept:
+                QMessageBox.warning(self, 'Edit Entry',
+                                    f'{kept} class record(s) still show the old name and phone: another student '
+                                    'in the same class already has the new ones.')
 
     def open_delete_entry(self):
         """
         Delete the selected entry in the table.
         """
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row < 0 or row >= len(self.entries):
             QMessageBox.warning(self, 'Delete Entry', 'Please select an entry to delete.')
             return
         entry = self.entries[row]
         reply = QMessageBox.question(self, 'Delete Entry', f"Are you sure you want to delete entry for {entry['name']}?", QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.Yes:
-            entries = load_entries()
-            # Remove by unique fields (name+phone+answers)
-            entries = [e for e in entries if not (e['name'] == entry['name'] and e['phone'] == entry['phone'] and e['answers'] == entry['answers'])]
-            save_entries(entries)
-            self.entries = load_entries()
-            self.refresh_table()
+            store = get_entry_store()
+            slot = store.find_entry(entry)
+            if slot is None:
+                QMessageBox.warning(self, 'Delete Entry', 'This entry is no longer in the entries file.')
+                return
+            store.delete(slot)
+            self.model.remove_entry(row)
+            self.update_footer()
 
 
     def open_search(self):
         """
         Open the Search dialog for searching entries.
         """
-        self.entries = load_entries()  # Always reload before search
         dlg = SearchDialog(self.entries, self.keys, self.descriptions, self)
         dlg.setWindowIcon(QIcon('YASA.ico'))
         dlg.exec_()
-        self.entries = load_entries()  # Reload in case of changes
-        self.refresh_table()
 
     def open_merge_entities(self):
         dlg = MergeEntitiesDialog(self)
         dlg.exec_()
-        # Always reload entries after dialog closes (in case user merged)
-        self.entries = load_entries()
-        self.refresh_table()
+        # reloads (and refreshes the table) only if the merge was saved over entries.json
+        get_entry_store()
 
     def open_keys_editor(self):
         dlg = KeysEditorDialog(self)
         if dlg.exec_() == QDialog.Accepted:
             self.keys, self.descriptions = load_keys()
-            self.entries = load_entries()
-            self.refresh_table()
+            self.start_rescore()
 
-    def migrate_entries_command(self):
-        # Run migration to snapshot current keys into existing entries
-        count = migrate_entries_add_snapshots(self.keys)
-        QMessageBox.information(self, 'Migration Complete', f'Updated {count} entries with keys snapshot.')
+    def start_rescore(self, full=False):
+        """
+        Recalculate scores on a worker thread with a cancellable progress dialog.
+        Only entries affected by the keys changes since the last completed run
+        are rescored (every entry with full). Runs never overlap: a request made
+        while one is running cancels it and starts once it has stopped, so the
+        changes of a cancelled run are picked up by the next one.
+        The table is refreshed when the new scores have been written.
+        """
+        if self._rescore_task is not None:
+            self._rescore_task.cancel()
+            self._rescore_queued = True
+            self._rescore_full = self._rescore_full or full
+            return
+        store = get_entry_store()
+        keys = self.keys
+        task = BackgroundTask(rescore_store, store, keys, None if full else self._scored_keys)
+        # with old_keys only the affected entries are counted, so scale to the reported total
+        progress = QProgressDialog('Recalculating scores...', 'Cancel', 0, 1000, self)
+        progress.setWindowTitle('Recalculate Scores')
+        progress.setMinimumDuration(300)
+        progress.canceled.connect(task.cancel)
+        task.signals.progress.connect(
+            lambda done, total: progress.setValue(int(done * 1000 / total) if total else 1000))
+
+        def stopped():
+            progress.close()
+            self._rescore_task = None
+            if self._rescore_queued:
+                full = self._rescore_full
+                self._rescore_queued = self._rescore_full = False
+                self.start_rescore(full)
+
+        def finished(updated):
+            # the stored scores now match these keys
+            self._scored_keys = keys
+            stopped()
+
+        def failed(message):
+            stopped()
+            QMessageBox.warning(self, 'Recalculate Scores', f'Failed to recalculate scores: {message}')
+
+        task.signals.finished.connect(finished)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(stopped)
+        self._rescore_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def open_bulk_import(self):
+        """
+        Import answer sheets (CSV/JSONL/XLSX) on a worker thread. Rows are validated
+        against the current keys, duplicates dropped and rejects written to a report.
+        """
+        path, _ = QFileDialog.getOpenFileName(self, 'Select answer sheets', '',
+                                              'Answer sheets (*.csv *.jsonl *.xlsx)')
+        if not path:
+            return
+        task = BackgroundTask(import_answer_sheets, path, get_entry_store(), self.keys)
+        progress = QProgressDialog('Importing answer sheets...', 'Cancel', 0, 0, self)
+        progress.setWindowTitle('Bulk Import')
+        progress.setMinimumDuration(300)
+        progress.canceled.connect(task.cancel)
+        task.signals.progress.connect(lambda done, total: progress.setLabelText(f'Processed {done} rows...'))
+
+        def finished(result):
+            progress.close()
+            msg = (f"Read {result['read']} rows.\nImported: {result['imported']}\n"
+                   f"Duplicates: {result['duplicates']}\nRejected: {result['rejected']}")
+            if result['duplicates'] or result['rejected']:
+                msg += f"\n\nRejection report: {result['report']}"
+            QMessageBox.information(self, 'Bulk Import', msg)
+
+        def failed(message):
+            progress.close()
+            QMessageBox.warning(self, 'Bulk Import', f'Import failed: {message}')
+
+        task.signals.finished.connect(finished)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(progress.close)
+        self._import_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def migrate_entries_command(self, startup=False):
+        """
+        Upgrade entries to the current format on a worker thread. At startup only
+        the automatic steps (ids, timestamps) run and only failures are reported;
+        the Tools menu command also snapshots the current keys into every entry
+        that has no snapshot yet.
+        """
+        store = get_entry_store()
+        pending = pending_migrations(store)
+        if startup and not pending:
+            return
+        if self._migrate_task is not None:
+            return
+        task = BackgroundTask(migrate_store, store, self.keys, snapshots=not startup)
+        steps = len(pending) + (0 if startup else len(MANUAL_STEPS))
+        progress = QProgressDialog('Updating entries to the current format...', 'Cancel', 0,
+                                   max(len(store) * steps, 1), self)
+        progress.setWindowTitle('Migrate Entries')
+        progress.setMinimumDuration(300)
+        progress.canceled.connect(task.cancel)
+        task.signals.progress.connect(lambda done, total: progress.setValue(done))
+
+        def finished(changed):
+            progress.close()
+            self._migrate_task = None
+            if not startup:
+                if not any(changed.values()):
+                    QMessageBox.information(self, 'Migration Complete',
+                                            f'Entries are already in the current format (version {FORMAT_VERSION}).')
+                    return
+                lines = '\n'.join(f'{name}: {count} entries' for name, count in changed.items())
+                QMessageBox.information(self, 'Migration Complete', f'Updated entries:\n{lines}')
+
+        def failed(message):
+            progress.close()
+            self._migrate_task = None
+            QMessageBox.warning(self, 'Migration Failed', f'Migration failed: {message}')
+
+        def cancelled():
+            # completed steps are kept; the rest runs next time
+            progress.close()
+            self._migrate_task = None
+
+        task.signals.finished.connect(finished)
+        task.signals.failed.connect(failed)
+        task.signals.cancelled.connect(cancelled)
+        self._migrate_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def import_entries_to_sqlite(self):
+        """One-time import of entries.json into entries.sqlite3; the repository is used from then on."""
+        db_path = repository_path_for(ENTRIES_FILE)
+        if os.path.exists(db_path):
+            QMessageBox.information(self, 'Move to SQLite', f'Entries are already stored in {db_path}.')
+            return
+        repo = None
+        try:
+            repo = EntryRepository(db_path)
+            count = repo.import_json(ENTRIES_FILE)
+        except Exception as ex:
+            try:
+                if repo is not None:
+                    # an open connection keeps the file locked on Windows
+                    repo.close()
+            finally:
+                # no half-written database (or its rollback journal) is left behind
+                for path in (db_path, db_path + '-journal'):
+                    if os.path.exists(path):
+                        os.remove(path)
+            QMessageBox.warning(self, 'Error', f'Failed to import: {ex}')
+            return
+        _set_entry_store(repo)
         self.entries = load_entries()
         self.refresh_table()
+        QMessageBox.information(self, 'Move to SQLite', f'Imported {count} entries into {db_path}.')
+
+    def export_entries_to_json(self):
+        save_path, _ = QFileDialog.getSaveFileName(self, 'Export entries', ENTRIES_FILE, 'JSON Files (*.json)')
+        if not save_path:
+            return
+        try:
+            count = export_entries(get_entry_store(), save_path)
+        except Exception as ex:
+            QMessageBox.warning(self, 'Error', f'Failed to export: {ex}')
+            return
+        QMessageBox.information(self, 'Export', f'Exported {count} entries to {save_path}.')
+
     # --- Class management DB helper ---
     def setup_class_db(self):
-        import sqlite3
-        db_path = 'class.sqlite3'
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        # classes table: id, name, detail, days (csv), start_time, end_time
-        c.execute('''CREATE TABLE IF NOT EXISTS classes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            detail TEXT,
-            days TEXT,
-            start_time TEXT,
-            end_time TEXT
-        )''')
-        # class_students: id, class_id, entry_name, entry_phone, entry_answers
-        c.execute('''CREATE TABLE IF NOT EXISTS class_students (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            class_id INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            phone TEXT,
-            answers TEXT
-        )''')
-        # class_dates: id, class_id, date TEXT
-        c.execute('''CREATE TABLE IF NOT EXISTS class_dates (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            class_id INTEGER NOT NULL,
-            date TEXT
-        )''')
-        # attendance: id, class_id, date_id, student_id, present INTEGER, score TEXT
-        c.execute('''CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            class_id INTEGER NOT NULL,
-            date_id INTEGER NOT NULL,
-            student_id INTEGER NOT NULL,
-            present INTEGER DEFAULT 0,
-            score TEXT
-        )''')
-        conn.commit()
-        conn.close()
+        """Open the shared class database; its schema is migrated once, on first open."""
+        return class_db_for(CLASS_DB_FILE)
+
+    def show_entry_cache_stats(self):
+        stats = get_entry_store().cache_stats()
+        checks = stats['hits'] + stats['misses']
+        QMessageBox.information(self, 'Entry Cache Statistics', (
+            f"Entries in memory: {stats['entries']}\n"
+            f"File checks: {checks}\n"
+            f"Hits (files unchanged): {stats['hits']}\n"
+            f"Misses (files changed, re-read): {stats['misses']}\n\n"
+            'Watched files:\n' + '\n'.join(stats['files'])))
+
+    def show_class_db_timings(self):
+        timings = self.setup_class_db().timings()
+        if not timings:
+            QMessageBox.information(self, 'Database Timings', 'No class database queries yet.')
+            return
+        lines = [f'{secs * 1000:9.1f} {calls:7d}   {" ".join(sql.split())[:100]}' for sql, calls, secs in timings[:20]]
+        dlg = QDialog(self)
+        dlg.setWindowTitle('Database Timings')
+        layout = QVBoxLayout()
+        text = QTextEdit()
+        text.setReadOnly(True)
+        text.setPlainText('    total ms   calls   query\n' + '\n'.join(lines))
+        layout.addWidget(text)
+        dlg.setLayout(layout)
+        dlg.resize(900, 400)
+        dlg.exec_()
+
+    def open_class_report(self):
+        dlg = ClassReportDialog(self)
+        dlg.exec_()
 
     def open_class_management(self):
         # Ensure DB exists
@@ -0,0 +1,21 @@
+"""
+GUI-free core shared by the desktop (PyQt5) and Android (Kivy) apps.
+"""
+from .changes import ChangeTracking, file_signature
+from .base import EntryStoreBase
+from .entries import (IdentityIndex, canonical_phone, entry_key, identity_key, identity_of, new_entry_id,
+                      normalize_identity)
+from .search import SearchIndex, normalize_phone, normalize_text
+from .journal import JournaledEntryStore
+from .repository import EntryRepository, load_entries, open_entry_store, repository_path_for, save_entries
+from .scoring import CompiledKeys, compile_keys, compute_score_from_keys, score_answers_batch, score_entries
+from .snapshots import MissingSnapshotError, SnapshotTable, canonical_keys, snapshot_id, snapshot_table_for
+from .rescore import affected_entries, changed_cells, rescore_store
+from .importer import import_answer_sheets
+from .merge import HashedKeySet, iter_json_entries, merge_entry_files
+from .atomic import BACKUP_GENERATIONS, atomic_write, backup_paths
+from .keys import load_keys, save_keys
+from .migrations import (FORMAT_VERSION, MANUAL_STEPS, MIGRATIONS, format_of, migrate_store, pending_migrations,
+                         stamp)
+from .maintenance import export_entries, remove_duplicates, unique_entries
+from .classdb import CLASS_DB_FILE, ClassDatabase, class_db_for
@@ -0,0 +1,61 @@
+"""
+Crash-safe file replacement with rotating backups.
+
+atomic_write() writes the new content to a temporary file in the same
+directory, fsyncs it and swaps it in with os.replace(), so the target always
+holds either the old or the new content, never a truncated mix. Before the
+swap the current file becomes the newest of `backups` generations
+(path.bak1 newest ... path.bakN oldest). The current file is copied, not
+linked, so a program that edits it in place cannot change the backup as well;
+older generations are rotated by renaming.
+"""
+import os
+import shutil
+
+
+BACKUP_GENERATIONS = 3
+
+
+def backup_paths(path, backups=BACKUP_GENERATIONS):
+    """Backup file names of path, newest first."""
+    return [f'{path}.bak{i}' for i in range(1, backups + 1)]
+
+
+def _fsync_dir(folder):
+    # makes the rename itself durable; directories cannot be opened on Windows
+    try:
+        fd = os.open(folder or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _rotate(path, backups):
+    names = backup_paths(path, backups)
+    for older, newer in reversed(list(zip(names[1:], names[:-1]))):
+        if os.path.exists(newer):
+            os.replace(newer, older)
+    shutil.copy2(path, names[0])
+
+
+def atomic_write(path, data, backups=BACKUP_GENERATIONS):
+    """Durably replace path with data (bytes), keeping `backups` previous versions."""
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if backups and os.path.exists(path):
+            _rotate(path, backups)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _fsync_dir(os.path.dirname(path))
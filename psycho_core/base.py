@@ -0,0 +1,176 @@
+"""
+Behaviour shared by the entry stores (JournaledEntryStore, EntryRepository).
+
+A store keeps its entries in memory in numbered slots (journal slots or SQLite
+row ids): _entries maps slot -> entry, _slots maps id(entry) -> slot and _by_id
+maps entry id -> slot. The search and duplicate indexes are built on first use
+and then kept current by _put() and _pop(); they hold entries, not slots, so
+they survive renumbering. Every method here expects or takes the store's _lock.
+"""
+from .changes import ChangeTracking
+from .entries import IdentityIndex, identity_of, new_entry_id
+from .migrations import format_of
+from .search import SearchIndex
+
+
+class EntryStoreBase(ChangeTracking):
+    """
+    Base class of the entry stores. Subclasses set _entries, _slots, _by_id,
+    _search, _duplicates and _format when loading, and provide
+    set_format_version() and apply_changes().
+    """
+
+    # --- reading ---
+    def entries(self):
+        """Return a new list of all entries (the entry dicts themselves are shared)."""
+        with self._lock:
+            return list(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def slot_of(self, entry):
+        """Return the slot holding this exact entry object, or None."""
+        return self._slots.get(id(entry))
+
+    def get(self, slot):
+        return self._entries.get(slot)
+
+    def find_id(self, entry_id):
+        """Return the slot of the entry with this id (see entries.new_entry_id), or None."""
+        return self._by_id.get(entry_id) if entry_id else None
+
+    def find_entry(self, entry):
+        """
+        Slot of entry: the stored object itself (O(1)), else the entry with its id,
+        else the oldest with its (name, phone, answers). None if it is not stored.
+        The object comes first, so a copy sharing its id cannot be hit instead.
+        """
+        with self._lock:
+            slot = self._slots.get(id(entry))
+            if slot is None:
+                slot = self.find_id(entry.get('id'))
+            if slot is None:
+                slots = self.find_identity(*identity_of(entry))
+                slot = slots[0] if slots else None
+            return slot
+
+    def get_by_id(self, entry_id):
+        slot = self.find_id(entry_id)
+        return None if slot is None else self._entries.get(slot)
+
+    def build_identity_index(self):
+        """Build the duplicate index now (e.g. on a worker thread) instead of on the first check."""
+        with self._lock:
+            if self._duplicates is None:
+                self._duplicates = IdentityIndex(self._entries.values())
+            return self._duplicates
+
+    def find_duplicates(self, name, phone, answers):
+        """
+        Return the slots of entries with the same normalized identity (see
+        entries.py), oldest first: "0912 345 6789" matches "+989123456789".
+        """
+        with self._lock:
+            return sorted(self._slots[id(e)] for e in self.build_identity_index().find(name, phone, answers))
+
+    def build_search_index(self):
+        """Build the search index now (e.g. on a worker thread) instead of on the first search."""
+        with self._lock:
+            if self._search is None:
+                self._search = SearchIndex(self._entries.values())
+            return self._search
+
+    def search(self, term):
+        """Return entries whose name or phone contains term (normalized, see search.py)."""
+        with self._lock:
+            return self.build_search_index().search(term)
+
+    # --- format version (see migrations.py) ---
+    def format_version(self):
+        """Format version of the stored entries; no disk access."""
+        return self._format
+
+    def _note_format(self, entries):
+        # recorded before the entries are written, so a crash in between errs on the safe side
+        version = format_of(entries, self._format)
+        if version < self._format:
+            self.set_format_version(version)
+
+    def advance_format_version(self, version):
+        """
+        Record version as reached (see migrate_store), checked against the entries
+        stored now: entries written while a migration ran may still need a step.
+        O(n) once per migration. Returns the version recorded.
+        """
+        with self._lock:
+            version = format_of(self._entries.values(), version)
+            if version > self._format:
+                self.set_format_version(version)
+            return self._format
+
+    # --- writes ---
+    def apply_scores(self, updates):
+        """
+        Set new scores for (entry, score) pairs in one durable step (see
+        apply_changes). Returns the number of entries updated.
+        """
+        return self.apply_changes([(e, {'score': score}) for e, score in updates])
+
+    def _restamp_duplicate_ids(self):
+        """
+        Give every entry whose id an older entry already has (e.g. merged copies of
+        an edited entry) a new id, so that an id names one entry. Returns the slots
+        changed; the caller writes them back.
+        """
+        changed = []
+        for slot, e in self._entries.items():
+            if e.get('id') and self._by_id.get(e['id']) != slot:
+                e['id'] = new_entry_id()
+                self._by_id[e['id']] = slot
+                changed.append(slot)
+        return changed
+
+    # --- index upkeep ---
+    def _change(self, slot, entry, fields):
+        """Update fields of the entry in slot in place and move it in the indexes."""
+        # unindexed under the identity it has before the change
+        self._unindex(slot, entry)
+        if self._duplicates is not None:
+            self._duplicates.discard(entry)
+        entry.update(fields)
+        self._put(slot, entry)
+
+    def _put(self, slot, entry):
+        old = self._entries.get(slot)
+        if old is entry:
+            # re-put by _change(), which has unindexed it already
+            old = None
+        if old is not None:
+            self._unindex(slot, old)
+        self._entries[slot] = entry
+        self._slots[id(entry)] = slot
+        # the first entry with an id keeps it; later ones are restamped on load
+        if entry.get('id'):
+            self._by_id.setdefault(entry['id'], slot)
+        if self._search is not None:
+            # an entry already in the index is re-indexed in place
+            self._search.add(entry, replaces=old)
+        if self._duplicates is not None:
+            if old is not None:
+                self._duplicates.discard(old)
+            self._duplicates.add(entry)
+
+    def _pop(self, slot):
+        old = self._entries.pop(slot)
+        self._unindex(slot, old)
+        if self._search is not None:
+            self._search.discard(old)
+        if self._duplicates is not None:
+            self._duplicates.discard(old)
+        return old
+
+    def _unindex(self, slot, entry):
+        self._slots.pop(id(entry), None)
+        if self._by_id.get(entry.get('id')) == slot:
+            del self._by_id[entry.get('id')]
@@ -0,0 +1,85 @@
+"""
+Change detection and change notifications for the entry stores.
+
+A store keeps its entries in memory and remembers the size and modification
+time of its files after every load and every write of its own. refresh()
+compares them with the files on disk: if they match, the cached entries are
+still current (a hit). If they differ, the store checks the content as well,
+so a file that was only touched is not parsed again. Only a real change (made
+by another program, another process or an edit by hand) reloads the entries
+(a miss) and notifies the subscribers.
+"""
+import os
+
+
+def file_signature(path):
+    """(mtime_ns, size) of path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ChangeTracking:
+    """
+    Mixin for the entry stores. The store provides _lock, _watched_paths(),
+    _content_changed(old_signature) and _load(), and calls _remember_files()
+    after loading and after each of its own writes.
+    """
+
+    def _init_tracking(self):
+        self._listeners = []
+        self._files = None
+        self.hits = 0
+        self.misses = 0
+
+    def _file_signatures(self):
+        return tuple(file_signature(p) for p in self._watched_paths())
+
+    def _remember_files(self):
+        self._files = self._file_signatures()
+
+    def last_modified(self):
+        """Newest modification time (seconds since the epoch) of the store's files, or None if none exists."""
+        times = [sig[0] for sig in self._file_signatures() if sig is not None]
+        return max(times) / 1e9 if times else None
+
+    def subscribe(self, callback):
+        """Call callback() after the entries were reloaded or changed in bulk."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def listeners(self):
+        return list(self._listeners)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self):
+        # called without holding _lock; listeners may run on a worker thread
+        for callback in list(self._listeners):
+            callback()
+
+    def refresh(self):
+        """Reload if the files changed since they were last read or written. Returns True if reloaded."""
+        with self._lock:
+            files = self._file_signatures()
+            if files == self._files:
+                self.hits += 1
+                return False
+            if not self._content_changed(self._files):
+                # touched or rewritten with the same content
+                self._files = files
+                self.hits += 1
+                return False
+            self.misses += 1
+            self._load()
+        self._notify()
+        return True
+
+    def cache_stats(self):
+        """Counters for the debug panel."""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self),
+                'files': list(self._watched_paths())}
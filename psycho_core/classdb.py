@@ -0,0 +1,414 @@
+"""
+Access layer for the class management database (class.sqlite3).
+
+One ClassDatabase is shared per file (see class_db_for()). The schema is
+migrated once, when it is first opened, using PRAGMA user_version. Each thread
+gets its own long-lived connection in WAL mode with foreign keys enforced, so
+deleting a class cascades to its students, dates and attendance. Compiled
+statements are cached by the sqlite3 module, so repeated queries are not
+re-prepared. Connections run in autocommit mode; group writes with
+``with db.transaction():``. Every statement is timed per SQL text, see timings().
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+CLASS_DB_FILE = 'class.sqlite3'
+# Compiled statements kept per connection
+STATEMENT_CACHE = 256
+
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    # WAL + NORMAL: a commit survives an application crash, and the database stays consistent on power loss
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-8000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON',
+]
+
+
+def _is_num(col):
+    """SQL: 1 when col holds a number (scores that are not numbers count as 0)."""
+    return f"(typeof({col}) IN ('integer', 'real'))"
+
+
+def _num(col):
+    return f"(CASE WHEN typeof({col}) IN ('integer', 'real') THEN {col} ELSE 0 END)"
+
+
+def _add_stats(row, sign):
+    """Trigger body adding (sign '+') or removing (sign '-') one attendance row from the aggregates."""
+    deltas = (f"record_count = record_count {sign} 1, "
+              f"present_count = present_count {sign} (COALESCE({row}.present, 0) <> 0), "
+              f"scored_count = scored_count {sign} {_is_num(row + '.score')}, "
+              f"score_total = score_total {sign} {_num(row + '.score')}")
+    return (f'UPDATE student_stats SET {deltas} WHERE student_id = {row}.student_id; '
+            f'UPDATE class_stats SET {deltas} WHERE class_id = {row}.class_id;')
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = [
+    [
+        '''CREATE TABLE IF NOT EXISTS classes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            detail TEXT,
+            days TEXT,
+            start_time TEXT,
+            end_time TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS class_students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            phone TEXT,
+            answers TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS class_dates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            date TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL,
+            date_id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            present INTEGER DEFAULT 0,
+            score TEXT
+        )''',
+    ],
+    [
+        # clean up rows the new constraints would reject: orphans first ...
+        'DELETE FROM class_students WHERE class_id NOT IN (SELECT id FROM classes)',
+        'DELETE FROM class_dates WHERE class_id NOT IN (SELECT id FROM classes)',
+        '''DELETE FROM attendance WHERE class_id NOT IN (SELECT id FROM classes)
+            OR date_id NOT IN (SELECT id FROM class_dates)
+            OR student_id NOT IN (SELECT id FROM class_students)''',
+        # ... then duplicate students (attendance moves to the first copy) and cells (the first record wins)
+        '''UPDATE attendance SET student_id = (
+            SELECT MIN(k.id) FROM class_students s JOIN class_students k
+            ON k.class_id = s.class_id AND k.name = s.name AND k.phone = s.phone
+            WHERE s.id = attendance.student_id)
+        WHERE student_id IN (
+            SELECT s.id FROM class_students s JOIN class_students k
+            ON k.class_id = s.class_id AND k.name = s.name AND k.phone = s.phone AND k.id < s.id)''',
+        '''DELETE FROM class_students WHERE EXISTS (
+            SELECT 1 FROM class_students k WHERE k.class_id = class_students.class_id
+            AND k.name = class_students.name AND k.phone = class_students.phone AND k.id < class_students.id)''',
+        '''DELETE FROM attendance WHERE id NOT IN (
+            SELECT MIN(id) FROM attendance GROUP BY date_id, student_id)''',
+        # SQLite cannot add constraints to a table in place: rebuild the child tables
+        '''CREATE TABLE class_students_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL REFERENCES classes(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            phone TEXT,
+            answers TEXT,
+            UNIQUE (class_id, name, phone)
+        )''',
+        'INSERT INTO class_students_new SELECT id, class_id, name, phone, answers FROM class_students',
+        'DROP TABLE class_students',
+        'ALTER TABLE class_students_new RENAME TO class_students',
+        '''CREATE TABLE class_dates_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL REFERENCES classes(id) ON DELETE CASCADE,
+            date TEXT
+        )''',
+        'INSERT INTO class_dates_new SELECT id, class_id, date FROM class_dates',
+        'DROP TABLE class_dates',
+        'ALTER TABLE class_dates_new RENAME TO class_dates',
+        '''CREATE TABLE attendance_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL REFERENCES classes(id) ON DELETE CASCADE,
+            date_id INTEGER NOT NULL REFERENCES class_dates(id) ON DELETE CASCADE,
+            student_id INTEGER NOT NULL REFERENCES class_students(id) ON DELETE CASCADE,
+            present INTEGER DEFAULT 0,
+            score TEXT,
+            UNIQUE (date_id, student_id)
+        )''',
+        'INSERT INTO attendance_new SELECT id, class_id, date_id, student_id, present, score FROM attendance',
+        'DROP TABLE attendance',
+        'ALTER TABLE attendance_new RENAME TO attendance',
+        'CREATE INDEX IF NOT EXISTS idx_classes_name ON classes(name)',
+        'CREATE INDEX IF NOT EXISTS idx_class_dates_class ON class_dates(class_id, id)',
+        # attendance by class (replaced by a covering index below); (date_id, student_id) is covered by the UNIQUE index
+        'CREATE INDEX IF NOT EXISTS idx_attendance_class ON attendance(class_id, student_id, score)',
+        'CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance(student_id)',
+    ],
+    [
+        # scores become REAL; values that are not numbers keep their text (REAL affinity) and count as 0
+        '''CREATE TABLE attendance_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            class_id INTEGER NOT NULL REFERENCES classes(id) ON DELETE CASCADE,
+            date_id INTEGER NOT NULL REFERENCES class_dates(id) ON DELETE CASCADE,
+            student_id INTEGER NOT NULL REFERENCES class_students(id) ON DELETE CASCADE,
+            present INTEGER DEFAULT 0,
+            score REAL,
+            UNIQUE (date_id, student_id)
+        )''',
+        "INSERT INTO attendance_new SELECT id, class_id, date_id, student_id, present, NULLIF(TRIM(score), '') FROM attendance",
+        'DROP TABLE attendance',
+        'ALTER TABLE attendance_new RENAME TO attendance',
+        'CREATE INDEX IF NOT EXISTS idx_attendance_class ON attendance(class_id, student_id, score)',
+        'CREATE INDEX IF NOT EXISTS idx_attendance_student ON attendance(student_id)',
+        # aggregates maintained by the triggers below
+        '''CREATE TABLE class_stats (
+            class_id INTEGER PRIMARY KEY REFERENCES classes(id) ON DELETE CASCADE,
+            student_count INTEGER NOT NULL DEFAULT 0,
+            date_count INTEGER NOT NULL DEFAULT 0,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            present_count INTEGER NOT NULL DEFAULT 0,
+            scored_count INTEGER NOT NULL DEFAULT 0,
+            score_total REAL NOT NULL DEFAULT 0
+        )''',
+        '''CREATE TABLE student_stats (
+            student_id INTEGER PRIMARY KEY REFERENCES class_students(id) ON DELETE CASCADE,
+            class_id INTEGER NOT NULL,
+            record_count INTEGER NOT NULL DEFAULT 0,
+            present_count INTEGER NOT NULL DEFAULT 0,
+            scored_count INTEGER NOT NULL DEFAULT 0,
+            score_total REAL NOT NULL DEFAULT 0
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_student_stats_class ON student_stats(class_id)',
+        'INSERT INTO class_stats (class_id) SELECT id FROM classes',
+        'INSERT INTO student_stats (student_id, class_id) SELECT id, class_id FROM class_students',
+        '''UPDATE class_stats SET
+            student_count = (SELECT COUNT(*) FROM class_students s WHERE s.class_id = class_stats.class_id),
+            date_count = (SELECT COUNT(*) FROM class_dates d WHERE d.class_id = class_stats.class_id)''',
+        f'''UPDATE student_stats SET (record_count, present_count, scored_count, score_total) = (
+            SELECT COUNT(*), COALESCE(SUM(present <> 0), 0), COALESCE(SUM({_is_num('score')}), 0), TOTAL({_num('score')})
+            FROM attendance a WHERE a.student_id = student_stats.student_id)''',
+        '''UPDATE class_stats SET (record_count, present_count, scored_count, score_total) = (
+            SELECT TOTAL(record_count), TOTAL(present_count), TOTAL(scored_count), TOTAL(score_total)
+            FROM student_stats s WHERE s.class_id = class_stats.class_id)''',
+        'CREATE TRIGGER class_stats_ai AFTER INSERT ON classes BEGIN INSERT INTO class_stats (class_id) VALUES (new.id); END',
+        '''CREATE TRIGGER student_stats_ai AFTER INSERT ON class_students BEGIN
+            INSERT INTO student_stats (student_id, class_id) VALUES (new.id, new.class_id);
+            UPDATE class_stats SET student_count = student_count + 1 WHERE class_id = new.class_id;
+        END''',
+        '''CREATE TRIGGER student_stats_ad AFTER DELETE ON class_students BEGIN
+            UPDATE class_stats SET student_count = student_count - 1 WHERE class_id = old.class_id;
+        END''',
+        '''CREATE TRIGGER class_dates_stats_ai AFTER INSERT ON class_dates BEGIN
+            UPDATE class_stats SET date_count = date_count + 1 WHERE class_id = new.class_id;
+        END''',
+        '''CREATE TRIGGER class_dates_stats_ad AFTER DELETE ON class_dates BEGIN
+            UPDATE class_stats SET date_count = date_count - 1 WHERE class_id = old.class_id;
+        END''',
+        f'''CREATE TRIGGER attendance_stats_ai AFTER INSERT ON attendance BEGIN
+            {_add_stats('new', '+')}
+        END''',
+        f'''CREATE TRIGGER attendance_stats_ad AFTER DELETE ON attendance BEGIN
+            {_add_stats('old', '-')}
+        END''',
+        f'''CREATE TRIGGER attendance_stats_au AFTER UPDATE ON attendance BEGIN
+            {_add_stats('old', '-')}
+            {_add_stats('new', '+')}
+        END''',
+    ],
+    [
+        # students reference their entry by id; name/phone/answers stay as a copy for
+        # the reports and for students whose entry was deleted (see students_of())
+        'ALTER TABLE class_students ADD COLUMN entry_id TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_class_students_entry ON class_students(class_id, entry_id)',
+    ],
+    [
+        # covers the class matrix (date_id, student_id, present, score by class_id): no table lookups
+        'DROP INDEX IF EXISTS idx_attendance_class',
+        'CREATE INDEX idx_attendance_class ON attendance(class_id, date_id, student_id, present, score)',
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def class_db_for(path=CLASS_DB_FILE):
+    """Return the shared ClassDatabase for path, migrating its schema on first use."""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = ClassDatabase(path)
+        return db
+
+
+class ClassDatabase:
+    """Per-thread connections to one SQLite file, with transactions and query timings."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # sql -> [calls, seconds]
+        self._stats = {}
+        self.migrate()
+
+    # --- connections ---
+    def connection(self):
+        """The calling thread's connection, opened and tuned on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=STATEMENT_CACHE)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def close(self):
+        """Close the calling thread's connection (a new one is opened on next use)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- statements ---
+    def _timed(self, sql, run):
+        start = time.perf_counter()
+        try:
+            return run()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                stat = self._stats.get(sql)
+                if stat is None:
+                    stat = self._stats[sql] = [0, 0.0]
+                stat[0] += 1
+                stat[1] += elapsed
+
+    def execute(self, sql, params=()):
+        conn = self.connection()
+        return self._timed(sql, lambda: conn.execute(sql, params))
+
+    def executemany(self, sql, seq):
+        conn = self.connection()
+        return self._timed(sql, lambda: conn.executemany(sql, seq))
+
+    def query(self, sql, params=()):
+        """Run a SELECT and return all rows."""
+        conn = self.connection()
+        return self._timed(sql, lambda: conn.execute(sql, params).fetchall())
+
+    def query_one(self, sql, params=()):
+        """Run a SELECT and return the first row, or None."""
+        conn = self.connection()
+        return self._timed(sql, lambda: conn.execute(sql, params).fetchone())
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the block in one transaction: committed on success, rolled back on
+        an exception. Nested blocks join the outermost transaction.
+        """
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield self
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield self
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.depth = 0
+
+    # --- schema ---
+    def schema_version(self):
+        return self.query_one('PRAGMA user_version')[0]
+
+    def migrate(self):
+        """Apply the migrations this database has not seen yet."""
+        if self.schema_version() >= SCHEMA_VERSION:
+            return
+        # tables are rebuilt while migrating; foreign keys cannot be toggled inside a transaction
+        self.execute('PRAGMA foreign_keys=OFF')
+        try:
+            with self.transaction():
+                version = self.schema_version()
+                for statements in MIGRATIONS[version:]:
+                    for stmt in statements:
+                        self.execute(stmt)
+                if self.query('PRAGMA foreign_key_check'):
+                    raise sqlite3.IntegrityError('foreign key violations after schema migration')
+                self.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+        finally:
+            self.execute('PRAGMA foreign_keys=ON')
+
+    # --- students ---
+    def students_of(self, class_id, store):
+        """
+        Students of a class, in the order they were added, as dicts (id, entry_id,
+        name, phone, answers). Each student is joined with its entry in store by
+        id, an O(1) lookup, so the current name, phone and answers are shown;
+        students added before entries had ids are linked by (name, phone,
+        answers). Students whose entry is gone keep the stored copy. Nothing is
+        written: copies are updated when the entry is edited (update_entry).
+        """
+        rows = self.query('SELECT id, entry_id, name, phone, answers FROM class_students '
+                          'WHERE class_id=? ORDER BY id', (class_id,))
+        students = []
+        for student_id, entry_id, name, phone, answers in rows:
+            if entry_id:
+                entry = store.get_by_id(entry_id)
+            else:
+                slots = store.find_identity(name, phone or '', answers or '')
+                entry = store.get(slots[0]) if slots else None
+            if entry is not None:
+                entry_id, name, phone, answers = (entry.get('id'), entry.get('name', ''), entry.get('phone', ''),
+                                                  entry.get('answers', ''))
+            students.append({'id': student_id, 'entry_id': entry_id, 'name': name, 'phone': phone,
+                             'answers': answers})
+        return students
+
+    def update_entry(self, old, new):
+        """
+        Refresh the student copies of an edited entry: rows linked to old by id,
+        or by (name, phone, answers) if added before entries had ids, get new's
+        id, name, phone and answers. Returns the number of rows left unchanged
+        because another student of the same class already has the new name and
+        phone.
+        """
+        where = ("WHERE entry_id=? OR (entry_id IS NULL AND name=? AND IFNULL(phone, '')=? "
+                 "AND IFNULL(answers, '')=?)")
+        params = (old.get('id'), old.get('name', ''), old.get('phone') or '', old.get('answers') or '')
+        with self.transaction():
+            matched = self.query_one('SELECT COUNT(*) FROM class_students ' + where, params)[0]
+            if not matched:
+                return 0
+            updated = self.execute('UPDATE OR IGNORE class_students SET entry_id=?, name=?, phone=?, answers=? '
+                                   + where, (new.get('id'), new.get('name', ''), new.get('phone', ''),
+                                             new.get('answers', '')) + params).rowcount
+        return matched - updated
+
+    def add_students(self, class_id, entries):
+        """Add entries to a class by id; ones already in it are skipped. Returns the number added."""
+        rows = [(class_id, e.get('id'), e.get('name'), e.get('phone'), e.get('answers', '')) for e in entries]
+        # the UNIQUE (class_id, entry_id) and (class_id, name, phone) constraints skip students already added
+        with self.transaction():
+            return self.executemany('INSERT OR IGNORE INTO class_students (class_id,entry_id,name,phone,answers) '
+                                    'VALUES (?,?,?,?,?)', rows).rowcount
+
+    # --- timings ---
+    def timings(self):
+        """Return [(sql, calls, seconds)], slowest total first."""
+        with self._stats_lock:
+            rows = [(sql, calls, secs) for sql, (calls, secs) in self._stats.items()]
+        return sorted(rows, key=lambda r: r[2], reverse=True)
+
+    def reset_timings(self):
+        with self._stats_lock:
+            self._stats = {}
@@ -0,0 +1,143 @@
+"""
+Headless command line interface: python -m psycho_core <command> ...
+
+Runs without PyQt5, Kivy or a display, e.g. from nightly jobs. Only the
+standard library is loaded at startup; NumPy is imported when a large batch
+is scored.
+"""
+import argparse
+import sys
+
+from . import codec
+from .importer import SUPPORTED_EXTENSIONS, import_answer_sheets
+from .keys import load_keys
+from .maintenance import export_entries, remove_duplicates
+from .migrations import FORMAT_VERSION, migrate_store
+from .merge import merge_entry_files
+from .repository import open_entry_store
+from .rescore import rescore_store
+from .scoring import score_answers_batch
+
+
+def cmd_score(args):
+    keys, _ = load_keys(args.keys)
+    answers = args.answers or [line.strip() for line in sys.stdin if line.strip()]
+    for a, score in zip(answers, score_answers_batch(keys, answers)):
+        print(f'{a}\t{score}')
+    return 0
+
+
+def cmd_rescore(args):
+    keys, _ = load_keys(args.keys)
+    old_keys = load_keys(args.old_keys)[0] if args.old_keys else None
+    changed = rescore_store(open_entry_store(args.entries), keys, old_keys)
+    print(f'Rescored entries: {changed} scores changed.')
+    return 0
+
+
+def cmd_merge(args):
+    result = merge_entry_files(args.files, args.output)
+    print(f"Merged {result['files']} files: {result['written']} unique entries written to {args.output}, "
+          f"{result['duplicates']} duplicates skipped.")
+    return 0
+
+
+def cmd_dedupe(args):
+    removed = remove_duplicates(open_entry_store(args.entries))
+    print(f'Removed {removed} duplicate entries.')
+    return 0
+
+
+def cmd_migrate(args):
+    keys, _ = load_keys(args.keys)
+    store = open_entry_store(args.entries)
+    changed = migrate_store(store, keys, snapshots=args.snapshots)
+    if not any(changed.values()):
+        print(f'Entries are already in the current format (version {FORMAT_VERSION}).')
+        return 0
+    for name, count in changed.items():
+        print(f'{name}: updated {count} entries.')
+    print(f'Entries are now in format version {FORMAT_VERSION}.')
+    return 0
+
+
+def cmd_search(args):
+    found = open_entry_store(args.entries).search(args.term)
+    for e in found:
+        print(f"{e.get('name', '')}\t{e.get('phone', '')}\t{e.get('score', '')}")
+    return 0 if found else 1
+
+
+def cmd_export(args):
+    count = export_entries(open_entry_store(args.entries), args.output)
+    print(f'Exported {count} entries to {args.output}.')
+    return 0
+
+
+def cmd_import(args):
+    keys, _ = load_keys(args.keys)
+    store = open_entry_store(args.entries)
+    result = import_answer_sheets(args.file, store, keys, report_path=args.report)
+    print(f"Read {result['read']} rows: imported {result['imported']}, "
+          f"{result['duplicates']} duplicates, {result['rejected']} rejected.")
+    if result['duplicates'] or result['rejected']:
+        print(f"Rejection report: {result['report']}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m psycho_core',
+        description='Headless tools for the Psychological Talent Identification data files.')
+    parser.add_argument('--entries', default='entries.json', help='entries file (default: entries.json)')
+    parser.add_argument('--keys', default='keys.json', help='keys file (default: keys.json)')
+    parser.add_argument('--compact', action='store_true',
+                        help='write JSON files without indentation (smaller and faster)')
+    sub = parser.add_subparsers(dest='command', metavar='command')
+    sub.required = True
+
+    p = sub.add_parser('score', help='score answer strings against the keys')
+    p.add_argument('answers', nargs='*', help='answer strings (read one per line from stdin if omitted)')
+    p.set_defaults(func=cmd_score)
+
+    p = sub.add_parser('rescore', help='recalculate stored scores after a keys change')
+    p.add_argument('--old-keys', help='previous keys file; only entries affected by the change are rescored')
+    p.set_defaults(func=cmd_rescore)
+
+    p = sub.add_parser('merge', help='merge entity files, keeping the first of each duplicate')
+    p.add_argument('files', nargs='+', help='JSON or JSONL entity files, in priority order')
+    p.add_argument('-o', '--output', required=True, help='merged output file')
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser('dedupe', help='remove duplicate entries')
+    p.set_defaults(func=cmd_dedupe)
+
+    p = sub.add_parser('migrate', help='upgrade entries to the current format (ids, timestamps)')
+    p.add_argument('--snapshots', action='store_true',
+                   help='also snapshot the current keys into entries without a keys snapshot')
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser('search', help='list entries whose name or phone contains a term')
+    p.add_argument('term')
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser('export', help='write all entries to a plain JSON file')
+    p.add_argument('output')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('import', help='bulk import answer sheets (' + '/'.join(SUPPORTED_EXTENSIONS) + ')')
+    p.add_argument('file', help='CSV, JSONL or XLSX file with name, phone and answers columns')
+    p.add_argument('--report', help='rejection report path (default: <file>.rejected.csv)')
+    p.set_defaults(func=cmd_import)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compact:
+        codec.set_pretty(False)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, KeyError) as ex:
+        print(f'error: {ex}', file=sys.stderr)
+        return 1
@@ -0,0 +1,98 @@
+"""
+JSON encoding and decoding of entry files.
+
+The fastest available codec is used: orjson, then msgspec, then the standard
+library json module. All of them write UTF-8 with non-ASCII text as is (like
+json.dump(..., ensure_ascii=False)) and read what the others wrote.
+
+Files are pretty-printed with a 2-space indent, as the apps have always
+written them, unless compact output is chosen with set_pretty(False) or the
+PSYCHO_JSON_STYLE=compact environment variable. Compact files are about 25%
+smaller (1.2 MB instead of 1.6 MB for 10000 entries in bench_codec.py) and
+faster to write; both styles are read the same way.
+"""
+import json
+import os
+
+from .atomic import atomic_write
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = 'orjson'
+elif msgspec is not None:
+    BACKEND = 'msgspec'
+else:
+    BACKEND = 'json'
+
+PRETTY = os.environ.get('PSYCHO_JSON_STYLE', 'pretty').lower() != 'compact'
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    # Entries are decoded as dicts, not Structs: a Struct would silently drop
+    # fields it does not declare (inline keys snapshots, fields added by hand).
+    _msgspec_entries = msgspec.json.Decoder(list[dict])
+
+
+def set_pretty(pretty):
+    """Choose indented (True) or compact (False) output for files written from now on."""
+    global PRETTY
+    PRETTY = bool(pretty)
+
+
+def _stdlib_dumps(obj, pretty):
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj, pretty=None):
+    """Encode obj as UTF-8 JSON bytes (pretty=None: use the current setting)."""
+    if pretty is None:
+        pretty = PRETTY
+    try:
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+        if msgspec is not None:
+            data = _msgspec_encoder.encode(obj)
+            return msgspec.json.format(data, indent=2) if pretty else data
+    except (TypeError, OverflowError):
+        # values the fast codecs reject (e.g. integers over 64 bits)
+        pass
+    return _stdlib_dumps(obj, pretty)
+
+
+def loads(data):
+    """Decode JSON from bytes or str. Invalid input raises ValueError with every backend."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as ex:
+            raise ValueError(str(ex))
+    return json.loads(data)
+
+
+def decode_entries(data):
+    """Decode an entries file (a JSON array of objects) from bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        try:
+            return _msgspec_entries.decode(data)
+        except msgspec.DecodeError as ex:
+            raise ValueError(str(ex))
+    return json.loads(data.decode('utf-8'))
+
+
+def write_entries(path, entries, pretty=None, backups=0):
+    """Write entries to path as a JSON array, atomically (see atomic.py)."""
+    atomic_write(path, dumps(entries, pretty), backups)
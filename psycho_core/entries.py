@@ -0,0 +1,114 @@
+"""
+Small helpers shared by every entry backend.
+
+Duplicates are recognized by the normalized identity: the name with Persian and
+Arabic letters and digits folded (see search.normalize_text) and runs of
+whitespace collapsed, the phone number in one canonical form (digits only,
+Iranian numbers as 0XXXXXXXXXX whether written 0912 345 6789, +98 912 345 6789,
+0098... or 912..., in any digits), and the answers without whitespace. Answers
+keep their case and letters as typed: scoring tells 'A' and 'a' apart, so two
+entries that only differ there are not the same test.
+identity_key() hashes it to 16 bytes for the stores' duplicate indexes.
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+
+from .search import normalize_phone, normalize_text
+
+# country calling code of numbers written without one
+COUNTRY_CODE = '98'
+
+# base64.b32encode's alphabet -> Crockford base32, as used by ULIDs
+_ULID_ALPHABET = bytes.maketrans(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567', b'0123456789ABCDEFGHJKMNPQRSTVWXYZ')
+_ulid_lock = threading.Lock()
+# (milliseconds, random part) of the last id handed out
+_ulid_last = [0, 0]
+
+
+def identity_of(entry):
+    """The (name, phone, answers) tuple the apps have always used to tell entries apart."""
+    return (entry.get('name', ''), entry.get('phone', ''), entry.get('answers', ''))
+
+
+def canonical_phone(phone):
+    """Phone number in canonical form (see module docstring); text without digits is only folded."""
+    digits = normalize_phone(phone)
+    if not digits.isdigit():
+        return ' '.join(digits.split())
+    if digits.startswith('00' + COUNTRY_CODE):
+        digits = '0' + digits[2 + len(COUNTRY_CODE):]
+    elif digits.startswith(COUNTRY_CODE) and len(digits) == 10 + len(COUNTRY_CODE):
+        digits = '0' + digits[len(COUNTRY_CODE):]
+    elif len(digits) == 10 and digits.startswith('9'):
+        # mobile number without the leading 0
+        digits = '0' + digits
+    return digits
+
+
+def normalize_identity(name, phone, answers):
+    """(name, phone, answers) normalized so that spellings of the same person compare equal."""
+    return (' '.join(normalize_text(name).split()), canonical_phone(phone),
+            ''.join(str(answers or '').split()))
+
+
+def identity_key(name, phone, answers):
+    """16-byte hash of the normalized identity, as kept by the duplicate indexes."""
+    data = '\x1f'.join(normalize_identity(name, phone, answers)).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def entry_key(entry):
+    """identity_key() of an entry."""
+    return identity_key(*identity_of(entry))
+
+
+def new_entry_id():
+    """
+    A new ULID: a 48-bit millisecond timestamp and 80 random bits as 26 Crockford
+    base32 characters, so ids sort by creation time. Ids made within the same
+    millisecond increment the random part and keep their order too.
+    """
+    ms = time.time_ns() // 1000000
+    with _ulid_lock:
+        last_ms, last_rnd = _ulid_last
+        if ms <= last_ms and last_rnd + 1 < 1 << 80:
+            ms, rnd = last_ms, last_rnd + 1
+        else:
+            ms, rnd = max(ms, last_ms + 1), int.from_bytes(os.urandom(10), 'big')
+        _ulid_last[:] = [ms, rnd]
+    # 160 bits encode to 32 characters; the last 26 hold the 128-bit value
+    data = base64.b32encode(((ms << 80) | rnd).to_bytes(20, 'big'))[-26:]
+    return data.translate(_ULID_ALPHABET).decode('ascii')
+
+
+class IdentityIndex:
+    """
+    Duplicate index: identity_key() -> the entries with that normalized identity.
+    Entries are held by object, so it survives renumbering; like SearchIndex it is
+    not thread-safe and the stores keep it current while holding their lock.
+    """
+
+    def __init__(self, entries=()):
+        self._by_key = {}
+        for e in entries:
+            self.add(e)
+
+    def add(self, entry):
+        self._by_key.setdefault(entry_key(entry), []).append(entry)
+
+    def discard(self, entry):
+        key = entry_key(entry)
+        found = self._by_key.get(key)
+        if found:
+            rest = [e for e in found if e is not entry]
+            if rest:
+                self._by_key[key] = rest
+            else:
+                del self._by_key[key]
+
+    def find(self, name, phone, answers):
+        """Entries with this normalized identity, in the order they were added."""
+        return list(self._by_key.get(identity_key(name, phone, answers), ()))
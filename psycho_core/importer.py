@@ -0,0 +1,211 @@
+"""
+Bulk import of answer sheets from CSV, JSONL or XLSX files.
+
+Rows are streamed from the input and never loaded all at once. Each row is
+validated against the keys: a name is required, there must be one answer per
+question, and each answer must be a letter of that question's key. Valid rows are
+scored in batches against one shared keys snapshot. Rows already in the store,
+or seen earlier in the same file, are dropped as duplicates; rows are compared by
+normalized identity (see entries.py), so a phone number written differently
+or a name in Arabic letters is still a duplicate. Rejected rows are
+written to a CSV report as they are found. A failed or cancelled import changes
+nothing: the SQLite repository receives the accepted entries batch by batch
+inside one open transaction (see EntryRepository.bulk_insert), so memory stays
+bounded by the batch size; the JSON store holds them, and their identity keys,
+until one add_many() call at the end.
+
+Input files need name, phone and answers columns (keys for JSONL). XLSX
+support requires openpyxl.
+"""
+import csv
+import json
+import os
+from contextlib import contextmanager
+
+from .entries import identity_key
+from .repository import EntryRepository
+from .scoring import compile_keys
+
+
+BATCH_SIZE = 2000
+REQUIRED_COLUMNS = ('name', 'phone', 'answers')
+SUPPORTED_EXTENSIONS = ('.csv', '.jsonl', '.xlsx')
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # spreadsheets hand back phone numbers as floats
+        value = int(value)
+    return str(value).strip()
+
+
+def _normalize_row(row):
+    return {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+
+
+def _check_columns(columns):
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError('Missing column(s): ' + ', '.join(missing))
+
+
+def _iter_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        _check_columns([str(c).strip().lower() for c in reader.fieldnames or ()])
+        for row in reader:
+            yield _normalize_row(row)
+
+
+def _iter_jsonl(path):
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # keep the row so it shows up in the rejection report
+                yield {'_error': 'invalid JSON line'}
+                continue
+            yield _normalize_row(row) if isinstance(row, dict) else {'_error': 'not a JSON object'}
+
+
+def _iter_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('Reading .xlsx files requires openpyxl (pip install openpyxl)')
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [_cell_text(c).lower() for c in next(rows, ())]
+        _check_columns(header)
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def iter_rows(path):
+    """Yield one dict per input row, keyed by lower-cased column name."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return _iter_csv(path)
+    if ext == '.jsonl':
+        return _iter_jsonl(path)
+    if ext == '.xlsx':
+        return _iter_xlsx(path)
+    raise ValueError(f'Unsupported file type {ext!r} (expected one of {", ".join(SUPPORTED_EXTENSIONS)})')
+
+
+def validate_row(row, keys):
+    """Return (name, phone, answers, None) for a valid row or (..., reason) for a rejected one."""
+    name = _cell_text(row.get('name'))
+    phone = _cell_text(row.get('phone'))
+    answers = _cell_text(row.get('answers'))
+    if row.get('_error'):
+        return name, phone, answers, row['_error']
+    if not name:
+        return name, phone, answers, 'name required'
+    if len(answers) != len(keys):
+        return name, phone, answers, f'expected {len(keys)} answers, got {len(answers)}'
+    for q, ch in enumerate(answers):
+        if not isinstance(keys[q], dict) or ch not in keys[q]:
+            return name, phone, answers, f'invalid answer {ch!r} for question {q + 1}'
+    return name, phone, answers, None
+
+
+def default_report_path(path):
+    return os.path.splitext(path)[0] + '.rejected.csv'
+
+
+class _Cancelled(Exception):
+    pass
+
+
+@contextmanager
+def _add_at_end(store):
+    # the JSON store commits in one add_many(), so accepted entries wait in memory
+    accepted = []
+    yield accepted.extend
+    store.add_many(accepted)
+
+
+def import_answer_sheets(path, store, keys, report_path=None, batch_size=BATCH_SIZE,
+                         progress=None, is_cancelled=None):
+    """
+    Import the answer sheets in path into store, scoring them with keys.
+
+    progress(rows_done, 0) is called after each batch (the total is unknown while
+    streaming). Returns a summary dict (read, imported, duplicates, rejected,
+    report) or None if the import was cancelled before committing.
+    """
+    if not keys:
+        raise ValueError('No keys defined; create keys.json first')
+    report_path = report_path or default_report_path(path)
+    snapshot = store.snapshots.intern(keys)
+    compiled = compile_keys(snapshot)
+    streaming = isinstance(store, EntryRepository)
+    # identity keys of accepted entries the store cannot find_duplicates() yet
+    seen = set()
+    read = imported = duplicates = rejected = 0
+    adding = store.bulk_insert() if streaming else _add_at_end(store)
+
+    try:
+        with open(report_path, 'w', encoding='utf-8-sig', newline='') as rf, adding as add:
+            report = csv.writer(rf)
+            report.writerow(['row', 'name', 'phone', 'answers', 'reason'])
+
+            def flush(batch):
+                nonlocal duplicates, imported
+                scores = compiled.score([b[3] for b in batch])
+                entries = []
+                for (row_no, name, phone, answers), score in zip(batch, scores):
+                    key = identity_key(name, phone, answers)
+                    if key in seen or store.find_duplicates(name, phone, answers):
+                        duplicates += 1
+                        report.writerow([row_no, name, phone, answers, 'duplicate'])
+                        continue
+                    seen.add(key)
+                    entries.append({'name': name, 'phone': phone, 'answers': answers,
+                                    'score': score, 'keys_snapshot': snapshot})
+                add(entries)
+                imported += len(entries)
+                if streaming:
+                    # the repository's duplicate index has them now
+                    seen.clear()
+
+            batch = []
+            # report spreadsheet-style row numbers: CSV/XLSX data starts below the header
+            first_row = 1 if path.lower().endswith('.jsonl') else 2
+            for row_no, row in enumerate(iter_rows(path), start=first_row):
+                read += 1
+                name, phone, answers, reason = validate_row(row, keys)
+                if reason:
+                    rejected += 1
+                    report.writerow([row_no, name, phone, answers, reason])
+                    continue
+                batch.append((row_no, name, phone, answers))
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+                    if progress:
+                        progress(read, 0)
+                    if is_cancelled and is_cancelled():
+                        raise _Cancelled()
+            if batch:
+                flush(batch)
+            if progress:
+                progress(read, 0)
+            if is_cancelled and is_cancelled():
+                raise _Cancelled()
+    except _Cancelled:
+        return None
+    return {'read': read, 'imported': imported, 'duplicates': duplicates,
+            'rejected': rejected, 'report': report_path}
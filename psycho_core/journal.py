@@ -0,0 +1,366 @@
+"""
+Append-only journaled storage for entries.
+
+The snapshot is the plain entries.json list the apps have always written.
+Adding, editing or deleting a single entry appends one JSON line to
+``<entries file>.journal`` instead of rewriting the snapshot, and startup
+replays the snapshot plus the journal. Once the journal grows past a
+fraction of the snapshot it is folded back into the snapshot (compaction).
+
+Keys snapshots are stored by reference (see snapshots.py); entries written by
+older versions with inline snapshots are upgraded on the first load.
+
+The first journal line records a digest of the snapshot it applies to, so a
+journal left behind by an interrupted compaction, or by someone replacing
+entries.json by hand, is discarded instead of being replayed twice. The format
+version of the entries (see migrations.py) is kept in ``<entries file>.format``
+together with the same digest, so a replaced snapshot counts as version 0.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from . import codec
+from .atomic import BACKUP_GENERATIONS, atomic_write
+from .base import EntryStoreBase
+from .changes import file_signature
+from .entries import identity_of
+from .migrations import stamp, stamp_all
+from .snapshots import snapshot_table_for
+
+JOURNAL_SUFFIX = '.journal'
+FORMAT_SUFFIX = '.format'
+# Compact once the journal holds more than max(COMPACT_MIN_OPS, COMPACT_RATIO * entries) ops
+COMPACT_MIN_OPS = 500
+COMPACT_RATIO = 0.25
+
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _dump_line(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+class JournaledEntryStore(EntryStoreBase):
+    """
+    In-memory entry list backed by a snapshot file and a write-ahead journal.
+
+    Every entry lives in a numbered slot. Slots are assigned in order while the
+    snapshot is loaded and as entries are added, so they are stable for the
+    lifetime of a journal and let edits/deletes be replayed in O(1).
+    """
+
+    def __init__(self, path, compact_min_ops=COMPACT_MIN_OPS, compact_ratio=COMPACT_RATIO,
+                 backups=BACKUP_GENERATIONS):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.format_path = path + FORMAT_SUFFIX
+        self.compact_min_ops = compact_min_ops
+        self.compact_ratio = compact_ratio
+        # previous snapshots kept as <entries file>.bak1..N (see atomic.py)
+        self.backups = backups
+        self.snapshots = snapshot_table_for(path)
+        # guards every read/write so background workers can share the store with the UI
+        self._lock = threading.RLock()
+        # journal ops held back while a batch() is open
+        self._batch_depth = 0
+        self._pending = []
+        self._init_tracking()
+        with self._lock:
+            self._load()
+
+    # --- loading ---
+    def reload(self):
+        """Read the snapshot and replay the journal on top of it."""
+        with self._lock:
+            self._load()
+        self._notify()
+
+    def _watched_paths(self):
+        return (self.path, self.journal_path)
+
+    def _content_changed(self, old_files):
+        if old_files is None or file_signature(self.journal_path) != old_files[1]:
+            return True
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        return _digest(data) != self._base
+
+    def _load(self):
+        if self._pending:
+            self._flush_pending()
+        self._reset()
+        self._journal_ops = 0
+        data = b''
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        self._base = _digest(data)
+        self._format = self._read_format()
+        legacy = False
+        if data.strip():
+            for e in codec.decode_entries(data):
+                legacy = self.snapshots.unpack(e) or legacy
+                self._put(self._next_slot, e)
+        self._replay()
+        if self._restamp_duplicate_ids():
+            legacy = True
+        if legacy:
+            # rewrite once with snapshot references instead of inline copies (and unique ids)
+            self._compact()
+        self._remember_files()
+
+    def _read_format(self):
+        try:
+            with open(self.format_path, 'rb') as f:
+                header = json.loads(f.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return 0
+        # a header written for another snapshot says nothing about this one
+        return header.get('version', 0) if header.get('base') == self._base else 0
+
+    def _save_format(self):
+        atomic_write(self.format_path, json.dumps({'version': self._format, 'base': self._base}).encode('utf-8'),
+                     backups=0)
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        good_offset = 0
+        stale = False
+        with open(self.journal_path, 'rb') as f:
+            header = f.readline()
+            try:
+                stale = json.loads(header.decode('utf-8')).get('base') != self._base
+            except ValueError:
+                stale = True
+            if not stale:
+                good_offset = f.tell()
+                for line in f:
+                    try:
+                        op = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # torn write from a crash; everything before it is valid
+                        break
+                    self._apply(op)
+                    self._journal_ops += 1
+                    good_offset += len(line)
+        if stale:
+            os.remove(self.journal_path)
+        elif good_offset < os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def _apply(self, op):
+        kind = op.get('op')
+        slot = op.get('slot')
+        if kind in ('add', 'update'):
+            self.snapshots.unpack(op['entry'])
+        if kind == 'add_many':
+            for e in op['entries']:
+                self.snapshots.unpack(e)
+                self._put(self._next_slot, e)
+        elif kind == 'add':
+            self._put(slot, op['entry'])
+        elif kind == 'update' and slot in self._entries:
+            self._put(slot, op['entry'])
+        elif kind == 'delete' and slot in self._entries:
+            self._pop(slot)
+
+    def _put(self, slot, entry):
+        super()._put(slot, entry)
+        self._identity.setdefault(identity_of(entry), []).append(slot)
+        if slot >= self._next_slot:
+            self._next_slot = slot + 1
+
+    def _unindex(self, slot, entry):
+        super()._unindex(slot, entry)
+        key = identity_of(entry)
+        slots = self._identity.get(key)
+        if slots:
+            slots.remove(slot)
+            if not slots:
+                del self._identity[key]
+
+    def _reset(self):
+        self._entries = {}
+        self._slots = {}
+        self._identity = {}
+        self._by_id = {}
+        self._next_slot = 0
+        # built on the first search / duplicate check, then kept current by _put/_pop
+        self._search = None
+        self._duplicates = None
+
+    # --- reading ---
+    def find_identity(self, name, phone, answers):
+        """Return the slots of entries with this (name, phone, answers), oldest first."""
+        return sorted(self._identity.get((name, phone, answers), ()))
+
+    def set_format_version(self, version):
+        with self._lock:
+            self._format = version
+            self._save_format()
+
+    # --- single-entry writes (O(1) disk I/O) ---
+    def add(self, entry):
+        with self._lock:
+            self._note_format([stamp(entry, taken=self._by_id)])
+            slot = self._next_slot
+            self._append({'op': 'add', 'slot': slot, 'entry': self.snapshots.pack(entry)})
+            self._put(slot, entry)
+            self._maybe_compact()
+            return slot
+
+    def add_many(self, entries):
+        """
+        Add entries as one all-or-nothing step: a single journal line (a torn line
+        is discarded on replay) or, for large batches, a fresh snapshot.
+        """
+        entries = list(entries)
+        if not entries:
+            return
+        with self._lock:
+            self._note_format(stamp_all(entries, taken=self._by_id))
+            big = self._journal_ops + len(entries) > self._compact_limit()
+            if not big:
+                self._append({'op': 'add_many', 'slot': self._next_slot,
+                              'entries': [self.snapshots.pack(e) for e in entries]})
+            for e in entries:
+                self._put(self._next_slot, e)
+            if big:
+                self._compact()
+        self._notify()
+
+    def update(self, slot, entry):
+        with self._lock:
+            if slot not in self._entries:
+                raise KeyError(slot)
+            self._note_format([stamp(entry, self._entries[slot])])
+            self._append({'op': 'update', 'slot': slot, 'entry': self.snapshots.pack(entry)})
+            self._put(slot, entry)
+            self._maybe_compact()
+
+    def delete(self, slot):
+        with self._lock:
+            if slot not in self._entries:
+                raise KeyError(slot)
+            self._append({'op': 'delete', 'slot': slot})
+            self._pop(slot)
+            self._maybe_compact()
+
+    def apply_changes(self, changes):
+        """
+        Update fields of stored entries from (entry, {field: value}) pairs in one
+        durable step, keeping their slots. A handful of changes is journaled (one
+        fsync for all of them); larger batches are written as a fresh snapshot via
+        an atomic file swap. Entries deleted in the meantime are skipped. Returns the number of entries
+        updated.
+        """
+        with self._lock:
+            changes = [(e, fields) for e, fields in changes if id(e) in self._slots]
+            if not changes:
+                return 0
+            for e, fields in changes:
+                self._change(self._slots[id(e)], e, fields)
+            if self._journal_ops + len(changes) > self._compact_limit():
+                self._compact()
+            else:
+                self._append(*({'op': 'update', 'slot': self._slots[id(e)], 'entry': self.snapshots.pack(e)}
+                               for e, _ in changes))
+        self._notify()
+        return len(changes)
+
+    @contextmanager
+    def batch(self):
+        """
+        Group writes: the journal lines of every add/update/delete made inside the
+        block are written together, with one fsync, when the outermost block ends.
+        Other threads wait for the block to finish.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._pending:
+                    self._flush_pending()
+
+    def _flush_pending(self):
+        ops, self._pending = self._pending, []
+        self._write_journal(ops)
+
+    def _append(self, *ops):
+        self._journal_ops += len(ops)
+        if self._batch_depth:
+            self._pending.extend(ops)
+        else:
+            self._write_journal(ops)
+
+    def _write_journal(self, ops):
+        new_journal = not os.path.exists(self.journal_path)
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            if new_journal:
+                f.write(_dump_line({'base': self._base}))
+            for op in ops:
+                f.write(_dump_line(op))
+            f.flush()
+            os.fsync(f.fileno())
+        self._remember_files()
+
+    # --- whole-file writes ---
+    def _compact_limit(self):
+        return max(self.compact_min_ops, int(len(self._entries) * self.compact_ratio))
+
+    def _maybe_compact(self):
+        if self._journal_ops > self._compact_limit():
+            self._compact()
+
+    def replace_all(self, entries):
+        """Replace every entry and write a fresh snapshot (used for bulk changes)."""
+        entries = list(entries)
+        with self._lock:
+            self._note_format(entries)
+            self._reset()
+            for e in entries:
+                self._put(self._next_slot, e)
+            self._restamp_duplicate_ids()
+            self._compact()
+        self._notify()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        packed = self.snapshots.pack_all(self._entries.values())
+        data = codec.dumps(packed)
+        atomic_write(self.path, data, self.backups)
+        # the new snapshot already contains whatever a batch was holding back
+        self._pending = []
+        # A crash here leaves a journal whose base no longer matches; reload drops it.
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._base = _digest(data)
+        self._journal_ops = 0
+        self._remember_files()
+        if self._format:
+            # the format header follows the snapshot it describes
+            self._save_format()
+        # Renumber so slots stay dense for the next journal generation. The
+        # search and duplicate indexes hold entries, not slots, so they survive unchanged.
+        entries = self.entries()
+        search, duplicates = self._search, self._duplicates
+        self._reset()
+        for e in entries:
+            self._put(self._next_slot, e)
+        self._search, self._duplicates = search, duplicates
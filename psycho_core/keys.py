@@ -0,0 +1,24 @@
+"""
+Reading and writing the answer keys file (keys.json).
+"""
+import json
+
+from .atomic import BACKUP_GENERATIONS, atomic_write
+
+
+def load_keys(path):
+    """
+    Load the keys and descriptions from a keys.json file.
+    Returns:
+        keys (list): List of dicts mapping answer letters to scores.
+        descriptions (list): List of dicts mapping answer letters to descriptions.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('keys', []), data.get('descriptions', [])
+
+
+def save_keys(path, keys, descriptions, backups=BACKUP_GENERATIONS):
+    """Write keys.json atomically, keeping the previous versions as keys.json.bak1..N."""
+    data = json.dumps({'keys': keys, 'descriptions': descriptions}, ensure_ascii=False, indent=2)
+    atomic_write(path, data.encode('utf-8'), backups)
@@ -0,0 +1,46 @@
+"""
+Whole-store maintenance shared by the apps and the command line: removing
+duplicates and exporting to plain JSON (format upgrades live in migrations.py).
+"""
+import os
+
+from . import codec
+from .entries import entry_key
+from .repository import EntryRepository
+
+
+def unique_entries(entries):
+    """Return entries without duplicates; the first occurrence of a normalized identity wins."""
+    seen = set()
+    unique = []
+    for e in entries:
+        key = entry_key(e)
+        if key not in seen:
+            seen.add(key)
+            unique.append(e)
+    return unique
+
+
+def remove_duplicates(store):
+    """Drop duplicate entries from store. Returns the number removed."""
+    entries = store.entries()
+    unique = unique_entries(entries)
+    if len(unique) < len(entries):
+        store.replace_all(unique)
+    return len(entries) - len(unique)
+
+
+def export_entries(store, path):
+    """
+    Write all entries to a plain, self-contained JSON file (keys snapshots inline).
+    Exporting onto the store's own JSON file compacts it instead. Returns the entry count.
+    """
+    if isinstance(store, EntryRepository):
+        return store.export_json(path)
+    if os.path.abspath(path) == os.path.abspath(store.path):
+        # exporting onto the live snapshot: fold the journal in instead
+        store.compact()
+        return len(store)
+    entries = store.entries()
+    codec.write_entries(path, entries)
+    return len(entries)
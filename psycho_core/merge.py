@@ -0,0 +1,225 @@
+"""
+Streaming merge of entry files.
+
+Input files (JSON arrays as written by the apps, or JSONL) are parsed
+incrementally and the merged output is written as entries arrive, so memory
+does not grow with file size. The first occurrence of a person wins, in the
+order the files are given; entries are compared by normalized identity (see
+entries.py), so phone numbers and names written differently still match. Seen
+identities are kept as their 128-bit hashes (entries.identity_key). Once there are more
+than a memory budget's worth, they move to a temporary SQLite table on disk.
+"""
+import codecs
+import json
+import os
+import sqlite3
+import tempfile
+
+from . import codec
+from .entries import entry_key, new_entry_id
+from .snapshots import MissingSnapshotError, snapshot_id, snapshot_table_for
+
+
+READ_CHUNK = 1 << 20
+# Identity hashes kept in a Python set before spilling to disk (~50 bytes each)
+KEYS_IN_MEMORY = 2000000
+_WS = ' \t\r\n'
+
+
+class HashedKeySet:
+    """Set of identity hashes that moves to an on-disk table once it outgrows max_in_memory."""
+
+    def __init__(self, max_in_memory=KEYS_IN_MEMORY):
+        self.max_in_memory = max_in_memory
+        self._mem = set()
+        self._db = None
+        self._db_path = None
+
+    def add(self, key):
+        """Add key; return True if it was not present before."""
+        if self._db is None:
+            if key in self._mem:
+                return False
+            self._mem.add(key)
+            if len(self._mem) > self.max_in_memory:
+                self._spill()
+            return True
+        cur = self._db.execute('INSERT OR IGNORE INTO seen (k) VALUES (?)', (key,))
+        return cur.rowcount == 1
+
+    def _spill(self):
+        fd, self._db_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self._db = sqlite3.connect(self._db_path)
+        self._db.execute('PRAGMA journal_mode=OFF')
+        self._db.execute('PRAGMA synchronous=OFF')
+        self._db.execute('CREATE TABLE seen (k BLOB PRIMARY KEY) WITHOUT ROWID')
+        self._db.executemany('INSERT INTO seen (k) VALUES (?)', ((k,) for k in self._mem))
+        self._mem = set()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            os.remove(self._db_path)
+            self._db = None
+
+
+def iter_json_entries(path, on_bytes=None):
+    """
+    Yield the objects of a JSON array file (or a JSONL file) one at a time.
+    on_bytes(n) is called with the size of every chunk read.
+    """
+    with open(path, 'rb') as f:
+        if path.lower().endswith('.jsonl'):
+            for line in f:
+                if on_bytes:
+                    on_bytes(len(line))
+                if line.strip():
+                    yield json.loads(line.decode('utf-8-sig'))
+            return
+        decoder = json.JSONDecoder()
+        text = codecs.getincrementaldecoder('utf-8-sig')()
+        buf = ''
+        pos = 0
+        eof = False
+        started = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(READ_CHUNK)
+            if on_bytes and chunk:
+                on_bytes(len(chunk))
+            eof = not chunk
+            buf = buf[pos:] + text.decode(chunk, final=eof)
+            pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    raise ValueError(f'{path}: unexpected end of file')
+                fill()
+                continue
+            ch = buf[pos]
+            if not started:
+                if ch != '[':
+                    raise ValueError(f'{path}: expected a JSON list of entries')
+                started = True
+                pos += 1
+                continue
+            if ch == ']':
+                return
+            if ch == ',':
+                pos += 1
+                continue
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                # the object continues in the next chunk
+                fill()
+                continue
+            if end == len(buf) and not eof:
+                # a number may have been cut off at the chunk boundary
+                fill()
+                continue
+            pos = end
+            yield obj
+
+
+def _dump_entry(entry, pretty):
+    if pretty:
+        # same layout as json.dump(entries, indent=2): every line indented one level
+        return b'  ' + codec.dumps(entry, pretty=True).replace(b'\n', b'\n  ')
+    return codec.dumps(entry, pretty=False)
+
+
+def _snapshot_ref(entry, snapshots, inline):
+    """
+    Id of the entry's keys snapshot (None without one), with the snapshot kept in
+    inline. Inline snapshots are hashed, not interned into the input's table.
+    """
+    ks = entry.get('keys_snapshot')
+    sid = entry.get('keys_snapshot_id')
+    if ks is not None:
+        sid = sid if sid is not None else snapshot_id(ks)
+        inline.setdefault(sid, ks)
+    elif sid is not None and sid not in inline:
+        ks = snapshots.get(sid)
+        if ks is None:
+            raise MissingSnapshotError(sid)
+        inline[sid] = ks
+    return sid
+
+
+def merge_entry_files(paths, out_path, progress=None, is_cancelled=None, max_keys_in_memory=KEYS_IN_MEMORY):
+    """
+    Merge entry files into out_path, keeping the first occurrence of every
+    normalized (name, phone, answers); an entry whose id an earlier one already
+    has gets a new id. Keys snapshots are written by reference
+    (keys_snapshot_id) and inline only on the first entry using each one, as
+    SnapshotTable.pack_all() does, so the output is self-contained. progress(bytes_done, bytes_total) is reported while
+    reading. Returns a summary dict (files, read, written, duplicates), or None if
+    cancelled; the output file is only replaced once the merge has completed.
+    """
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+    done = [0]
+
+    def on_bytes(n):
+        done[0] += n
+        if progress:
+            progress(done[0], total_bytes)
+
+    seen = HashedKeySet(max_keys_in_memory)
+    # entry ids written so far: an id already taken (e.g. by an edited copy of the entry) gets replaced
+    ids = HashedKeySet(max_keys_in_memory)
+    tmp = out_path + '.tmp'
+    pretty = codec.PRETTY
+    first, sep = (b'\n', b',\n') if pretty else (b'', b',')
+    read = written = 0
+    # snapshot id -> keys: snapshots seen inline so far, and the ids already written inline
+    inline = {}
+    written_inline = set()
+    try:
+        with open(tmp, 'wb') as out:
+            out.write(b'[')
+            for path in paths:
+                snapshots = snapshot_table_for(path)
+                for e in iter_json_entries(path, on_bytes):
+                    read += 1
+                    if is_cancelled and read % 1000 == 0 and is_cancelled():
+                        break
+                    # before the dedupe: a skipped entry may carry a snapshot later ones reference
+                    sid = _snapshot_ref(e, snapshots, inline)
+                    if not seen.add(entry_key(e)):
+                        continue
+                    if e.get('id') and not ids.add(e['id']):
+                        e['id'] = new_entry_id()
+                    if sid is not None:
+                        ks = e.pop('keys_snapshot', None) or inline[sid]
+                        e['keys_snapshot_id'] = sid
+                        if sid not in written_inline:
+                            written_inline.add(sid)
+                            e['keys_snapshot'] = ks
+                    out.write(sep if written else first)
+                    out.write(_dump_entry(e, pretty))
+                    written += 1
+                if is_cancelled and is_cancelled():
+                    break
+            out.write(b'\n]' if pretty and written else b']')
+            out.flush()
+            os.fsync(out.fileno())
+        if is_cancelled and is_cancelled():
+            os.remove(tmp)
+            return None
+        os.replace(tmp, out_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        seen.close()
+        ids.close()
+    return {'files': len(paths), 'read': read, 'written': written, 'duplicates': read - written}
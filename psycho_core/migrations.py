@@ -0,0 +1,172 @@
+"""
+Versioned entry format and the migrations that upgrade older data to it.
+
+MIGRATIONS[n] upgrades entries from format version n to n + 1. Every step is
+idempotent (it only changes entries that still need it), so a run that was
+interrupted is simply repeated. The fields all pending steps set are written
+together, only for the entries that change, and the new version is recorded
+after that write.
+
+The stores keep the format version of their data in a small header (a file
+next to entries.json, a row in the SQLite repository's meta table), so
+pending_migrations() is O(1): launches on current data never look at the
+entries. The stores stamp() the entries written through them, lower the
+version if an entry that still needs a step is written (e.g. added without a
+timestamp), and treat data replaced behind their back as version 0.
+
+Adding keys snapshots is a manual step (MANUAL_STEPS): it freezes every legacy
+entry's score against the keys of the day, so it only runs when asked for
+(migrate_store(..., snapshots=True), the apps' Migrate commands), as it always
+has. Entries without a snapshot are valid data, scored against the current
+keys, so the format version does not track that step and pending_migrations()
+never lists it.
+"""
+from datetime import datetime, timezone
+
+from .entries import new_entry_id
+from .scoring import score_answers_batch
+
+# entries checked between progress reports / cancellation checks
+CHUNK_SIZE = 2000
+
+
+def now():
+    """Current time as an ISO 8601 UTC timestamp ('created' and 'modified' fields)."""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def stamp(entry, previous=None, taken=()):
+    """
+    Set the fields the stores maintain on an entry being added, or replacing
+    previous: its id and when it was created (both kept from previous; now if
+    previous has none) and last modified. An added entry keeps an id it already
+    has unless that is in taken.
+    """
+    ts = now()
+    if previous is not None:
+        entry['id'] = previous.get('id') or new_entry_id()
+        entry['created'] = previous.get('created') or ts
+        entry['modified'] = ts
+    else:
+        if not entry.get('id') or entry['id'] in taken:
+            entry['id'] = new_entry_id()
+        entry.setdefault('created', ts)
+        entry.setdefault('modified', entry['created'])
+    return entry
+
+
+def stamp_all(entries, taken=()):
+    """stamp() entries being added together; an id repeated among them is replaced as well."""
+    seen = set()
+    for e in entries:
+        stamp(e, taken=taken)
+        if e['id'] in seen:
+            e['id'] = new_entry_id()
+        seen.add(e['id'])
+    return entries
+
+
+# Each step returns the fields to set on each of the entries that need it;
+# migrate_store() has the store apply them under its lock (apply_changes).
+
+def _add_snapshots(store, entries, keys):
+    # every pending entry is scored against the same keys, so score them in one batch
+    scores = score_answers_batch(keys, [e.get('answers', '') for e in entries])
+    # all of them share one interned snapshot of the keys (stored once, by hash)
+    snapshot = store.snapshots.intern(keys)
+    return [{'keys_snapshot': snapshot, 'score': score} for score in scores]
+
+
+def _add_timestamps(store, entries, keys):
+    # when older entries were created is not known; they are stamped with the
+    # time of the migration (one value for the whole run)
+    ts = now()
+    return [{'created': e.get('created') or ts, 'modified': e.get('modified') or ts} for e in entries]
+
+
+def _add_ids(store, entries, keys):
+    # generated in file order, so the ids of older entries sort in that order
+    return [{'id': new_entry_id()} for _ in entries]
+
+
+# MIGRATIONS[n] upgrades entries from format n to n + 1: (name, needs(entry), fields(store, entries, keys))
+MIGRATIONS = [
+    ('keys_snapshot', lambda e: 'keys_snapshot' not in e and 'keys_snapshot_id' not in e, _add_snapshots),
+    ('timestamps', lambda e: 'created' not in e, _add_timestamps),
+    ('ids', lambda e: not e.get('id'), _add_ids),
+]
+FORMAT_VERSION = len(MIGRATIONS)
+# steps that only run on request and that the format version does not track
+MANUAL_STEPS = ('keys_snapshot',)
+
+
+def format_of(entries, version=FORMAT_VERSION):
+    """The format version all of entries are at (at most version)."""
+    automatic = [(n, needs) for n, (name, needs, _) in enumerate(MIGRATIONS) if name not in MANUAL_STEPS]
+    for e in entries:
+        if not version:
+            break
+        for n, needs in automatic:
+            if n >= version:
+                break
+            if needs(e):
+                version = n
+                break
+    return version
+
+
+def pending_migrations(store):
+    """Names of the automatic steps the store's data still needs (O(1): reads the recorded version only)."""
+    return [name for name, _, _ in MIGRATIONS[store.format_version():] if name not in MANUAL_STEPS]
+
+
+def migrate_store(store, keys, snapshots=False, chunk_size=CHUNK_SIZE, progress=None, is_cancelled=None):
+    """
+    Apply the pending steps in order (with snapshots, also the manual snapshot
+    step, which checks every entry), then write the changed entries in place in
+    one durable step (at most one backup rotation) and record the new version.
+    Each step sees the fields earlier steps set. Only the snapshot step uses keys.
+    progress(done, total) counts entries checked over all steps run. Returns
+    {step name: entries changed}, or None if the run was cancelled (finished
+    steps, and the entries of the current one done so far, are kept).
+    """
+    first = store.format_version()
+    steps = [(version, step) for version, step in enumerate(MIGRATIONS, 1)
+             if (snapshots and step[0] in MANUAL_STEPS) or (version > first and step[0] not in MANUAL_STEPS)]
+    if not steps:
+        return {}
+    entries = store.entries()
+    total = len(entries) * len(steps)
+    done = 0
+    changed = {}
+    # id(entry) -> (entry, fields to set); entries themselves are only changed by the store
+    pending = {}
+    reached = first
+    cancelled = False
+    for version, (name, needs, fields) in steps:
+        updated = 0
+        for start in range(0, len(entries), chunk_size):
+            if is_cancelled and is_cancelled():
+                cancelled = True
+                break
+            chunk = entries[start:start + chunk_size]
+            views = [{**e, **pending[id(e)][1]} if id(e) in pending else e for e in chunk]
+            todo = [(e, v) for e, v in zip(chunk, views) if needs(v)]
+            if todo:
+                for (e, _), f in zip(todo, fields(store, [v for _, v in todo], keys)):
+                    pending.setdefault(id(e), (e, {}))[1].update(f)
+                updated += len(todo)
+            done += len(chunk)
+            if progress:
+                progress(done, total)
+        if cancelled:
+            break
+        changed[name] = updated
+        reached = max(reached, version)
+    if pending:
+        # entries deleted meanwhile are skipped, entries added meanwhile are kept
+        store.apply_changes(list(pending.values()))
+    if reached > first:
+        # not reached blindly: entries added meanwhile were not checked
+        store.advance_format_version(reached)
+    return None if cancelled else changed
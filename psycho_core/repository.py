@@ -0,0 +1,343 @@
+"""
+SQLite-backed entry repository.
+
+Entries are stored one row each, with (name, phone, answers) indexed for the
+exact identity lookup (find_identity). Every row is also loaded into memory
+when the repository opens, as the JSON store does, so the apps' list views and
+the stores share one interface; at the apps' scale (tens of thousands of
+entries) that costs one sequential read.
+
+Searching deliberately does not use SQLite indexes: the apps search by
+substring of a name or phone number written in Persian or Arabic letters and
+digits, which neither a B-tree index nor FTS5 (token prefixes, no Persian/Arabic
+folding) can answer. Substring search and normalized duplicate checks use the
+in-memory SearchIndex and IdentityIndex (search.py, entries.py), which both
+stores share. Name, phone and FTS5 indexes created by earlier versions are
+dropped, since no query reads them and they only slow down writes.
+The full entry (including keys_snapshot and any extra fields) is kept as JSON in
+the ``data`` column (keys snapshots by reference, see snapshots.py) so nothing
+is lost in the round trip to and from entries.json.
+
+The repository exposes the same interface as JournaledEntryStore, so the apps can
+use whichever backend open_entry_store() picks for the entries file.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from . import codec
+from .base import EntryStoreBase
+from .entries import identity_of
+from .journal import JournaledEntryStore
+from .migrations import format_of, stamp, stamp_all
+from .snapshots import snapshot_table_for
+
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL DEFAULT '',
+        phone TEXT NOT NULL DEFAULT '',
+        answers TEXT NOT NULL DEFAULT '',
+        score INTEGER,
+        data TEXT NOT NULL
+    )''',
+    # single-column indexes of earlier versions; no query uses them
+    'DROP INDEX IF EXISTS idx_entries_name',
+    'DROP INDEX IF EXISTS idx_entries_phone',
+    'CREATE INDEX IF NOT EXISTS idx_entries_identity ON entries(name, phone, answers)',
+    # format_version: see migrations.py
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)',
+]
+
+# Full-text index used by earlier versions; search now runs in memory (search.py)
+DROP_FTS = [
+    'DROP TRIGGER IF EXISTS entries_fts_ai',
+    'DROP TRIGGER IF EXISTS entries_fts_ad',
+    'DROP TRIGGER IF EXISTS entries_fts_au',
+    'DROP TABLE IF EXISTS entries_fts',
+]
+
+
+def repository_path_for(entries_path):
+    """entries.json -> entries.sqlite3 (next to the JSON file)."""
+    return os.path.splitext(entries_path)[0] + '.sqlite3'
+
+
+def open_entry_store(entries_path):
+    """
+    Return the entry backend for entries_path: the SQLite repository once it has
+    been imported (entries.sqlite3 exists), otherwise the journaled JSON store.
+    """
+    db_path = repository_path_for(entries_path)
+    if os.path.exists(db_path):
+        return EntryRepository(db_path)
+    return JournaledEntryStore(entries_path)
+
+
+def load_entries(entries_path):
+    """Return all entries stored for entries_path (JSON + journal, or its SQLite repository)."""
+    return open_entry_store(entries_path).entries()
+
+
+def save_entries(entries_path, entries):
+    """Replace all entries stored for entries_path."""
+    open_entry_store(entries_path).replace_all(entries)
+
+
+class EntryRepository(EntryStoreBase):
+    """
+    Entry store on top of an SQLite database. All rows are also kept in memory
+    (keyed by row id, in insertion order) so listing and searching entries needs
+    no query; identity lookups go through the indexes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshots = snapshot_table_for(path)
+        # shared with background workers; every use of the connection holds _lock
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        for stmt in SCHEMA:
+            self.conn.execute(stmt)
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name='entries_fts'").fetchone():
+            # once per database: its triggers would keep rewriting an index nothing reads
+            for stmt in DROP_FTS:
+                self.conn.execute(stmt)
+        self.conn.commit()
+        self._init_tracking()
+        with self._lock:
+            self._load()
+
+    def close(self):
+        self.conn.close()
+
+    # --- loading ---
+    def reload(self):
+        with self._lock:
+            self._load()
+        self._notify()
+
+    def _watched_paths(self):
+        return (self.path, self.path + '-wal')
+
+    def _content_changed(self, old_files):
+        # data_version only moves when another connection commits
+        return self.conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version
+
+    def _load(self):
+        self._entries = {}
+        self._slots = {}
+        self._by_id = {}
+        self._search = None
+        self._duplicates = None
+        legacy = []
+        for rowid, data in self.conn.execute('SELECT id, data FROM entries ORDER BY id'):
+            e = codec.loads(data)
+            if self.snapshots.unpack(e):
+                legacy.append(rowid)
+            self._put(rowid, e)
+        # rewrite rows that still carry an inline snapshot with a reference, or an id an older row has
+        rewrite = legacy + self._restamp_duplicate_ids()
+        if rewrite:
+            with self.conn:
+                self._rewrite_data(rewrite)
+        row = self.conn.execute("SELECT value FROM meta WHERE key='format_version'").fetchone()
+        self._format = row[0] if row else 0
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        self._remember_files()
+
+    def _row_values(self, entry):
+        name, phone, answers = identity_of(entry)
+        score = entry.get('score')
+        return (name or '', phone or '', answers or '', score if isinstance(score, int) else None,
+                codec.dumps(self.snapshots.pack(entry), pretty=False).decode('utf-8'))
+
+    def _rewrite_data(self, rowids):
+        """Write the data column of rows whose entry changed in memory, in the caller's transaction."""
+        self.conn.executemany('UPDATE entries SET data=? WHERE id=?',
+                              ((self._row_values(self._entries[r])[-1], r) for r in rowids))
+
+    def _insert_many(self, entries):
+        """Insert entries inside the caller's transaction and keep them in memory."""
+        for e in entries:
+            cur = self.conn.execute(
+                'INSERT INTO entries (name, phone, answers, score, data) VALUES (?,?,?,?,?)',
+                self._row_values(e))
+            self._put(cur.lastrowid, e)
+
+    # --- reading ---
+    def _query_ids(self, sql, params):
+        with self._lock:
+            return [r[0] for r in self.conn.execute(sql, params)]
+
+    def find_identity(self, name, phone, answers):
+        """Return the row ids of entries with this (name, phone, answers), oldest first."""
+        return self._query_ids('SELECT id FROM entries WHERE name=? AND phone=? AND answers=? ORDER BY id',
+                               (name or '', phone or '', answers or ''))
+
+    @contextmanager
+    def batch(self):
+        """Group writes (same interface as JournaledEntryStore.batch); each one still commits on its own."""
+        with self._lock:
+            yield self
+
+    def set_format_version(self, version):
+        with self._lock:
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('format_version', ?)",
+                                  (version,))
+            self._format = version
+            self._remember_files()
+
+    # --- single-entry writes ---
+    def add(self, entry):
+        with self._lock:
+            self._note_format([stamp(entry, taken=self._by_id)])
+            with self.conn:
+                cur = self.conn.execute(
+                    'INSERT INTO entries (name, phone, answers, score, data) VALUES (?,?,?,?,?)',
+                    self._row_values(entry))
+                self._put(cur.lastrowid, entry)
+            self._remember_files()
+            return cur.lastrowid
+
+    def add_many(self, entries):
+        """Add entries in one transaction."""
+        entries = list(entries)
+        with self._lock:
+            self._note_format(stamp_all(entries, taken=self._by_id))
+            try:
+                with self.conn:
+                    self._insert_many(entries)
+            except Exception:
+                self._load()
+                raise
+            self._remember_files()
+        self._notify()
+
+    @contextmanager
+    def bulk_insert(self):
+        """
+        Add entries in batches inside one transaction: yields add(entries), which
+        inserts a batch and makes it visible to lookups (find_duplicates included)
+        at once. Everything is committed when the block ends and rolled back if it
+        raises. Other threads wait for the block to finish.
+        """
+        with self._lock:
+            try:
+                with self.conn:
+                    yield self._insert_batch
+            except BaseException:
+                # the transaction was rolled back; resync memory with the database
+                self._load()
+                raise
+            self._remember_files()
+        self._notify()
+
+    def _insert_batch(self, entries):
+        entries = stamp_all(list(entries), taken=self._by_id)
+        version = format_of(entries, self._format)
+        if version < self._format:
+            # inside the open transaction, so it commits (or not) with the entries
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('format_version', ?)", (version,))
+            self._format = version
+        self._insert_many(entries)
+
+    def update(self, rowid, entry):
+        with self._lock:
+            if rowid not in self._entries:
+                raise KeyError(rowid)
+            self._note_format([stamp(entry, self._entries[rowid])])
+            with self.conn:
+                self.conn.execute(
+                    'UPDATE entries SET name=?, phone=?, answers=?, score=?, data=? WHERE id=?',
+                    self._row_values(entry) + (rowid,))
+            self._put(rowid, entry)
+            self._remember_files()
+
+    def delete(self, rowid):
+        with self._lock:
+            if rowid not in self._entries:
+                raise KeyError(rowid)
+            with self.conn:
+                self.conn.execute('DELETE FROM entries WHERE id=?', (rowid,))
+            self._pop(rowid)
+            self._remember_files()
+
+    # --- bulk writes ---
+    def apply_changes(self, changes):
+        """
+        Update fields of stored entries from (entry, {field: value}) pairs in one
+        transaction, keeping their row ids. Entries deleted in the meantime are
+        skipped. Returns the number of entries updated.
+        """
+        with self._lock:
+            rows = [(self._slots[id(e)], e, fields) for e, fields in changes if id(e) in self._slots]
+            if not rows:
+                return 0
+            for rowid, e, fields in rows:
+                self._change(rowid, e, fields)
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        'UPDATE entries SET name=?, phone=?, answers=?, score=?, data=? WHERE id=?',
+                        (self._row_values(e) + (rowid,) for rowid, e, _ in rows))
+            except Exception:
+                # the transaction was rolled back; resync memory with the database
+                self._load()
+                raise
+            self._remember_files()
+        self._notify()
+        return len(rows)
+
+    def replace_all(self, entries):
+        """Replace every entry in one transaction."""
+        entries = list(entries)
+        with self._lock:
+            self._note_format(entries)
+            try:
+                with self.conn:
+                    self.conn.execute('DELETE FROM entries')
+                    self._entries = {}
+                    self._slots = {}
+                    self._by_id = {}
+                    self._search = None
+                    self._duplicates = None
+                    self._insert_many(entries)
+                    self._rewrite_data(self._restamp_duplicate_ids())
+            except Exception:
+                # the transaction was rolled back; resync memory with the database
+                self._load()
+                raise
+            self._remember_files()
+        self._notify()
+
+    def import_json(self, entries_path):
+        """
+        One-time import of an entries.json file (including any pending journal).
+        Returns the number of imported entries.
+        """
+        source = JournaledEntryStore(entries_path)
+        entries = source.entries()
+        with self._lock:
+            # the imported entries are at the version recorded for the JSON file, or older
+            if not self._entries and self._format == 0:
+                self.set_format_version(source.format_version())
+            self._note_format(entries)
+            with self.conn:
+                self._insert_many(entries)
+                self._rewrite_data(self._restamp_duplicate_ids())
+            self._remember_files()
+        self._notify()
+        return len(entries)
+
+    def export_json(self, entries_path):
+        """
+        Write all entries to a plain, self-contained entries.json file (keys
+        snapshots inline). Returns the entry count.
+        """
+        entries = self.entries()
+        codec.write_entries(entries_path, entries)
+        return len(entries)
@@ -0,0 +1,84 @@
+"""
+Score recalculation after the answer keys change.
+
+rescore_store() scores entries in chunks, reporting progress and checking for
+cancellation between chunks, and only then writes the changed scores in one
+durable step (see apply_scores() on the entry backends). A cancelled run
+leaves the stored entries untouched. It holds no GUI state, so the apps can
+run it on a worker thread.
+
+Given the previous keys it rescores incrementally: entries with a keys_snapshot
+can never change and are skipped, and of the rest only those whose answers hit
+a (question, letter) cell whose score changed are rescored, found with one
+batch scoring pass over the answers.
+"""
+from .scoring import score_answers_batch, score_entries
+
+
+CHUNK_SIZE = 5000
+
+
+def _cell(k, ch):
+    """Score of letter ch in one question's key dict, as compute_score_from_keys counts it."""
+    if not isinstance(k, dict) or ch not in k:
+        return 0
+    try:
+        return int(k[ch])
+    except Exception:
+        return 0
+
+
+def changed_cells(old_keys, new_keys):
+    """Return the set of (question, letter) cells whose score differs between two keys lists."""
+    cells = set()
+    for q in range(max(len(old_keys), len(new_keys))):
+        old = old_keys[q] if q < len(old_keys) else {}
+        new = new_keys[q] if q < len(new_keys) else {}
+        letters = set(old if isinstance(old, dict) else ()) | set(new if isinstance(new, dict) else ())
+        for ch in letters:
+            if _cell(old, ch) != _cell(new, ch):
+                cells.add((q, ch))
+    return cells
+
+
+def affected_entries(entries, old_keys, new_keys):
+    """Entries whose score can change when old_keys is replaced by new_keys."""
+    cells = changed_cells(old_keys, new_keys)
+    if not cells:
+        return []
+    # entries with a snapshot keep scoring against it, whatever the current keys are
+    legacy = [e for e in entries if not e.get('keys_snapshot') and e.get('keys_snapshot_id') is None]
+    # Scoring against keys that give 1 to every changed cell counts the changed
+    # cells an entry's answers touch, so the batch scorer finds them in one pass.
+    marks = [{} for _ in range(max(q for q, _ in cells) + 1)]
+    for q, ch in cells:
+        marks[q][ch] = 1
+    answers = [e.get('answers', '') for e in legacy]
+    hits = score_answers_batch(marks, [a if isinstance(a, str) else '' for a in answers])
+    return [e for e, n in zip(legacy, hits) if n]
+
+
+def rescore_store(store, keys, old_keys=None, chunk_size=CHUNK_SIZE, progress=None, is_cancelled=None):
+    """
+    Recalculate scores (each entry's keys_snapshot if present, else keys). With
+    old_keys, only entries affected by the change are rescored; without it every
+    entry is. progress(done, total) is called after each chunk. Returns the number
+    of entries whose score changed, or None if the run was cancelled.
+    """
+    entries = store.entries()
+    if old_keys is not None:
+        entries = affected_entries(entries, old_keys, keys)
+    total = len(entries)
+    updates = []
+    for start in range(0, total, chunk_size):
+        if is_cancelled and is_cancelled():
+            return None
+        chunk = entries[start:start + chunk_size]
+        for e, score in zip(chunk, score_entries(chunk, keys)):
+            if e.get('score') != score:
+                updates.append((e, score))
+        if progress:
+            progress(min(start + chunk_size, total), total)
+    if is_cancelled and is_cancelled():
+        return None
+    return store.apply_scores(updates)
@@ -0,0 +1,163 @@
+"""
+Answer scoring.
+
+compute_score_from_keys() is the scalar scorer both apps have always used.
+The batch API compiles a keys list into a dense (questions x letters) score
+matrix, encodes answer strings as small integer codes and scores many entries
+with one NumPy gather-and-sum. Totals are identical to the scalar scorer:
+letters missing from a question's key dict, non-integer scores and answers
+beyond the last question all count as 0. Without NumPy the batch API falls
+back to the scalar scorer. NumPy is imported on first use, so importing this
+module (and starting the command line tools) stays fast.
+"""
+from .snapshots import MissingSnapshotError
+
+_np = False
+
+
+# Rows per gather; bounds the temporary (rows x questions) array
+BATCH_ROWS = 65536
+# Below this many answers the scalar scorer is faster than compiling the keys
+SMALL_BATCH = 64
+# Keep per-cell scores well inside int64 so a row sum cannot overflow
+_MAX_CELL = 2 ** 53
+
+
+def _numpy():
+    """The numpy module, or None when it is not installed (e.g. the Android build)."""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def compute_score_from_keys(keys, answers):
+    """Compute total score for a given answers string using provided keys list."""
+    total = 0
+    for idx, ch in enumerate(answers):
+        if idx < len(keys) and ch in keys[idx]:
+            try:
+                total += int(keys[idx][ch])
+            except Exception:
+                pass
+    return total
+
+
+class CompiledKeys:
+    """
+    A keys list compiled for batch scoring.
+
+    matrix[q, code] is the score of answer letter ``letters[code - 1]`` for
+    question q; code 0 is reserved for "no score" (unknown letter, padding).
+    matrix is None when NumPy is unavailable or a score does not fit in int64,
+    in which case scoring goes through compute_score_from_keys.
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.letters = sorted({ch for k in keys if isinstance(k, dict)
+                               for ch in k if isinstance(ch, str) and len(ch) == 1})
+        self.codes = {ch: i + 1 for i, ch in enumerate(self.letters)}
+        self.matrix = None
+        np = _numpy()
+        if np is None or len(self.letters) >= 65535:
+            return
+        cells = []
+        for q, k in enumerate(keys):
+            if not isinstance(k, dict):
+                continue
+            for ch, v in k.items():
+                code = self.codes.get(ch)
+                if code is None:
+                    continue
+                try:
+                    val = int(v)
+                except Exception:
+                    continue
+                if abs(val) >= _MAX_CELL:
+                    return
+                cells.append((q, code, val))
+        matrix = np.zeros((len(keys), len(self.letters) + 1), dtype=np.int64)
+        for q, code, val in cells:
+            matrix[q, code] = val
+        self.matrix = matrix
+        self.code_dtype = np.uint8 if len(self.letters) < 256 else np.uint16
+        # lookup table from code point to letter code; anything above the largest letter maps to 0
+        top = max((ord(ch) for ch in self.letters), default=0) + 1
+        self._lut = np.zeros(top + 1, dtype=self.code_dtype)
+        for ch, code in self.codes.items():
+            self._lut[ord(ch)] = code
+        self._pad = next(chr(cp) for cp in range(top + 1) if chr(cp) not in self.codes)
+
+    def encode(self, answers_list):
+        """Encode answer strings as an (N x questions) array of letter codes."""
+        np = _numpy()
+        n_q = len(self.keys)
+        if not answers_list or n_q == 0:
+            return np.zeros((len(answers_list), n_q), dtype=self.code_dtype)
+        text = ''.join(a[:n_q].ljust(n_q, self._pad) for a in answers_list)
+        points = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        points = np.minimum(points, len(self._lut) - 1).reshape(len(answers_list), n_q)
+        return self._lut[points]
+
+    def score_codes(self, codes):
+        """Sum the matrix cells selected by an encoded answers array."""
+        np = _numpy()
+        return self.matrix[np.arange(codes.shape[1]), codes].sum(axis=1)
+
+    def score(self, answers_list):
+        """Score a list of answer strings; returns a list of ints."""
+        answers_list = list(answers_list)
+        if self.matrix is None or not all(isinstance(a, str) for a in answers_list):
+            return [compute_score_from_keys(self.keys, a) for a in answers_list]
+        totals = []
+        for start in range(0, len(answers_list), BATCH_ROWS):
+            chunk = answers_list[start:start + BATCH_ROWS]
+            if not self.keys:
+                totals.extend([0] * len(chunk))
+                continue
+            totals.extend(self.score_codes(self.encode(chunk)).tolist())
+        return totals
+
+
+def compile_keys(keys):
+    return CompiledKeys(keys)
+
+
+def score_answers_batch(keys, answers_list):
+    """Score many answer strings against one keys list."""
+    answers_list = list(answers_list)
+    if len(answers_list) < SMALL_BATCH:
+        return [compute_score_from_keys(keys, a) for a in answers_list]
+    return compile_keys(keys).score(answers_list)
+
+
+def score_entries(entries, keys):
+    """
+    Score entries the way the apps recalculate them: with the entry's own
+    keys_snapshot when it has one, otherwise with keys. Entries sharing the same
+    snapshot object are scored together in one batch. Returns a list of ints in
+    the order of entries. An entry whose keys_snapshot_id could not be resolved
+    raises MissingSnapshotError instead of being scored with keys.
+    """
+    groups = {}
+    for i, e in enumerate(entries):
+        ksnap = e.get('keys_snapshot')
+        if not ksnap:
+            if e.get('keys_snapshot_id') is not None:
+                raise MissingSnapshotError(e['keys_snapshot_id'])
+            ksnap = keys
+        group = groups.get(id(ksnap))
+        if group is None:
+            group = groups[id(ksnap)] = (ksnap, [], [])
+        group[1].append(i)
+        group[2].append(e.get('answers', ''))
+    totals = [0] * len(entries)
+    for ksnap, idxs, answers in groups.values():
+        for i, total in zip(idxs, score_answers_batch(ksnap, answers)):
+            totals[i] = total
+    return totals
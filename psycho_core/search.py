@@ -0,0 +1,155 @@
+"""
+In-memory search index over entry names and phone numbers.
+
+Text is normalized before indexing and searching. Arabic letter forms are
+folded to their Persian equivalents (ي/ى -> ی, ك -> ک, ة -> ه, أ/إ/آ -> ا, ...).
+Diacritics, tatweel and zero-width joiners are dropped. Persian and Arabic-Indic
+digits become ASCII, and the result is case-folded. Phone numbers are indexed as
+their digits only, so "0912 345-67" finds 091234567.
+
+Every 2- and 3-character substring of an entry maps to the documents that
+contain it. A query looks up its rarest n-gram and only checks those candidates,
+so a keystroke costs time proportional to the matches, not to the entry count
+(a single character is checked against every entry).
+Entries are indexed by object identity and results keep the order in which
+entries were added; the entry stores keep the index current as entries change.
+"""
+import re
+from collections import defaultdict
+
+
+_FOLD = {
+    'ي': 'ی',  # ARABIC YEH -> FARSI YEH
+    'ى': 'ی',  # ALEF MAKSURA
+    'ئ': 'ی',  # YEH WITH HAMZA
+    'ك': 'ک',  # ARABIC KAF -> KEHEH
+    'ة': 'ه',  # TEH MARBUTA -> HEH
+    'ۀ': 'ه',  # HEH WITH YEH
+    'أ': 'ا',  # ALEF WITH HAMZA ABOVE
+    'إ': 'ا',  # ALEF WITH HAMZA BELOW
+    'آ': 'ا',  # ALEF WITH MADDA
+    'ٱ': 'ا',  # ALEF WASLA
+    'ؤ': 'و',  # WAW WITH HAMZA
+}
+for _i in range(10):
+    _FOLD[chr(0x06f0 + _i)] = str(_i)  # EXTENDED ARABIC-INDIC (Persian) digits
+    _FOLD[chr(0x0660 + _i)] = str(_i)  # ARABIC-INDIC digits
+for _cp in list(range(0x064b, 0x0660)) + [0x0670, 0x0640, 0x200c, 0x200d, 0x200e, 0x200f]:
+    _FOLD[chr(_cp)] = None  # harakat, superscript alef, tatweel, ZWNJ/ZWJ, direction marks
+_FOLD_TABLE = str.maketrans(_FOLD)
+
+_NON_DIGITS = re.compile(r'[^0-9]')
+_PHONE_LIKE = re.compile(r'[0-9\s+\-().]+')
+
+
+def normalize_text(text):
+    """Fold text for matching (see module docstring)."""
+    text = str(text or '')
+    if text.isascii():
+        return text.lower()
+    return text.translate(_FOLD_TABLE).casefold()
+
+
+def normalize_phone(phone):
+    """Digits of a phone number; text without any digits is kept normalized."""
+    text = normalize_text(phone)
+    if text.isdigit():
+        return text
+    digits = _NON_DIGITS.sub('', text)
+    return digits or text
+
+
+class SearchIndex:
+    """
+    Substring index over entry names and phones. Not thread-safe; the stores
+    call it while holding their lock.
+    """
+
+    def __init__(self, entries=()):
+        # 2- and 3-character substring -> doc numbers (may include stale ones)
+        self._postings = defaultdict(list)
+        # doc number -> entry and -> 'name<US>phone'; doc numbers increase in insertion order
+        self._docs = {}
+        self._text = {}
+        self._doc_of = {}
+        self._next = 0
+        # postings pointing at removed or re-indexed documents
+        self._stale = 0
+        for e in entries:
+            self.add(e)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, entry, replaces=None):
+        """
+        Index entry. An entry that is already indexed is re-indexed in place, and
+        an entry that replaces an indexed one takes over its position.
+        """
+        if replaces is not None and replaces is not entry and id(replaces) in self._doc_of:
+            self._doc_of[id(entry)] = self._doc_of.pop(id(replaces))
+        doc = self._doc_of.get(id(entry))
+        if doc is None:
+            doc = self._doc_of[id(entry)] = self._next
+            self._next += 1
+        else:
+            self._stale += 1
+        # the separator keeps a term from matching across the two fields
+        text = normalize_text(entry.get('name', '')) + '\x1f' + normalize_phone(entry.get('phone', ''))
+        self._docs[doc] = entry
+        self._text[doc] = text
+        self._post(doc, text)
+        self._maybe_rebuild()
+
+    def discard(self, entry):
+        doc = self._doc_of.pop(id(entry), None)
+        if doc is not None:
+            del self._docs[doc]
+            del self._text[doc]
+            self._stale += 1
+            self._maybe_rebuild()
+
+    def _post(self, doc, text):
+        postings = self._postings
+        for gram in {text[i:i + n] for n in (2, 3) for i in range(len(text) - n + 1)}:
+            postings[gram].append(doc)
+
+    def _maybe_rebuild(self):
+        # drop stale postings once they outnumber the live documents
+        if self._stale > max(1000, len(self._docs)):
+            self._postings = defaultdict(list)
+            self._stale = 0
+            for doc, text in self._text.items():
+                self._post(doc, text)
+
+    def _candidates(self, term):
+        """Docs that may contain term: the postings of its rarest 2/3-gram, or every doc."""
+        if len(term) < 2:
+            return self._text
+        n = min(3, len(term))
+        best = None
+        for i in range(len(term) - n + 1):
+            ids = self._postings.get(term[i:i + n])
+            if ids is None:
+                return ()
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def search(self, term):
+        """Return the entries whose name or phone contains term, in insertion order."""
+        term = normalize_text(term).strip()
+        if not term:
+            return list(self._docs.values())
+        terms = [term]
+        if _PHONE_LIKE.fullmatch(term) and _NON_DIGITS.sub('', term) != term:
+            # '0912 345' also matches the phone 0912345...
+            terms.append(_NON_DIGITS.sub('', term))
+        text = self._text.get
+        found = set()
+        for t in terms:
+            if t:
+                # stale postings fail the check: their doc is gone or no longer has t
+                found.update(doc for doc in self._candidates(t) if t in text(doc, ''))
+        docs = self._docs
+        return [docs[doc] for doc in sorted(found)]
@@ -0,0 +1,161 @@
+"""
+Content-addressed store for keys snapshots.
+
+Every entry used to carry its own deep copy of the answer keys in
+``keys_snapshot``. Snapshots are now interned in keys_snapshots.json (next to the
+entries file) under a stable hash of their canonical JSON form, and entries on
+disk carry only ``keys_snapshot_id``. In memory, entries still have a
+``keys_snapshot`` list, but every entry with the same keys shares one object.
+
+Entries written by older versions (inline ``keys_snapshot``) are interned as they
+are loaded, and written back in the compact form. Historic scores stay
+reproducible: a snapshot is never modified once stored.
+
+pack_all() keeps a whole entries list self-contained: the first entry using a
+snapshot carries it inline next to its id, so an entries file copied without
+keys_snapshots.json still loads. An id that cannot be resolved is an error
+(MissingSnapshotError) rather than "no snapshot": scoring such an entry against
+the current keys would silently rewrite its historic score.
+"""
+import hashlib
+import json
+import os
+
+from .atomic import atomic_write
+
+SNAPSHOTS_FILE = 'keys_snapshots.json'
+
+_tables = {}
+
+
+class MissingSnapshotError(ValueError):
+    """An entry references a keys snapshot that is neither inline nor in keys_snapshots.json."""
+
+    def __init__(self, sid):
+        super().__init__('keys snapshot %s is missing (was %s not copied with the entries?)' % (sid, SNAPSHOTS_FILE))
+        self.sid = sid
+
+
+def canonical_keys(keys):
+    """Canonical JSON text for a keys list (sorted letters, no whitespace)."""
+    return json.dumps(keys, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def snapshot_id(keys):
+    """Stable content hash for a keys list."""
+    return _id_for(canonical_keys(keys))
+
+
+def _id_for(canonical):
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:24]
+
+
+def snapshot_table_for(entries_path):
+    """Return the shared SnapshotTable for the directory holding entries_path."""
+    path = os.path.join(os.path.dirname(os.path.abspath(entries_path)), SNAPSHOTS_FILE)
+    table = _tables.get(path)
+    if table is None:
+        table = _tables[path] = SnapshotTable(path)
+    return table
+
+
+class SnapshotTable:
+    """hash -> keys list, persisted as one small JSON object."""
+
+    def __init__(self, path):
+        self.path = path
+        self._by_id = {}
+        # id() of each interned (shared) list -> its hash; the table keeps them alive
+        self._ids = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        for sid, keys in data.items():
+            if sid not in self._by_id:
+                self._by_id[sid] = keys
+                self._ids[id(keys)] = sid
+
+    def _save(self):
+        # pick up snapshots another process (or store) added since we loaded
+        self._load()
+        # snapshots are only ever added, so there is nothing worth a backup
+        atomic_write(self.path, json.dumps(self._by_id, ensure_ascii=False).encode('utf-8'), backups=0)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, sid):
+        return self._by_id.get(sid)
+
+    def id_of(self, keys):
+        """Hash of a keys list; O(1) for lists returned by intern()."""
+        sid = self._ids.get(id(keys))
+        if sid is None:
+            sid = self.intern_id(keys)
+        return sid
+
+    def intern(self, keys):
+        """Return the shared snapshot equal to keys, storing it first if it is new."""
+        return self._by_id[self.id_of(keys)]
+
+    def intern_id(self, keys):
+        canonical = canonical_keys(keys)
+        sid = _id_for(canonical)
+        if sid not in self._by_id:
+            # store a private copy so later edits to the caller's list cannot leak in
+            shared = json.loads(canonical)
+            self._by_id[sid] = shared
+            self._ids[id(shared)] = sid
+            # persist before any entry referencing sid is written
+            self._save()
+        return sid
+
+    # --- entry (de)serialization ---
+    def pack(self, entry):
+        """Return entry as stored on disk: keys_snapshot replaced by keys_snapshot_id."""
+        ks = entry.get('keys_snapshot')
+        if ks is None:
+            return entry
+        packed = dict(entry)
+        del packed['keys_snapshot']
+        packed['keys_snapshot_id'] = self.id_of(ks)
+        return packed
+
+    def pack_all(self, entries):
+        """pack() every entry; the first entry using each snapshot also keeps it inline."""
+        seen = set()
+        packed = []
+        for e in entries:
+            p = self.pack(e)
+            sid = p.get('keys_snapshot_id')
+            if sid is not None and sid not in seen:
+                seen.add(sid)
+                p['keys_snapshot'] = e['keys_snapshot']
+            packed.append(p)
+        return packed
+
+    def unpack(self, entry):
+        """
+        Resolve keys_snapshot_id (or intern an inline legacy keys_snapshot) in place.
+        Returns True when the entry was stored in the legacy inline form. Raises
+        MissingSnapshotError for an id that is neither known nor given inline.
+        """
+        sid = entry.get('keys_snapshot_id')
+        if sid is not None:
+            ks = entry.get('keys_snapshot')
+            # written by pack_all(): the snapshot travels with the entries file
+            ks = self._by_id.get(sid) if ks is None else self.intern(ks)
+            if ks is None:
+                raise MissingSnapshotError(sid)
+            del entry['keys_snapshot_id']
+            entry['keys_snapshot'] = ks
+            return False
+        ks = entry.get('keys_snapshot')
+        if ks is not None and id(ks) not in self._ids:
+            entry['keys_snapshot'] = self.intern(ks)
+            return True
+        return False
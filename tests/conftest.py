@@ -0,0 +1,60 @@
+"""
+Helpers shared by the tests. The factories are plain functions (from conftest
+import person); the kind and store fixtures run a test once per entry store.
+"""
+import json
+
+import pytest
+
+from psycho_core import EntryRepository, JournaledEntryStore, repository_path_for
+
+STORE_KINDS = ['journal', 'sqlite']
+
+
+def person(name, phone='', answers='ab', **fields):
+    return dict(name=name, phone=phone, answers=answers, **fields)
+
+
+def numbered(i, **fields):
+    """Entry i: its own name and phone, scored i unless a score is given."""
+    fields.setdefault('score', i)
+    return person(f'n{i}', f'09{i:09d}', **fields)
+
+
+def contents(store):
+    return [(e['name'], e['phone'], e['answers'], e.get('score')) for e in store.entries()]
+
+
+def write_json(path, entries):
+    """Write entries as a plain JSON list (an entries.json of an older app version)."""
+    path.write_text(json.dumps(entries), encoding='utf-8')
+    return str(path)
+
+
+def open_store(kind, path):
+    """A store of this kind holding the entries of the JSON file at path."""
+    if kind == 'journal':
+        return JournaledEntryStore(path)
+    repo = EntryRepository(repository_path_for(path))
+    repo.import_json(path)
+    return repo
+
+
+def reopen(store):
+    """A second instance of store, reading the same files."""
+    return type(store)(store.path)
+
+
+@pytest.fixture(params=STORE_KINDS)
+def kind(request):
+    return request.param
+
+
+@pytest.fixture
+def store(kind, tmp_path):
+    """An empty store of each kind."""
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path) if kind == 'journal' else EntryRepository(repository_path_for(path))
+    yield store
+    if kind == 'sqlite':
+        store.close()
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from psycho_core import JournaledEntryStore, atomic_write, backup_paths
+
+
+def test_backups_rotate_newest_first(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    for i in range(5):
+        atomic_write(path, b'v%d' % i, backups=3)
+    assert open(path, 'rb').read() == b'v4'
+    assert [open(p, 'rb').read() for p in backup_paths(path, 3)] == [b'v3', b'v2', b'v1']
+    assert not os.path.exists(path + '.bak4')
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_failed_write_keeps_the_old_content(tmp_path, monkeypatch):
+    path = str(tmp_path / 'entries.json')
+    atomic_write(path, b'old', backups=0)
+
+    def crash(src, dst):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', crash)
+    with pytest.raises(OSError):
+        atomic_write(path, b'new', backups=0)
+    monkeypatch.undo()
+    assert open(path, 'rb').read() == b'old'
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_backup_is_a_copy(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    atomic_write(path, b'v1')
+    atomic_write(path, b'v2')
+    # a program editing the file in place does not change the backup
+    with open(path, 'r+b') as f:
+        f.write(b'XX')
+    assert open(backup_paths(path)[0], 'rb').read() == b'v1'
+
+
+def test_compaction_keeps_backups_of_the_snapshot(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path, backups=2)
+    for i in range(3):
+        store.add({'name': f'n{i}', 'phone': '', 'answers': ''})
+        store.compact()
+    assert [len(JournaledEntryStore(p).entries()) for p in backup_paths(path, 2)] == [2, 1]
@@ -0,0 +1,62 @@
+import json
+import os
+
+from conftest import person, reopen
+from psycho_core import JournaledEntryStore
+
+
+def touch(path):
+    # a new mtime, same content
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_unchanged_and_touched_files_are_hits(kind, store):
+    store.add(person('Sara'))
+    if kind == 'journal':
+        # only the snapshot is compared by content; the journal is append-only
+        store.compact()
+    calls = []
+    store.subscribe(lambda: calls.append(1))
+    assert store.refresh() is False
+    touch(store.path)
+    entries = store.entries()
+    assert store.refresh() is False
+    # not parsed again: the same entry objects
+    assert store.entries()[0] is entries[0]
+    assert store.cache_stats()['hits'] == 2 and store.cache_stats()['misses'] == 0
+    assert calls == []
+
+
+def test_a_write_by_another_instance_reloads_and_notifies(store):
+    store.add(person('Sara'))
+    calls = []
+    store.subscribe(lambda: calls.append(1))
+    reopen(store).add(person('Ali'))
+    assert store.refresh() is True
+    assert [e['name'] for e in store.entries()] == ['Sara', 'Ali']
+    assert store.cache_stats()['misses'] == 1 and calls == [1]
+    # the reload is remembered
+    assert store.refresh() is False
+
+
+def test_a_snapshot_edited_by_hand_reloads(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    store.add(person('Sara'))
+    store.compact()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([person('Mina')], f)
+    assert store.refresh() is True
+    assert [e['name'] for e in store.entries()] == ['Mina']
+
+
+def test_unsubscribed_callbacks_are_not_called(store):
+    calls = []
+    callback = lambda: calls.append(1)  # noqa: E731
+    store.subscribe(callback)
+    store.subscribe(callback)
+    assert store.listeners() == [callback]
+    store.unsubscribe(callback)
+    reopen(store).add(person('Ali'))
+    assert store.refresh() is True and calls == []
@@ -0,0 +1,120 @@
+import sqlite3
+
+import pytest
+
+from psycho_core.classdb import MIGRATIONS, SCHEMA_VERSION, ClassDatabase
+
+MATRIX = 'SELECT date_id,student_id,present,score FROM attendance WHERE class_id=?'
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ClassDatabase(str(tmp_path / 'class.sqlite3'))
+    yield db
+    db.close()
+
+
+def add_class(db, name='c'):
+    return db.execute('INSERT INTO classes (name) VALUES (?)', (name,)).lastrowid
+
+
+def test_legacy_database_is_cleaned_up_and_migrated(tmp_path):
+    path = str(tmp_path / 'class.sqlite3')
+    conn = sqlite3.connect(path)
+    for stmt in MIGRATIONS[0]:
+        conn.execute(stmt)
+    conn.executescript('''
+        INSERT INTO classes (id, name) VALUES (1, 'c');
+        INSERT INTO class_students (id, class_id, name, phone) VALUES (1, 1, 'Sara', '0912'), (2, 1, 'Sara', '0912'),
+                                                                     (3, 9, 'orphan', '');
+        INSERT INTO class_dates (id, class_id, date) VALUES (1, 1, '1403-01-01');
+        INSERT INTO attendance (class_id, date_id, student_id, present, score) VALUES
+            (1, 1, 1, 1, '5'), (1, 1, 2, 1, '7'), (1, 1, 3, 1, '1'), (1, 2, 1, 0, '');
+    ''')
+    conn.commit()
+    conn.close()
+
+    db = ClassDatabase(path)
+    assert db.schema_version() == SCHEMA_VERSION
+    # the duplicate student and the orphans are gone; the first attendance record wins
+    assert db.query('SELECT id, name FROM class_students') == [(1, 'Sara')]
+    assert db.query('SELECT student_id, score FROM attendance') == [(1, 5.0)]
+    db.close()
+
+
+def test_deleting_a_class_cascades(db):
+    cid = add_class(db)
+    sid = db.execute('INSERT INTO class_students (class_id, name, phone) VALUES (?, ?, ?)',
+                     (cid, 'Sara', '0912')).lastrowid
+    did = db.execute('INSERT INTO class_dates (class_id, date) VALUES (?, ?)', (cid, '1403-01-01')).lastrowid
+    db.execute('INSERT INTO attendance (class_id, date_id, student_id, present) VALUES (?, ?, ?, 1)', (cid, did, sid))
+    db.execute('DELETE FROM classes WHERE id=?', (cid,))
+    for table in ('class_students', 'class_dates', 'attendance', 'class_stats', 'student_stats'):
+        assert db.query_one(f'SELECT COUNT(*) FROM {table}')[0] == 0
+
+
+def test_add_students_skips_ones_already_in_the_class(db):
+    cid = add_class(db)
+    sara = {'id': 'E1', 'name': 'Sara', 'phone': '0912', 'answers': 'ab'}
+    ali = {'id': 'E2', 'name': 'Ali', 'phone': '0935', 'answers': 'ba'}
+    assert db.add_students(cid, [sara]) == 1
+    assert db.add_students(cid, [sara, ali]) == 1
+    assert db.query('SELECT entry_id FROM class_students ORDER BY id') == [('E1',), ('E2',)]
+
+
+def test_transaction_rolls_back(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            add_class(db)
+            raise RuntimeError
+    assert db.query_one('SELECT COUNT(*) FROM classes')[0] == 0
+
+
+def test_class_matrix_is_read_from_the_covering_index(db):
+    plan = ' '.join(row[-1] for row in db.query('EXPLAIN QUERY PLAN ' + MATRIX, (1,)))
+    assert 'COVERING INDEX idx_attendance_class' in plan
+
+
+def stats(db, cid):
+    return (db.query_one('SELECT student_count, date_count, record_count, present_count, scored_count, score_total '
+                         'FROM class_stats WHERE class_id=?', (cid,)),
+            db.query('SELECT student_id, record_count, present_count, scored_count, score_total '
+                     'FROM student_stats WHERE class_id=? ORDER BY student_id', (cid,)))
+
+
+def test_triggers_keep_the_aggregates_current(db):
+    cid = add_class(db)
+    s1, s2 = (db.execute('INSERT INTO class_students (class_id, name, phone) VALUES (?, ?, ?)',
+                         (cid, name, '')).lastrowid for name in ('a', 'b'))
+    d1, d2 = (db.execute('INSERT INTO class_dates (class_id, date) VALUES (?, ?)', (cid, d)).lastrowid
+              for d in ('1403-01-01', '1403-01-02'))
+    db.executemany('INSERT INTO attendance (class_id, date_id, student_id, present, score) VALUES (?, ?, ?, ?, ?)',
+                   [(cid, d1, s1, 1, 5), (cid, d2, s1, 0, 'x'), (cid, d1, s2, 1, 2.5)])
+    assert stats(db, cid) == ((2, 2, 3, 2, 2, 7.5), [(s1, 2, 1, 1, 5.0), (s2, 1, 1, 1, 2.5)])
+
+    db.execute('UPDATE attendance SET present=1, score=3 WHERE date_id=? AND student_id=?', (d2, s1))
+    assert stats(db, cid) == ((2, 2, 3, 3, 3, 10.5), [(s1, 2, 2, 2, 8.0), (s2, 1, 1, 1, 2.5)])
+
+    # deleting a date cascades to its attendance
+    db.execute('DELETE FROM class_dates WHERE id=?', (d1,))
+    assert stats(db, cid) == ((2, 1, 1, 1, 1, 3.0), [(s1, 1, 1, 1, 3.0), (s2, 0, 0, 0, 0.0)])
+    db.execute('DELETE FROM class_students WHERE id=?', (s1,))
+    assert stats(db, cid) == ((1, 1, 0, 0, 0, 0.0), [(s2, 0, 0, 0, 0.0)])
+
+
+def test_aggregates_are_built_for_existing_data(tmp_path):
+    path = str(tmp_path / 'class.sqlite3')
+    conn = sqlite3.connect(path)
+    for stmt in MIGRATIONS[0]:
+        conn.execute(stmt)
+    conn.executescript('''
+        INSERT INTO classes (id, name) VALUES (1, 'c');
+        INSERT INTO class_students (id, class_id, name, phone) VALUES (1, 1, 'a', ''), (2, 1, 'b', '');
+        INSERT INTO class_dates (id, class_id, date) VALUES (1, 1, '1403-01-01');
+        INSERT INTO attendance (class_id, date_id, student_id, present, score) VALUES (1, 1, 1, 1, '5'), (1, 1, 2, 0, '');
+    ''')
+    conn.commit()
+    conn.close()
+    db = ClassDatabase(path)
+    assert stats(db, 1) == ((2, 1, 2, 1, 1, 5.0), [(1, 1, 1, 1, 5.0), (2, 1, 0, 0, 0.0)])
+    db.close()
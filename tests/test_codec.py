@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from psycho_core import codec
+
+ENTRIES = [
+    {'name': 'سارا احمدی', 'phone': '۰۹۱۲', 'answers': 'ab', 'score': -3, 'keys_snapshot_id': 'x' * 24},
+    {'name': 'Ali', 'phone': '', 'answers': '', 'score': None, 'extra': {'nested': [1, 2.5, True]}},
+]
+
+
+@pytest.fixture(params=['fast', 'json'])
+def backend(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(codec, 'orjson', None)
+        monkeypatch.setattr(codec, 'msgspec', None)
+    elif codec.BACKEND == 'json':
+        pytest.skip('neither orjson nor msgspec is installed')
+    return request.param
+
+
+def test_round_trip_in_both_styles(backend):
+    for pretty in (True, False):
+        data = codec.dumps(ENTRIES, pretty=pretty)
+        assert codec.decode_entries(data) == ENTRIES
+        assert codec.loads(data) == ENTRIES
+        # non-ASCII text is written as is
+        assert 'سارا'.encode('utf-8') in data
+
+
+def test_pretty_output_matches_the_apps_layout(backend):
+    expected = json.dumps(ENTRIES, ensure_ascii=False, indent=2).encode('utf-8')
+    assert codec.dumps(ENTRIES, pretty=True) == expected
+    assert len(codec.dumps(ENTRIES, pretty=False)) < len(expected)
+
+
+def test_invalid_input_raises_value_error(backend):
+    with pytest.raises(ValueError):
+        codec.loads(b'[{"name": ')
+    with pytest.raises(ValueError):
+        codec.decode_entries(b'not json')
+
+
+def test_integers_too_big_for_the_fast_codecs(backend):
+    data = codec.dumps({'score': 1 << 70})
+    assert codec.loads(data) == {'score': 1 << 70}
+
+
+def test_set_pretty_and_write_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(codec, 'PRETTY', True)
+    codec.set_pretty(False)
+    path = str(tmp_path / 'entries.json')
+    codec.write_entries(path, ENTRIES)
+    data = open(path, 'rb').read()
+    assert b'\n' not in data
+    assert codec.decode_entries(data) == ENTRIES
@@ -0,0 +1,43 @@
+import pytest
+
+from psycho_core import IdentityIndex, canonical_phone, identity_key, new_entry_id, normalize_identity
+
+
+@pytest.mark.parametrize('phone', ['09123456789', '0912 345 6789', '+98 912 345 6789', '00989123456789',
+                                   '9123456789', '۰۹۱۲۳۴۵۶۷۸۹', '(0912) 345-6789'])
+def test_spellings_of_a_phone_number_are_one_canonical_form(phone):
+    assert canonical_phone(phone) == '09123456789'
+
+
+def test_normalized_identity():
+    assert normalize_identity('  علي   رضا ', '+98 912 345 6789', ' a b\tc ') == \
+        normalize_identity('علی رضا', '09123456789', 'abc')
+    assert canonical_phone('n / a') == 'n / a'
+    # answers keep their case: scoring tells 'A' and 'a' apart
+    assert identity_key('Sara', '0912', 'A') != identity_key('Sara', '0912', 'a')
+
+
+def test_identity_index_finds_entries_by_normalized_identity():
+    a = {'name': 'Sara', 'phone': '0912 345 6789', 'answers': 'ab'}
+    b = {'name': 'sara', 'phone': '+989123456789', 'answers': 'ab'}
+    index = IdentityIndex([a, b])
+    assert index.find('SARA', '09123456789', 'a b') == [a, b]
+    index.discard(a)
+    assert index.find('Sara', '09123456789', 'ab') == [b]
+
+
+def test_entry_ids_sort_in_creation_order():
+    ids = [new_entry_id() for _ in range(1000)]
+    assert len(set(ids)) == 1000
+    assert ids == sorted(ids)
+    assert all(len(i) == 26 for i in ids)
+
+
+def test_stores_find_duplicates_across_spellings(store):
+    slot = store.add({'name': 'Sara', 'phone': '0912 345 6789', 'answers': 'ab'})
+    assert store.find_duplicates('sara', '+98 912 345 6789', 'ab') == [slot]
+    store.update(slot, {'name': 'Mina', 'phone': '0912 345 6789', 'answers': 'ab'})
+    assert store.find_duplicates('sara', '09123456789', 'ab') == []
+    assert store.find_duplicates('mina', '09123456789', 'ab') == [slot]
+    store.delete(slot)
+    assert store.find_duplicates('mina', '09123456789', 'ab') == []
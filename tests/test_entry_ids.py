@@ -0,0 +1,43 @@
+from conftest import open_store, person, reopen, write_json
+from psycho_core import JournaledEntryStore, iter_json_entries, merge_entry_files
+
+
+def clashing_file(path):
+    # merged exports of an entry edited on two machines: same id, different data
+    return write_json(path, [person('A', '1', id='X'), person('B', '2', id='X')])
+
+
+def test_duplicate_ids_are_restamped_once_and_kept(tmp_path, kind):
+    store = open_store(kind, clashing_file(tmp_path / 'entries.json'))
+    a, b = store.entries()
+    assert a['id'] == 'X' and b['id'] not in ('X', None)
+    assert store.get_by_id(b['id']) is b
+    # written back, so the new id stays the same
+    assert [e['id'] for e in reopen(store).entries()] == ['X', b['id']]
+
+
+def test_deleting_the_second_copy_deletes_it(tmp_path, kind):
+    store = open_store(kind, clashing_file(tmp_path / 'entries.json'))
+    a, b = store.entries()
+    # the stored object wins over its id
+    b['id'] = 'X'
+    store.delete(store.find_entry(b))
+    assert [e['name'] for e in store.entries()] == ['A']
+
+
+def test_find_entry_falls_back_to_id_and_identity(tmp_path):
+    store = JournaledEntryStore(str(tmp_path / 'entries.json'))
+    slot = store.add(person('A', '1'))
+    stored = store.get(slot)
+    assert store.find_entry(dict(stored)) == slot
+    assert store.find_entry(person('A', '1')) == slot
+    assert store.find_entry(person('Z')) is None
+
+
+def test_merge_gives_repeated_ids_a_new_one(tmp_path):
+    first = clashing_file(tmp_path / 'a.json')
+    second = write_json(tmp_path / 'b.json', [person('C', '3', id='X')])
+    out = str(tmp_path / 'merged.json')
+    merge_entry_files([first, second], out)
+    ids = [e['id'] for e in iter_json_entries(out)]
+    assert ids[0] == 'X' and len(set(ids)) == 3
@@ -0,0 +1,68 @@
+import csv
+
+import pytest
+
+from psycho_core import import_answer_sheets
+
+KEYS = [{'a': 1, 'b': 2}, {'a': 3, 'b': 0}]
+
+ROWS = [
+    ['name', 'phone', 'answers'],
+    ['Sara', '0912 345 6789', 'ab'],
+    ['', '0935', 'ab'],                  # no name
+    ['Ali', '0935', 'a'],                # too few answers
+    ['Mina', '0901', 'ax'],              # not a letter of the key
+    ['سارا', '+98 912 345 6789', 'ba'],  # a new person: the answers differ
+    ['Sara', '+989123456789', 'ab'],     # same as the first row
+]
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+    return str(path)
+
+
+def read_report(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.reader(f))[1:]
+
+
+def test_rows_are_validated_scored_and_deduplicated(tmp_path, store):
+    path = write_csv(tmp_path / 'sheet.csv', ROWS)
+    summary = import_answer_sheets(path, store, KEYS, batch_size=2)
+    assert summary == {'read': 6, 'imported': 2, 'duplicates': 1, 'rejected': 3,
+                       'report': str(tmp_path / 'sheet.rejected.csv')}
+    assert [(e['name'], e['score']) for e in store.entries()] == [('Sara', 1), ('سارا', 5)]
+    assert all(e['keys_snapshot'] == KEYS and e['id'] for e in store.entries())
+    # spreadsheet row numbers: the header is row 1
+    assert [(r[0], r[4]) for r in read_report(summary['report'])] == [
+        ('3', 'name required'), ('4', 'expected 2 answers, got 1'),
+        ('5', "invalid answer 'x' for question 2"), ('7', 'duplicate')]
+
+
+def test_rows_already_stored_are_duplicates(tmp_path, store):
+    store.add({'name': 'Sara', 'phone': '09123456789', 'answers': 'ab', 'score': 1})
+    summary = import_answer_sheets(write_csv(tmp_path / 'sheet.csv', ROWS[:2]), store, KEYS)
+    assert (summary['imported'], summary['duplicates']) == (0, 1)
+
+
+def test_cancelled_import_changes_nothing(tmp_path, store):
+    path = write_csv(tmp_path / 'sheet.csv', [ROWS[0]] + [[f'n{i}', str(i), 'ab'] for i in range(10)])
+    assert import_answer_sheets(path, store, KEYS, batch_size=3, is_cancelled=lambda: True) is None
+    assert store.entries() == []
+
+
+def test_jsonl_and_bad_lines(tmp_path, store):
+    path = tmp_path / 'sheet.jsonl'
+    path.write_text('{"Name": "Sara", "phone": "0912", "answers": "ab"}\nnot json\n[1]\n', encoding='utf-8')
+    summary = import_answer_sheets(str(path), store, KEYS)
+    assert (summary['imported'], summary['rejected']) == (1, 2)
+    assert [r[4] for r in read_report(summary['report'])] == ['invalid JSON line', 'not a JSON object']
+
+
+def test_missing_columns_and_unknown_types(tmp_path, store):
+    with pytest.raises(ValueError, match='phone'):
+        import_answer_sheets(write_csv(tmp_path / 'sheet.csv', [['name', 'answers']]), store, KEYS)
+    with pytest.raises(ValueError, match='Unsupported'):
+        import_answer_sheets(write_csv(tmp_path / 'sheet.txt', ROWS), store, KEYS)
@@ -0,0 +1,152 @@
+import json
+import os
+import random
+import shutil
+
+import pytest
+
+from conftest import contents, numbered as entry
+from psycho_core import JournaledEntryStore, MissingSnapshotError
+
+
+def test_replay_after_reopen(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    slots = [store.add(entry(i)) for i in range(5)]
+    store.update(slots[1], entry(10))
+    store.delete(slots[3])
+    store.add_many([entry(20), entry(21)])
+    store.apply_scores([(store.get(slots[0]), 7)])
+    assert os.path.exists(path + '.journal')
+    assert contents(JournaledEntryStore(path)) == contents(store)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_ops_match_model(tmp_path, seed):
+    rng = random.Random(seed)
+    path = str(tmp_path / 'entries.json')
+    # small limits so the run compacts several times
+    store = JournaledEntryStore(path, compact_min_ops=7, compact_ratio=0.1)
+    model = []
+    for step in range(300):
+        op = rng.random()
+        if op < 0.4 or not model:
+            e = entry(step, score=rng.randint(0, 9))
+            store.add(e)
+            model.append(e)
+        elif op < 0.6:
+            batch = [entry(1000 * step + i) for i in range(rng.randint(1, 4))]
+            store.add_many(batch)
+            model.extend(batch)
+        elif op < 0.8:
+            i = rng.randrange(len(model))
+            new = entry(step, score=rng.randint(0, 9))
+            store.update(store.slot_of(model[i]), new)
+            model[i] = new
+        else:
+            e = model.pop(rng.randrange(len(model)))
+            store.delete(store.slot_of(e))
+        if step % 50 == 0:
+            store = JournaledEntryStore(path, compact_min_ops=7, compact_ratio=0.1)
+            model = store.entries()
+    expected = [(e['name'], e['phone'], e['answers'], e.get('score')) for e in model]
+    assert contents(store) == expected
+    assert contents(JournaledEntryStore(path)) == expected
+
+
+def test_torn_journal_line_is_dropped(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    store.add(entry(1))
+    store.add(entry(2))
+    with open(path + '.journal', 'ab') as f:
+        # a crash in the middle of writing the next op
+        f.write(b'{"op":"add","slot":2,"entry":{"na')
+    reopened = JournaledEntryStore(path)
+    assert contents(reopened) == contents(store)
+    # the torn tail is cut off, so later writes replay
+    reopened.add(entry(3))
+    assert [e['name'] for e in JournaledEntryStore(path).entries()] == ['n1', 'n2', 'n3']
+
+
+def test_journal_of_replaced_snapshot_is_discarded(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    store.add(entry(1))
+    store.compact()
+    store.add(entry(2))
+    # entries.json replaced by hand: the journal belongs to the old snapshot
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([entry(9)], f)
+    assert [e['name'] for e in JournaledEntryStore(path).entries()] == ['n9']
+    assert not os.path.exists(path + '.journal')
+
+
+def test_crash_between_snapshot_and_journal_removal(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    store.add(entry(1))
+    store.add(entry(2))
+    journal = open(path + '.journal', 'rb').read()
+    store.compact()
+    # the compacted snapshot was written but the old journal survived the crash
+    with open(path + '.journal', 'wb') as f:
+        f.write(journal)
+    assert [e['name'] for e in JournaledEntryStore(path).entries()] == ['n1', 'n2']
+
+
+def test_snapshot_travels_with_entries_file(tmp_path):
+    src = tmp_path / 'a'
+    dst = tmp_path / 'b'
+    src.mkdir()
+    dst.mkdir()
+    keys = [{'a': 1, 'b': 2}]
+    store = JournaledEntryStore(str(src / 'entries.json'))
+    store.add(dict(entry(1), keys_snapshot=store.snapshots.intern(keys)))
+    store.compact()
+    # copied without keys_snapshots.json
+    shutil.copy(src / 'entries.json', dst / 'entries.json')
+    assert JournaledEntryStore(str(dst / 'entries.json')).entries()[0]['keys_snapshot'] == keys
+
+    data = json.loads((src / 'entries.json').read_text(encoding='utf-8'))
+    del data[0]['keys_snapshot']
+    missing = tmp_path / 'c'
+    missing.mkdir()
+    (missing / 'entries.json').write_text(json.dumps(data), encoding='utf-8')
+    with pytest.raises(MissingSnapshotError):
+        JournaledEntryStore(str(missing / 'entries.json'))
+
+
+def test_last_modified_counts_the_journal(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    assert store.last_modified() is None
+    store.add(entry(1))
+    # nothing but the journal exists yet
+    assert not os.path.exists(path)
+    assert store.last_modified() == pytest.approx(os.path.getmtime(path + '.journal'))
+
+
+def test_single_writes_append_to_the_journal(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path)
+    store.add(entry(1))
+    store.compact()
+    snapshot = open(path, 'rb').read()
+    slot = store.add(entry(2))
+    store.update(slot, entry(3))
+    store.delete(slot)
+    # the snapshot is left alone: a header plus one line per op
+    assert open(path, 'rb').read() == snapshot
+    assert len(open(path + '.journal', 'rb').read().splitlines()) == 4
+
+
+def test_journal_is_compacted_once_it_outgrows_the_entries(tmp_path):
+    path = str(tmp_path / 'entries.json')
+    store = JournaledEntryStore(path, compact_min_ops=3, compact_ratio=0.5)
+    for i in range(3):
+        store.add(entry(i))
+    assert os.path.exists(path + '.journal')
+    store.add(entry(3))
+    assert not os.path.exists(path + '.journal')
+    assert [e['name'] for e in json.loads(open(path, encoding='utf-8').read())] == ['n0', 'n1', 'n2', 'n3']
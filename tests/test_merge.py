@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from conftest import person
+from psycho_core import JournaledEntryStore, MissingSnapshotError, iter_json_entries, merge_entry_files
+
+KEYS = [{'a': 1, 'b': 2}]
+
+
+def write_store(directory, entries):
+    directory.mkdir()
+    store = JournaledEntryStore(str(directory / 'entries.json'))
+    store.add_many(entries)
+    store.compact()
+    return str(directory / 'entries.json')
+
+
+@pytest.mark.parametrize('max_keys', [10, 1])
+def test_first_occurrence_wins_by_normalized_identity(tmp_path, max_keys):
+    a = tmp_path / 'a.jsonl'
+    a.write_text('\n'.join(json.dumps(e) for e in [person('Sara', '09123456789', score=1),
+                                                      person('Ali', '0935')]), encoding='utf-8')
+    b = tmp_path / 'b.json'
+    b.write_text(json.dumps([person('sara', '+98 912 345 6789', score=2), person('Mina', '0901')]),
+                 encoding='utf-8')
+    out = str(tmp_path / 'merged.json')
+    # max_keys=1 moves the seen identities to the on-disk table
+    summary = merge_entry_files([str(a), str(b)], out, max_keys_in_memory=max_keys)
+    assert summary == {'files': 2, 'read': 4, 'written': 3, 'duplicates': 1}
+    merged = list(iter_json_entries(out))
+    assert [(e['name'], e.get('score')) for e in merged] == [('Sara', 1), ('Ali', None), ('Mina', None)]
+
+
+def test_snapshots_stay_referenced_and_inline_once(tmp_path):
+    first = write_store(tmp_path / 'a', [person(f'n{i}', str(i), keys_snapshot=KEYS) for i in range(5)])
+    second = write_store(tmp_path / 'b', [person(f'm{i}', str(100 + i), keys_snapshot=KEYS) for i in range(5)])
+    (tmp_path / 'out').mkdir()
+    out = str(tmp_path / 'out' / 'entries.json')
+    merge_entry_files([first, second], out)
+    merged = json.loads(open(out, encoding='utf-8').read())
+    assert len(merged) == 10
+    assert all('keys_snapshot_id' in e for e in merged)
+    assert [i for i, e in enumerate(merged) if 'keys_snapshot' in e] == [0]
+    # no keys_snapshots.json next to the output: the inline copy makes it self-contained
+    assert all(e['keys_snapshot'] == KEYS for e in JournaledEntryStore(out).entries())
+
+
+def test_unknown_snapshot_reference_is_an_error(tmp_path):
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps([person('Sara', '0912', keys_snapshot_id='0' * 24)]), encoding='utf-8')
+    with pytest.raises(MissingSnapshotError):
+        merge_entry_files([str(path)], str(tmp_path / 'merged.json'))
+
+
+def test_cancelled_merge_keeps_the_output(tmp_path):
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps([person('Sara', '0912')]), encoding='utf-8')
+    out = tmp_path / 'merged.json'
+    out.write_text('[]', encoding='utf-8')
+    assert merge_entry_files([str(path)], str(out), is_cancelled=lambda: True) is None
+    assert out.read_text(encoding='utf-8') == '[]'
+    assert not (tmp_path / 'merged.json.tmp').exists()
+
+
+def test_iter_json_entries_across_chunks(tmp_path, monkeypatch):
+    from psycho_core import merge
+    monkeypatch.setattr(merge, 'READ_CHUNK', 7)
+    entries = [person('سارا', str(12345 * i), score=i) for i in range(20)]
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps(entries, ensure_ascii=False, indent=2), encoding='utf-8-sig')
+    assert list(iter_json_entries(str(path))) == entries
@@ -0,0 +1,100 @@
+from conftest import open_store, write_json
+from psycho_core import FORMAT_VERSION, JournaledEntryStore, migrate_store, pending_migrations
+
+KEYS = [{'a': 1, 'b': 2}, {'a': 3, 'b': 0}]
+
+
+def legacy_file(tmp_path, entries):
+    return write_json(tmp_path / 'entries.json', entries)
+
+
+def test_migrates_and_rescores_exact_duplicates(tmp_path, kind):
+    same = {'name': 'Sara', 'phone': '0912', 'answers': 'ab'}
+    path = legacy_file(tmp_path, [dict(same), dict(same), {'name': 'Ali', 'phone': '0935', 'answers': 'ba'}])
+    store = open_store(kind, path)
+    assert pending_migrations(store) == ['timestamps', 'ids']
+
+    assert migrate_store(store, KEYS, snapshots=True) == {'keys_snapshot': 3, 'timestamps': 3, 'ids': 3}
+    assert store.format_version() == FORMAT_VERSION
+    entries = store.entries()
+    assert [e['score'] for e in entries] == [1, 1, 5]
+    assert all(e['id'] and e['keys_snapshot'] == KEYS for e in entries)
+    # legacy entries are stamped with the time of the migration
+    assert all(e['created'] and e['modified'] == e['created'] for e in entries)
+    assert len({e['id'] for e in entries}) == 3
+    first, second = store.find_identity('Sara', '0912', 'ab')
+    assert store.find_duplicates('Sara', '0912', 'ab') == [first, second]
+
+    # rescoring one of the duplicates keeps both indexed
+    assert store.apply_scores([(entries[0], 9)]) == 1
+    assert store.find_identity('Sara', '0912', 'ab') == [first, second]
+    assert store.get_by_id(entries[0]['id'])['score'] == 9
+    assert len(store.search('sara')) == 2
+
+
+def test_changed_identity_moves_in_the_indexes(tmp_path, kind):
+    path = legacy_file(tmp_path, [{'name': 'Sara', 'phone': '0912', 'answers': 'ab'}] * 2)
+    store = open_store(kind, path)
+    store.find_duplicates('Sara', '0912', 'ab')
+    store.search('sara')
+    e = store.entries()[0]
+    store.apply_changes([(e, {'name': 'Mina'})])
+    assert len(store.find_identity('Sara', '0912', 'ab')) == 1
+    assert store.find_identity('Mina', '0912', 'ab') == [store.slot_of(e)]
+    assert len(store.find_duplicates('Sara', '0912', 'ab')) == 1
+    assert store.find_duplicates('Mina', '0912', 'ab') == [store.slot_of(e)]
+    assert store.search('mina') == [e]
+
+
+def test_snapshots_are_only_added_on_request(tmp_path, kind):
+    path = legacy_file(tmp_path, [{'name': 'Sara', 'phone': '0912', 'answers': 'ab', 'score': 7}])
+    store = open_store(kind, path)
+    assert migrate_store(store, KEYS) == {'timestamps': 1, 'ids': 1}
+    e = store.entries()[0]
+    assert 'keys_snapshot' not in e and e['score'] == 7
+    # entries without a snapshot are current: nothing is left pending
+    assert store.format_version() == FORMAT_VERSION
+    assert pending_migrations(store) == []
+    assert migrate_store(store, KEYS) == {}
+
+    assert migrate_store(store, KEYS, snapshots=True) == {'keys_snapshot': 1}
+    assert store.entries()[0]['keys_snapshot'] == KEYS
+    assert migrate_store(store, KEYS, snapshots=True) == {'keys_snapshot': 0}
+
+
+def test_current_data_needs_no_migration(tmp_path):
+    path = legacy_file(tmp_path, [])
+    store = JournaledEntryStore(path)
+    store.add({'name': 'Sara', 'phone': '0912', 'answers': 'ab', 'keys_snapshot': KEYS})
+    migrate_store(store, KEYS)
+    assert pending_migrations(JournaledEntryStore(path)) == []
+    assert migrate_store(JournaledEntryStore(path), KEYS) == {}
+
+
+def test_migrated_entries_survive_reopen(tmp_path):
+    path = legacy_file(tmp_path, [{'name': 'Sara', 'phone': '0912', 'answers': 'ab'}] * 2)
+    store = JournaledEntryStore(path)
+    migrate_store(store, KEYS, snapshots=True)
+    reopened = JournaledEntryStore(path)
+    assert reopened.format_version() == FORMAT_VERSION
+    assert [(e['id'], e['score']) for e in reopened.entries()] == [(e['id'], e['score']) for e in store.entries()]
+
+
+def test_editing_a_legacy_entry_stamps_it(tmp_path):
+    path = legacy_file(tmp_path, [{'name': 'Sara', 'phone': '0912', 'answers': 'ab'}])
+    store = JournaledEntryStore(path)
+    store.update(0, {'name': 'Sara', 'phone': '0912', 'answers': 'ba'})
+    e = store.entries()[0]
+    assert e['id'] and e['created'] and e['modified'] == e['created']
+
+
+def test_entries_written_during_a_run_keep_their_steps_pending(tmp_path, kind):
+    store = open_store(kind, legacy_file(tmp_path, [{'name': 'Sara', 'phone': '0912', 'answers': 'ab'}]))
+
+    def progress(done, total):
+        if done == 1 and len(store) == 1:
+            store.replace_all(store.entries() + [{'name': 'Ali', 'phone': '0935', 'answers': 'ba'}])
+    migrate_store(store, KEYS, chunk_size=1, progress=progress)
+    assert pending_migrations(store) == ['timestamps', 'ids']
+    migrate_store(store, KEYS)
+    assert pending_migrations(store) == [] and all(e['id'] for e in store.entries())
@@ -0,0 +1,83 @@
+import json
+import sqlite3
+
+import pytest
+
+from conftest import contents, numbered as person
+from psycho_core import EntryRepository, JournaledEntryStore, open_entry_store, repository_path_for
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = EntryRepository(str(tmp_path / 'entries.sqlite3'))
+    yield repo
+    repo.close()
+
+
+def test_writes_survive_reopen(repo):
+    rows = [repo.add(person(i)) for i in range(4)]
+    repo.update(rows[1], person(10))
+    repo.delete(rows[2])
+    repo.add_many([person(20), person(21)])
+    reopened = EntryRepository(repo.path)
+    assert contents(reopened) == contents(repo)
+    assert [e['id'] for e in reopened.entries()] == [e['id'] for e in repo.entries()]
+    reopened.close()
+
+
+def test_identity_lookup_uses_the_identity_index(repo):
+    repo.add_many([person(1), person(1), person(2)])
+    first, second = repo.find_identity('n1', '09000000001', 'ab')
+    assert first < second
+    plan = ' '.join(r[-1] for r in repo.conn.execute(
+        'EXPLAIN QUERY PLAN SELECT id FROM entries WHERE name=? AND phone=? AND answers=? ORDER BY id',
+        ('n1', '', '')))
+    assert 'idx_entries_identity' in plan
+
+
+def test_unused_indexes_of_older_databases_are_dropped(tmp_path):
+    path = str(tmp_path / 'entries.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE entries (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL DEFAULT \'\', '
+                 'phone TEXT NOT NULL DEFAULT \'\', answers TEXT NOT NULL DEFAULT \'\', score INTEGER, data TEXT NOT NULL)')
+    conn.execute('CREATE INDEX idx_entries_name ON entries(name)')
+    conn.execute('CREATE INDEX idx_entries_phone ON entries(phone)')
+    conn.commit()
+    conn.close()
+    repo = EntryRepository(path)
+    names = {r[0] for r in repo.conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert 'idx_entries_name' not in names and 'idx_entries_phone' not in names
+    assert 'idx_entries_identity' in names
+    repo.close()
+
+
+def test_bulk_insert_rolls_back_on_error(repo):
+    repo.add(person(1))
+    with pytest.raises(RuntimeError):
+        with repo.bulk_insert() as add:
+            add([person(2), person(3)])
+            assert len(repo.find_duplicates('n2', '09000000002', 'ab')) == 1
+            raise RuntimeError
+    assert contents(repo) == [('n1', '09000000001', 'ab', 1)]
+    assert contents(EntryRepository(repo.path)) == [('n1', '09000000001', 'ab', 1)]
+
+
+def test_import_and_export_json(tmp_path):
+    keys = [{'a': 1}]
+    entries_path = str(tmp_path / 'entries.json')
+    source = JournaledEntryStore(entries_path)
+    source.add_many([person(1, keys_snapshot=keys), person(2, keys_snapshot=keys)])
+    assert isinstance(open_entry_store(entries_path), JournaledEntryStore)
+
+    repo = EntryRepository(repository_path_for(entries_path))
+    assert repo.import_json(entries_path) == 2
+    assert isinstance(open_entry_store(entries_path), EntryRepository)
+    # rows hold the snapshot by reference
+    assert all('keys_snapshot_id' in json.loads(d) for d, in repo.conn.execute('SELECT data FROM entries'))
+
+    out = tmp_path / 'export' / 'entries.json'
+    out.parent.mkdir()
+    assert repo.export_json(str(out)) == 2
+    exported = json.loads(out.read_text(encoding='utf-8'))
+    assert [e['keys_snapshot'] for e in exported] == [keys, keys]
+    repo.close()
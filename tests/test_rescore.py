@@ -0,0 +1,42 @@
+from psycho_core import JournaledEntryStore, compute_score_from_keys, rescore_store
+
+KEYS0 = [{'a': 1, 'b': 2}, {'a': 0, 'b': 1}]
+KEYS1 = [{'a': 5, 'b': 2}, {'a': 0, 'b': 1}]
+KEYS2 = [{'a': 5, 'b': 2}, {'a': 3, 'b': 1}]
+
+
+def make_store(tmp_path, rows):
+    store = JournaledEntryStore(str(tmp_path / 'entries.json'))
+    store.add_many([{'name': f'n{i}', 'phone': str(i), 'answers': a, 'score': compute_score_from_keys(KEYS0, a)}
+                    for i, a in enumerate(rows)])
+    return store
+
+
+def scores(store):
+    return [e['score'] for e in store.entries()]
+
+
+def test_incremental_matches_full(tmp_path):
+    store = make_store(tmp_path, ['aa', 'ab', 'ba', 'bb', 'a', ''])
+    # two entries answer the same (duplicates are rescored like any other entry)
+    store.add({'name': 'n0', 'phone': '0', 'answers': 'aa', 'score': 1})
+    assert rescore_store(store, KEYS1, old_keys=KEYS0) == 4
+    assert scores(store) == [compute_score_from_keys(KEYS1, e['answers']) for e in store.entries()]
+
+
+def test_snapshotted_entries_keep_their_score(tmp_path):
+    store = make_store(tmp_path, ['aa'])
+    store.add({'name': 'x', 'phone': '1', 'answers': 'aa', 'score': 1,
+               'keys_snapshot': store.snapshots.intern(KEYS0)})
+    rescore_store(store, KEYS1, old_keys=KEYS0)
+    assert scores(store) == [5, 1]
+
+
+def test_cancelled_run_is_caught_up_from_the_last_completed_keys(tmp_path):
+    store = make_store(tmp_path, ['aa', 'ab', 'ba', 'bb'])
+    before = scores(store)
+    assert rescore_store(store, KEYS1, old_keys=KEYS0, is_cancelled=lambda: True) is None
+    assert scores(store) == before
+    # diffing KEYS1 -> KEYS2 alone would miss the cancelled KEYS0 -> KEYS1 change
+    rescore_store(store, KEYS2, old_keys=KEYS0)
+    assert scores(store) == [compute_score_from_keys(KEYS2, e['answers']) for e in store.entries()]
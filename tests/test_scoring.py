@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from psycho_core import scoring
+from psycho_core.rescore import affected_entries, changed_cells
+from psycho_core.scoring import (CompiledKeys, MissingSnapshotError, compute_score_from_keys,
+                                 score_answers_batch, score_entries)
+
+LETTERS = 'abcdA'
+
+
+def random_keys(rng, questions):
+    keys = []
+    for _ in range(questions):
+        k = {ch: rng.randint(-3, 9) for ch in rng.sample(LETTERS, rng.randint(0, len(LETTERS)))}
+        if k and rng.random() < 0.1:
+            # non-integer scores count as 0, numeric strings are converted
+            k[rng.choice(list(k))] = rng.choice(['x', '7', None, 2.0])
+        keys.append(k)
+    return keys
+
+
+def random_answers(rng, questions):
+    # shorter, longer, unknown letters and non-ASCII text are all scored like the scalar scorer does
+    n = rng.randint(0, questions + 3)
+    return ''.join(rng.choice(LETTERS + 'zی ') for _ in range(n))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_batch_matches_scalar(seed):
+    rng = random.Random(seed)
+    keys = random_keys(rng, rng.randint(0, 30))
+    answers = [random_answers(rng, len(keys)) for _ in range(300)]
+    expected = [compute_score_from_keys(keys, a) for a in answers]
+    assert CompiledKeys(keys).score(answers) == expected
+    assert score_answers_batch(keys, answers) == expected
+
+
+def test_batch_without_numpy(monkeypatch):
+    monkeypatch.setattr(scoring, '_np', None)
+    rng = random.Random(1)
+    keys = random_keys(rng, 10)
+    answers = [random_answers(rng, len(keys)) for _ in range(100)]
+    compiled = CompiledKeys(keys)
+    assert compiled.matrix is None
+    assert compiled.score(answers) == [compute_score_from_keys(keys, a) for a in answers]
+
+
+def test_huge_scores_fall_back_to_scalar():
+    keys = [{'a': 2 ** 62}, {'a': 2 ** 62}]
+    assert CompiledKeys(keys).matrix is None
+    assert score_answers_batch(keys, ['aa'] * 100) == [2 ** 63] * 100
+
+
+def test_score_entries_uses_snapshots():
+    old = [{'a': 1}, {'a': 1}]
+    new = [{'a': 5}, {'a': 5}]
+    entries = [{'answers': 'aa', 'keys_snapshot': old}, {'answers': 'aa'}, {'answers': 'a', 'keys_snapshot': old}]
+    assert score_entries(entries, new) == [2, 10, 1]
+
+
+def test_score_entries_refuses_unresolved_snapshot():
+    with pytest.raises(MissingSnapshotError):
+        score_entries([{'answers': 'a', 'keys_snapshot_id': 'missing'}], [{'a': 1}])
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_affected_entries_match_brute_force(seed):
+    rng = random.Random(seed)
+    old = random_keys(rng, 12)
+    new = [dict(k) for k in old]
+    for _ in range(3):
+        q = rng.randrange(len(new))
+        new[q][rng.choice(LETTERS)] = rng.randint(0, 9)
+    entries = [{'answers': random_answers(rng, len(old))} for _ in range(500)]
+    entries += [{'answers': 'a' * 12, 'keys_snapshot': old}, {'answers': 'a' * 12, 'keys_snapshot_id': 'x'}]
+    cells = changed_cells(old, new)
+    expected = [e for e in entries[:500]
+                if any(q < len(e['answers']) and e['answers'][q] == ch for q, ch in cells)]
+    assert affected_entries(entries, old, new) == expected
+    # every entry whose score changes is among the affected ones
+    affected = {id(e) for e in expected}
+    for e in entries[:500]:
+        if compute_score_from_keys(old, e['answers']) != compute_score_from_keys(new, e['answers']):
+            assert id(e) in affected
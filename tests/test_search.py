@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from conftest import person
+from psycho_core import JournaledEntryStore, SearchIndex, normalize_phone, normalize_text
+
+
+def test_normalize_text_folds_arabic_forms_and_digits():
+    assert normalize_text('علي') == normalize_text('علی')
+    assert normalize_text('كريم') == 'کریم'
+    assert normalize_text('فاطمة') == 'فاطمه'
+    assert normalize_text('مـحـمّد') == 'محمد'
+    assert normalize_text('۰۹۱۲') == normalize_text('٠٩١٢') == '0912'
+    assert normalize_text('SARA') == 'sara'
+
+
+def test_normalize_phone_keeps_digits_only():
+    assert normalize_phone('0912 345-67 (89)') == '09123456789'
+    assert normalize_phone('۰۹۱۲') == '0912'
+    assert normalize_phone('n/a') == 'n/a'
+
+
+def test_search_matches_normalized_substrings_in_insertion_order():
+    entries = [person('Sara Ahmadi', '09123456789'), person('كريم', '0935 111'), person('Ali', '+98 912 345')]
+    index = SearchIndex(entries)
+    assert index.search('ahm') == [entries[0]]
+    assert index.search('کری') == [entries[1]]
+    assert index.search('۹۱۲ ۳۴۵') == [entries[0], entries[2]]
+    assert index.search('a') == [entries[0], entries[2]]
+    assert index.search('  ') == entries
+    # a term does not match across the name and the phone
+    assert index.search('i0') == []
+
+
+def test_edits_and_removals_keep_the_position():
+    entries = [person('a1'), person('a2'), person('a3')]
+    index = SearchIndex(entries)
+    replacement = person('a2 new')
+    index.add(replacement, replaces=entries[1])
+    index.discard(entries[0])
+    entries[2]['name'] = 'b3'
+    index.add(entries[2])
+    assert index.search('a') == [replacement]
+    assert index.search('3') == [entries[2]]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_a_linear_scan_after_many_changes(seed):
+    rng = random.Random(seed)
+    words = ['sara', 'ali', 'mina', 'رضا', 'علی', '0912', '0935']
+    entries = [person(rng.choice(words) + str(i), rng.choice(words)) for i in range(50)]
+    index = SearchIndex(entries)
+    for step in range(3000):
+        i = rng.randrange(len(entries))
+        new = person(rng.choice(words) + str(step), rng.choice(words))
+        index.add(new, replaces=entries[i])
+        entries[i] = new
+    by_position = sorted(entries, key=lambda e: index.search('').index(e))
+    for term in ['sa', 'ali1', 'رض', '09', '1', 'x']:
+        expected = [e for e in by_position
+                    if term in normalize_text(e['name']) + '\x1f' + normalize_phone(e['phone'])]
+        assert index.search(term) == expected
+
+
+def test_store_search_follows_writes(tmp_path):
+    store = JournaledEntryStore(str(tmp_path / 'entries.json'))
+    store.add(person('Sara'))
+    assert [e['name'] for e in store.search('sar')] == ['Sara']
+    slot = store.add(person('Sarah'))
+    store.update(slot, person('Mina'))
+    assert [e['name'] for e in store.search('sar')] == ['Sara']
+    assert [e['name'] for e in store.search('min')] == ['Mina']